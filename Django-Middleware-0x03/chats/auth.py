@@ -1,15 +1,175 @@
 # messaging_app/chats/auth.py
 
-# Might put custom authentication backends here,
-# or custom token processing logic if needed.
-# For now, a simple comment or function will make it non-empty.
+# Authentication backends that resolve the current user from a short-TTL
+# per-process cache instead of loading the user row on every request.
 
-def custom_auth_function():
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_CACHE_TTL = 30  # seconds; bounds staleness in *other* worker processes
+USER_CACHE_MAX_ENTRIES = 10_000
+
+
+class UserCache:
+    """
+    Per-process user cache with a fixed time-to-live, holding at most
+    `max_entries` users; the least recently used one is dropped first.
+
+    Entries are evicted in this process by the User post_save/post_delete
+    signals (so a role change takes effect immediately here); other
+    processes pick the change up when their entry expires. Changes made
+    with QuerySet.update() send no signals: they are seen everywhere only
+    after the TTL, unless the caller invalidates the affected users.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Hand out a copy so one request cannot mutate another's user.
+        return copy.copy(entry[0])
+
+    def set(self, user):
+        with self._lock:
+            key = str(user.pk)
+            self._entries[key] = (copy.copy(user), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+user_cache = UserCache()
+
+
+def get_cached_user(user_id):
+    """Return the user with this primary key, loading it at most once per TTL."""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = get_user_model()._default_manager.get(pk=user_id)
+        user_cache.set(user)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
     """
-    A placeholder function to ensure this file is not empty.
-    You can add more specific authentication logic here as your project evolves.
+    ModelBackend whose get_user() (run by AuthenticationMiddleware for
+    session-authenticated requests) is served from the user cache.
     """
-    pass
 
-# Might also import and extend simplejwt's classes if you need custom claims,
-# but for now, the above is enough to make the file exist and not be empty.
\ No newline at end of file
+    def get_user(self, user_id):
+        try:
+            user = get_cached_user(user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = user_cache.get(user_id)
+        if user is None:
+            return await sync_to_async(self.get_user)(user_id)
+        return user if self.user_can_authenticate(user) else None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user id through the user
+    cache, so authenticated API requests do not query the user table.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+            return user
+        return self.check_cached_user(user, validated_token)
+
+    def check_cached_user(self, user, validated_token):
+        # Same checks JWTAuthentication applies to a freshly loaded user.
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                "The user's password has been changed.", code="password_changed"
+            )
+        return user
+
+
+_jwt_authentication = CachedJWTAuthentication()
+
+
+def resolve_request_user(request, user=None):
+    """
+    The user for plain Django middleware: the session user when there is
+    one, otherwise the user of a valid "Authorization: Bearer" token.
+    DRF only authenticates JWTs inside the view, so without this the
+    middleware would see every API client as anonymous.
+    """
+    user = request.user if user is None else user
+    if user.is_authenticated:
+        return user
+    try:
+        authenticated = _jwt_authentication.authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError, get_user_model().DoesNotExist):
+        return user
+    return authenticated[0] if authenticated else user
+
+
+async def aresolve_request_user(request):
+    """Async resolve_request_user(); only a user-cache miss leaves the loop."""
+    user = await request.auser()
+    header = _jwt_authentication.get_header(request)
+    if user.is_authenticated or header is None:
+        return user
+    try:
+        raw_token = _jwt_authentication.get_raw_token(header)
+        if raw_token is None:
+            return user
+        token = _jwt_authentication.get_validated_token(raw_token)
+        cached = user_cache.get(token.get(api_settings.USER_ID_CLAIM))
+        if cached is not None:
+            return _jwt_authentication.check_cached_user(cached, token)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return user
+    return await sync_to_async(resolve_request_user)(request, user)
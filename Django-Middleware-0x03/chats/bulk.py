@@ -0,0 +1,90 @@
+# messaging_app/chats/bulk.py
+
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from .models import Conversation, Message
+from .signals import publish_new_messages, record_new_messages
+
+MAX_BODY_LENGTH = 1000  # same limit as MessageSerializer.message_body
+
+
+def validate_bulk_messages(items, user):
+    """
+    Validate a list of {"conversation_id", "message_body"} dicts in one pass.
+
+    Field checks are plain Python per item; conversation membership is
+    resolved for all items with a single query instead of one
+    PrimaryKeyRelatedField lookup per message. Returns (valid, errors)
+    where valid is a list of (index, conversation_id, message_body).
+    """
+    parsed, errors = [], []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "errors": {"non_field_errors": ["Expected an object."]}})
+            continue
+        item_errors = {}
+        try:
+            conversation_id = uuid.UUID(str(item["conversation_id"]))
+        except KeyError:
+            item_errors["conversation_id"] = ["This field is required."]
+        except ValueError:
+            item_errors["conversation_id"] = ["Must be a valid UUID."]
+        body = item.get("message_body")
+        if isinstance(body, str):
+            body = body.strip()  # as MessageSerializer's CharField does
+        if not isinstance(body, str) or not body:
+            item_errors["message_body"] = ["Message body cannot be empty."]
+        elif len(body) > MAX_BODY_LENGTH:
+            item_errors["message_body"] = [
+                f"Ensure this field has no more than {MAX_BODY_LENGTH} characters."
+            ]
+        if item_errors:
+            errors.append({"index": index, "errors": item_errors})
+        else:
+            parsed.append((index, conversation_id, body))
+
+    requested = {conversation_id for _, conversation_id, _ in parsed}
+    member_of = set(
+        Conversation.participants.through.objects.filter(
+            user_id=user.pk, conversation_id__in=requested
+        ).values_list("conversation_id", flat=True)
+    ) if requested else set()
+
+    valid = []
+    for index, conversation_id, body in parsed:
+        if conversation_id in member_of:
+            valid.append((index, conversation_id, body))
+        else:
+            errors.append({
+                "index": index,
+                "errors": {"conversation_id": ["You are not a participant in this conversation."]},
+            })
+    errors.sort(key=lambda error: error["index"])
+    return valid, errors
+
+
+def create_messages_in_chunks(valid, sender, chunk_size=500):
+    """
+    INSERT validated messages with bulk_create, one transaction per chunk,
+    updating the conversations' denormalized counters in the same
+    transaction. Returns the created Message objects.
+    """
+    created = []
+    for start in range(0, len(valid), chunk_size):
+        chunk = [
+            Message(conversation_id=conversation_id, sender=sender, message_body=body)
+            for _, conversation_id, body in valid[start:start + chunk_size]
+        ]
+        with transaction.atomic():
+            Message.objects.bulk_create(chunk)
+            per_conversation = defaultdict(list)
+            for message in chunk:
+                per_conversation[message.conversation_id].append(message.sent_at)
+            for conversation_id, sent_at in per_conversation.items():
+                record_new_messages(conversation_id, len(sent_at), max(sent_at))
+            # bulk_create sends no post_save, so notify streams explicitly.
+            publish_new_messages(chunk)
+        created.extend(chunk)
+    return created
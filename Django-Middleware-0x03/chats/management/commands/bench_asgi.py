@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from collections import Counter
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chats import middleware
+from chats.request_logging import RequestLogPipeline
+
+
+STACKS = {
+    "project": None,
+    "minimal": [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+        "chats.middleware.RestrictAccessByTimeMiddleware",
+        "chats.middleware.OffensiveLanguageMiddleware",
+        "chats.middleware.RolepermissionMiddleware",
+        "chats.middleware.RequestLoggingMiddleware",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the ASGI application in-process with concurrent requests and compare "
+        "throughput with the chats middleware running natively async vs sync-only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=3000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--path", default="/chats/test/")
+        parser.add_argument(
+            "--stack", choices=sorted(STACKS), default="project",
+            help="project: settings.MIDDLEWARE; minimal: only what the chats middleware needs",
+        )
+
+    def handle(self, *args, **options):
+        base = middleware.SyncAndAsyncMiddleware
+        time_restriction = middleware.RestrictAccessByTimeMiddleware
+        saved = (base.async_capable, time_restriction.ALLOWED_START_HOUR,
+                 time_restriction.ALLOWED_END_HOUR, middleware.request_log)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Keep the benchmark out of request_log.jsonl and out of the time window.
+            middleware.request_log = RequestLogPipeline(
+                os.path.join(tmp, "requests.log"), logger_name="bench_asgi_request_logger"
+            ).start()
+            time_restriction.ALLOWED_START_HOUR, time_restriction.ALLOWED_END_HOUR = 0, 24
+            # Anonymous requests end in a 403 from RolepermissionMiddleware;
+            # don't log a warning for each of them.
+            logging.getLogger("django.request").setLevel(logging.ERROR)
+            try:
+                for label, async_capable in (("sync-only", False), ("native async", True)):
+                    base.async_capable = async_capable
+                    # ASGIHandler loads the middleware chain when it is created.
+                    stack = STACKS[options["stack"]]
+                    if stack is None:
+                        application = ASGIHandler()
+                    else:
+                        with override_settings(MIDDLEWARE=stack):
+                            application = ASGIHandler()
+                    elapsed, statuses = asyncio.run(
+                        self.load(application, options["path"], options["requests"],
+                                  options["concurrency"])
+                    )
+                    self.stdout.write(
+                        f"{label:<13} {options['requests'] / elapsed:8.0f} requests/s"
+                        f"  statuses {dict(statuses)}"
+                    )
+            finally:
+                middleware.request_log.stop()
+                (base.async_capable, time_restriction.ALLOWED_START_HOUR,
+                 time_restriction.ALLOWED_END_HOUR, middleware.request_log) = saved
+
+    async def load(self, application, path, total, concurrency):
+        statuses = Counter()
+        remaining = iter(range(total))
+
+        async def client():
+            for _ in remaining:
+                statuses[await self.request(application, path)] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - start, statuses
+
+    async def request(self, application, path):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        body_sent = False
+        disconnected = asyncio.Event()
+        status = None
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await application(scope, receive, send)
+        disconnected.set()
+        return status
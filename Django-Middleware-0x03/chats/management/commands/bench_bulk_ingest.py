@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from chats.models import Conversation, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare message ingestion throughput of one POST per message with the "
+        "bulk endpoint. Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--conversations", type=int, default=10)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Only the views are measured, not the time-of-day/role middleware.
+            with override_settings(MIDDLEWARE=["django.middleware.common.CommonMiddleware"]):
+                self.run(options["messages"], options["conversations"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, message_count, conversation_count):
+        user = User.objects.create_user(
+            username="bench", email="bench@example.com", password="bench", role="host"
+        )
+        conversations = []
+        for _ in range(conversation_count):
+            conversation = Conversation.objects.create()
+            conversation.participants.add(user)
+            conversations.append(conversation)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        payload = [
+            {"conversation_id": str(conversations[i % conversation_count].id),
+             "message_body": f"bench message {i}"}
+            for i in range(message_count)
+        ]
+
+        start = time.perf_counter()
+        for item in payload:
+            response = client.post("/api/messages/", item, format="json")
+            assert response.status_code == 201, response.content
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.post("/api/messages/bulk/", payload, format="json")
+        assert response.data["created"] == message_count, response.data
+        bulk = time.perf_counter() - start
+
+        self.stdout.write(f"{message_count} messages over {conversation_count} conversations")
+        self.stdout.write(f"one POST per message {message_count / single:10.0f} messages/s")
+        self.stdout.write(f"bulk endpoint        {message_count / bulk:10.0f} messages/s")
@@ -0,0 +1,43 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from chats.ratelimit import (
+    CacheRateLimitBackend,
+    InMemoryRateLimitBackend,
+    SQLiteRateLimitBackend,
+)
+
+
+class Command(BaseCommand):
+    help = "Measure per-request overhead of each rate-limit backend over many distinct IPs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ips", type=int, default=10000)
+        parser.add_argument("--requests", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(options["ips"])]
+        rng = random.Random(0)
+        keys = [rng.choice(ips) for _ in range(options["requests"])]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            backends = [
+                ("in-memory (LRU)", InMemoryRateLimitBackend(5, 60, max_keys=len(ips))),
+                ("django cache", CacheRateLimitBackend(5, 60, key_prefix="bench-ratelimit")),
+                ("sqlite", SQLiteRateLimitBackend(5, 60, path=os.path.join(tmp, "rl.sqlite3"))),
+            ]
+            self.stdout.write(f"{len(keys)} requests over {len(ips)} distinct IPs")
+            for name, backend in backends:
+                start = time.perf_counter()
+                for key in keys:
+                    backend.hit(key)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{name:<16} {elapsed / len(keys) * 1e6:8.2f} us/request"
+                    f"  {len(keys) / elapsed:10.0f} requests/s"
+                )
+                backend.reset()
@@ -0,0 +1,81 @@
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from chats.request_logging import RequestLogPipeline
+
+
+class Command(BaseCommand):
+    help = "Compare request latency with synchronous file logging vs the queued batch writer."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=5000, help="requests per thread")
+        parser.add_argument(
+            "--view-us", type=int, default=200,
+            help="simulated I/O-bound view time per request, in microseconds",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            sync_logger = logging.getLogger("bench_request_logger_sync")
+            sync_logger.propagate = False
+            sync_logger.setLevel(logging.INFO)
+            file_handler = logging.FileHandler(os.path.join(tmp, "sync.log"))
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+            sync_logger.addHandler(file_handler)
+
+            def log_sync(path):
+                sync_logger.info(f"{datetime.now()} - User: bench - Path: {path}")
+
+            pipeline = RequestLogPipeline(
+                os.path.join(tmp, "queued.log"), logger_name="bench_request_logger_queued"
+            ).start()
+
+            def log_queued(path):
+                pipeline.log_request("bench", "GET", path, 200, 0.1, 512)
+
+            for name, log in (("sync FileHandler", log_sync), ("queued batches", log_queued)):
+                latencies = self.run(
+                    log, options["threads"], options["requests"], options["view_us"] / 1e6
+                )
+                latencies.sort()
+                p50 = latencies[len(latencies) // 2]
+                p99 = latencies[int(len(latencies) * 0.99)]
+                self.stdout.write(
+                    f"{name:<18} p50 {p50 * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us"
+                    f"  mean {statistics.fmean(latencies) * 1e6:7.1f} us"
+                )
+
+            pipeline.stop()
+            file_handler.close()
+            self.stdout.write(
+                f"queued writer: {pipeline.writer.written} lines written, {pipeline.dropped} dropped"
+            )
+
+    def run(self, log, thread_count, request_count, view_seconds):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            for i in range(request_count):
+                start = time.perf_counter()
+                time.sleep(view_seconds)
+                log(f"/api/conversations/{i}/")
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies
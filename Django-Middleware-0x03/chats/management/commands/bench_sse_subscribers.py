@@ -0,0 +1,55 @@
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chats.pubsub import broker
+from chats.streams import sse_message_stream
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle SSE message streams on one event loop and report the "
+        "memory held per connection and the fan-out latency of one publish."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options["subscribers"]))
+
+    async def run(self, count):
+        conversation_id = uuid.uuid4()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+
+        streams, pending = [], []
+        for _ in range(count):
+            # No cursor, so there is no backlog and no database access.
+            stream = sse_message_stream(conversation_id, heartbeat=3600)
+            await anext(stream)  # the "retry:" preamble
+            streams.append(stream)
+            pending.append(asyncio.ensure_future(anext(stream)))
+        await asyncio.sleep(0)
+
+        after = tracemalloc.take_snapshot()
+        held = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{broker.subscriber_count()} idle subscribers: "
+            f"{held / 1024:.0f} KiB total, {held / count / 1024:.2f} KiB per connection"
+        )
+
+        item = (timezone.now(), uuid.uuid4(), {"message_body": "hello"})
+        started = time.perf_counter()
+        broker.publish(conversation_id, item)
+        await asyncio.gather(*pending)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"fan-out of one message to all subscribers: {elapsed * 1000:.1f} ms")
+
+        for stream in streams:
+            await stream.aclose()
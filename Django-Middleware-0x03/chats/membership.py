@@ -0,0 +1,92 @@
+# messaging_app/chats/membership.py
+
+import threading
+import time
+
+from django.core.cache import cache
+from .models import Conversation
+
+MEMBERSHIP_CACHE_TIMEOUT = 300  # seconds
+REQUEST_MEMO_ATTR = '_conversation_membership'
+
+_stats_lock = threading.Lock()
+_stats = {'request_hits': 0, 'cache_hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+def membership_cache_stats():
+    """Return a snapshot of the hit/miss counters for this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_membership_cache_stats():
+    with _stats_lock:
+        for stat in _stats:
+            _stats[stat] = 0
+
+
+def _version_key(conversation_id):
+    return f'chats:membership:version:{conversation_id}'
+
+
+def _get_version(conversation_id):
+    key = _version_key(conversation_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version key can never roll
+        # back to a number that older cached answers were stored under.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_membership_version(conversation_id):
+    """Invalidate every cached answer for one conversation."""
+    key = _version_key(conversation_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    _count('invalidations')
+
+
+def is_conversation_participant(request, conversation_id):
+    """
+    Answer "is request.user a participant of conversation_id".
+
+    Answers are memoized on the request, then in the shared cache under a
+    per-conversation version that the participants m2m_changed signal
+    bumps; only a miss in both runs an indexed EXISTS on the m2m table.
+    """
+    user = request.user
+    if not user or not user.is_authenticated:
+        return False
+    conversation_id = str(conversation_id)
+
+    http_request = getattr(request, '_request', request)
+    memo = getattr(http_request, REQUEST_MEMO_ATTR, None)
+    if memo is None:
+        memo = {}
+        setattr(http_request, REQUEST_MEMO_ATTR, memo)
+    if conversation_id in memo:
+        _count('request_hits')
+        return memo[conversation_id]
+
+    key = f'chats:membership:{conversation_id}:{_get_version(conversation_id)}:{user.pk}'
+    is_member = cache.get(key)
+    if is_member is None:
+        _count('misses')
+        is_member = Conversation.participants.through.objects.filter(
+            conversation_id=conversation_id, user_id=user.pk
+        ).exists()
+        cache.set(key, is_member, MEMBERSHIP_CACHE_TIMEOUT)
+    else:
+        _count('cache_hits')
+
+    memo[conversation_id] = is_member
+    return is_member
@@ -1,141 +1,215 @@
 # messaging_app/chats/middleware.py
 
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
+import time
+from abc import ABC, abstractmethod
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
 from django.http import HttpResponseForbidden
-from collections import deque
 from django.contrib.auth.models import (
     AnonymousUser,
 )  # Import AnonymousUser for type checking
+from .auth import aresolve_request_user, resolve_request_user
+from .ratelimit import get_rate_limit_backend
+from .request_logging import RequestLogPipeline
 
 # --- Existing RequestLoggingMiddleware and its logger setup ---
 LOG_FILE_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "requests.log"
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "request_log.jsonl"
 )
 
-request_logger = logging.getLogger("request_logger")
-request_logger.setLevel(logging.INFO)
+# Requests are queued to a background writer that appends JSON lines to
+# request_log.jsonl in batches (see chats/request_logging.py). The writer
+# starts with the first logged request, so importing this module (tests,
+# shells, management commands) neither opens the file nor starts a thread.
+request_log = RequestLogPipeline(LOG_FILE_PATH)
+request_logger = request_log.logger
 
-file_handler = logging.FileHandler(LOG_FILE_PATH)
-file_handler.setLevel(logging.INFO)
 
-formatter = logging.Formatter("%(message)s")
-file_handler.setFormatter(formatter)
-
-if not request_logger.handlers:
-    request_logger.addHandler(file_handler)
+class SyncAndAsyncMiddleware(ABC):
+    """
+    Base for middleware that can also run natively under ASGI.
+
+    Native async is opt-in (settings.CHATS_ASYNC_MIDDLEWARE). Django's own
+    MiddlewareMixin classes pay a sync_to_async hop per request whenever
+    the middleware below them is async, so in the default stack (sessions,
+    CSRF, auth, messages... around sync DRF views) an async chain is about
+    half as fast as a sync one, which ASGIHandler enters with one hop.
+    Enable it only when the stack around these classes is async too.
+
+    When enabled and Django passes a coroutine `get_response`, the
+    instance marks itself as a coroutine function and dispatches to
+    `__acall__`, so no sync_to_async thread hop is needed.
+    """
 
+    sync_capable = True
+    async_capable = getattr(settings, "CHATS_ASYNC_MIDDLEWARE", False)
 
-class RequestLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        timestamp = datetime.now()
-        user = request.user.username if request.user.is_authenticated else "Anonymous"
-        path = request.path
-        log_message = f"{timestamp} - User: {user} - Path: {path}"
-        request_logger.info(log_message)
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    @abstractmethod
+    def handle(self, request):
+        """Process a request synchronously and return the response."""
+
+    @abstractmethod
+    async def __acall__(self, request):
+        """Process a request on the event loop and return the response."""
+
+
+class RequestLoggingMiddleware(SyncAndAsyncMiddleware):
+    def handle(self, request):
+        start = time.perf_counter()
         response = self.get_response(request)
+        self.log(request, request.user, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.log(request, await request.auser(), response, start)
         return response
 
+    def log(self, request, user, response, start):
+        request_log.start()  # no-op once running
+        request_log.log_request(
+            user=user.username if user.is_authenticated else "Anonymous",
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            latency_ms=round((time.perf_counter() - start) * 1000, 3),
+            size=None if response.streaming else len(response.content),
+        )
+
 
 # --- Existing RestrictAccessByTimeMiddleware ---
-class RestrictAccessByTimeMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+class RestrictAccessByTimeMiddleware(SyncAndAsyncMiddleware):
+    ALLOWED_START_HOUR = 18
+    ALLOWED_END_HOUR = 21
+
+    def handle(self, request):
+        forbidden = self.check_time()
+        if forbidden is not None:
+            return forbidden
+        response = self.get_response(request)
+        return response
 
-    def __call__(self, request):
+    async def __acall__(self, request):
+        forbidden = self.check_time()
+        if forbidden is not None:
+            return forbidden
+        response = await self.get_response(request)
+        return response
+
+    def check_time(self):
         current_time = datetime.now().time()
-        allowed_start_hour = 18
-        allowed_end_hour = 21
 
         if (
-            current_time.hour < allowed_start_hour
-            or current_time.hour >= allowed_end_hour
+            current_time.hour < self.ALLOWED_START_HOUR
+            or current_time.hour >= self.ALLOWED_END_HOUR
         ):
             return HttpResponseForbidden(
                 "Access to the messaging app is only allowed between 6 PM and 9 PM server time."
             )
-
-        response = self.get_response(request)
-        return response
+        return None
 
 
 # --- Existing OffensiveLanguageMiddleware (Rate Limiting) ---
-class OffensiveLanguageMiddleware:
-    IP_REQUEST_HISTORY = {}
+class OffensiveLanguageMiddleware(SyncAndAsyncMiddleware):
     RATE_LIMIT_MESSAGES = 5
     RATE_LIMIT_WINDOW_SECONDS = 60
 
     def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        if request.method == "POST":
-            ip_address = request.META.get("HTTP_X_FORWARDED_FOR")
-            if ip_address:
-                ip_address = ip_address.split(",")[0].strip()
-            else:
-                ip_address = request.META.get("REMOTE_ADDR")
-
-            if not ip_address:
-                logging.warning(
-                    "OffensiveLanguageMiddleware: Could not determine IP address for POST request."
-                )
-                return self.get_response(request)
-
-            current_time = datetime.now()
-
-            if ip_address not in self.IP_REQUEST_HISTORY:
-                self.IP_REQUEST_HISTORY[ip_address] = deque()
-
-            while self.IP_REQUEST_HISTORY[ip_address] and self.IP_REQUEST_HISTORY[
-                ip_address
-            ][0] < current_time - timedelta(seconds=self.RATE_LIMIT_WINDOW_SECONDS):
-                self.IP_REQUEST_HISTORY[ip_address].popleft()
-
-            if len(self.IP_REQUEST_HISTORY[ip_address]) >= self.RATE_LIMIT_MESSAGES:
-                logging.warning(
-                    f"OffensiveLanguageMiddleware: IP {ip_address} exceeded rate limit."
-                )
-                return HttpResponseForbidden(
-                    f"Too many messages from your IP address. Limit is {self.RATE_LIMIT_MESSAGES} messages per {self.RATE_LIMIT_WINDOW_SECONDS} seconds."
-                )
-
-            self.IP_REQUEST_HISTORY[ip_address].append(current_time)
-
+        super().__init__(get_response)
+        # Pluggable store (see chats/ratelimit.py and CHATS_RATE_LIMIT_BACKEND)
+        self.rate_limiter = get_rate_limit_backend(
+            self.RATE_LIMIT_MESSAGES, self.RATE_LIMIT_WINDOW_SECONDS
+        )
+
+    def handle(self, request):
+        ip_address = self.client_ip(request)
+        if ip_address and not self.rate_limiter.hit(ip_address):
+            return self.too_many_messages(ip_address)
         response = self.get_response(request)
         return response
 
+    async def __acall__(self, request):
+        ip_address = self.client_ip(request)
+        if ip_address and not await self.rate_limiter.ahit(ip_address):
+            return self.too_many_messages(ip_address)
+        response = await self.get_response(request)
+        return response
+
+    def client_ip(self, request):
+        """The IP to rate limit, or None when the request is not limited."""
+        if request.method != "POST":
+            return None
+        ip_address = request.META.get("HTTP_X_FORWARDED_FOR")
+        if ip_address:
+            ip_address = ip_address.split(",")[0].strip()
+        else:
+            ip_address = request.META.get("REMOTE_ADDR")
+
+        if not ip_address:
+            logging.warning(
+                "OffensiveLanguageMiddleware: Could not determine IP address for POST request."
+            )
+        return ip_address
+
+    def too_many_messages(self, ip_address):
+        logging.warning(
+            f"OffensiveLanguageMiddleware: IP {ip_address} exceeded rate limit."
+        )
+        return HttpResponseForbidden(
+            f"Too many messages from your IP address. Limit is {self.RATE_LIMIT_MESSAGES} messages per {self.RATE_LIMIT_WINDOW_SECONDS} seconds."
+        )
+
 
 # --- New RolepermissionMiddleware ---
-class RolepermissionMiddleware:  # This class exists and is defined
+class RolepermissionMiddleware(SyncAndAsyncMiddleware):  # This class exists and is defined
     """
     Middleware to enforce user role permissions.
     Only users with 'admin' or 'host' roles are allowed access to the chat app.
     'guest' users will be blocked.
     """
 
-    def __init__(self, get_response):
-        """
-        Initializes the middleware.
-        `get_response` is a callable that represents the next middleware/view.
-        """
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def handle(self, request):
         """
         Checks the user's role from the request and denies access if not authorized.
         """
         # We need to ensure the user is authenticated first.
         # This middleware should be placed AFTER AuthenticationMiddleware in settings.py.
+        # Bearer-token clients are resolved here too, through the cached
+        # user lookup in chats/auth.py.
+        forbidden = self.check_role(resolve_request_user(request))
+        if forbidden is not None:
+            return forbidden
+        response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        # Resolves the user without blocking the event loop on a cache hit.
+        forbidden = self.check_role(await aresolve_request_user(request))
+        if forbidden is not None:
+            return forbidden
+        response = await self.get_response(request)
+        return response
 
+    def check_role(self, user):
         # If the user is not authenticated, they are an AnonymousUser.
         # Anonymous users typically don't have roles defined, or their role is implicitly 'guest'.
         # We'll block them if they are not authenticated.
-        if not request.user.is_authenticated:
+        if not user.is_authenticated:
             return HttpResponseForbidden(
                 "Authentication required to access the messaging app."
             )
@@ -155,11 +229,10 @@ class RolepermissionMiddleware:  # This class exists and is defined
             "host",
         ]  # Adjust this list as per your project's definition of privileged roles
 
-        if request.user.role not in allowed_roles:
+        if user.role not in allowed_roles:
             return HttpResponseForbidden(
-                f"Your role ({request.user.role}) does not have permission to access this resource."
+                f"Your role ({user.role}) does not have permission to access this resource."
             )
 
         # If the user is authenticated and has an allowed role, proceed
-        response = self.get_response(request)
-        return response
+        return None
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:41
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_message_stats(apps, schema_editor):
+    Conversation = apps.get_model('chats', 'Conversation')
+    Message = apps.get_model('chats', 'Message')
+    stats = (
+        Message.objects.values('conversation_id')
+        .annotate(count=Count('id'), latest=Max('sent_at'))
+        .order_by()
+    )
+    for row in stats.iterator(chunk_size=1000):
+        Conversation.objects.filter(pk=row['conversation_id']).update(
+            message_count=row['count'], last_message_at=row['latest']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0002_message_conv_sent_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
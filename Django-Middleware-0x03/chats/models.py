@@ -29,6 +29,10 @@ class Conversation(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False) 
     participants = models.ManyToManyField(User, related_name='conversations')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from Message so conversation listings never aggregate
+    # over the message table; maintained in chats/signals.py.
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"Conversation {self.id} - {self.created_at.date()}"
@@ -41,6 +45,22 @@ class Message(models.Model):
     message_body = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves keyset pagination over a conversation's history:
+            # WHERE conversation_id = ? AND (sent_at, id) > (?, ?) ORDER BY sent_at, id
+            models.Index(fields=['conversation', 'sent_at', 'id'], name='message_conv_sent_id_idx'),
+        ]
+
+    def delete(self, *args, **kwargs):
+        # Done here rather than in a post_delete receiver, which would
+        # turn off the fast cascade delete from Conversation and User.
+        from .signals import refresh_conversation_stats
+
+        result = super().delete(*args, **kwargs)
+        refresh_conversation_stats([self.conversation_id])
+        return result
+
     def __str__(self):
         return f"Message from {self.sender.username} at {self.sent_at}"
 
@@ -1,7 +1,39 @@
 # pagination file
 # messaging_app/chats/pagination.py
 
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+import uuid
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+def encode_cursor_token(sent_at, pk, reverse=False):
+    """Opaque token for the (sent_at, id) position of a message."""
+    data = {'t': sent_at.isoformat(), 'i': str(pk)}
+    if reverse:
+        data['r'] = 1
+    payload = json.dumps(data, separators=(',', ':')).encode('ascii')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor_token(token):
+    """Inverse of encode_cursor_token(); raises ValueError on bad input."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        sent_at = parse_datetime(data['t'])
+        if sent_at is None:
+            raise ValueError(data['t'])
+        return {'sent_at': sent_at, 'id': uuid.UUID(data['i']), 'reverse': bool(data.get('r'))}
+    except (TypeError, KeyError, AttributeError, UnicodeEncodeError) as exc:
+        raise ValueError(f'Invalid cursor: {token!r}') from exc
+
 
 class MessagePagination(PageNumberPagination):
     """
@@ -14,4 +46,112 @@ class MessagePagination(PageNumberPagination):
     # The test likely checks for "page.paginator.count" in the *output*
     # which DRF's PageNumberPagination handles automatically in its response format.
     # You don't explicitly write this in your pagination class, but it's part of the
-    # metadata returned by DRF when pagination is applied.
\ No newline at end of file
+    # metadata returned by DRF when pagination is applied.
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for message history, ordered by (sent_at, id).
+
+    Each page is a single indexed range scan on (conversation, sent_at, id),
+    so page 5000 costs the same as page 1 and no COUNT(*) is ever issued.
+    The cursor is opaque to clients: it encodes the boundary row and the
+    paging direction (?cursor=... comes from the "next"/"previous" links).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor['reverse'])
+
+        if cursor is not None:
+            sent_at, pk = cursor['sent_at'], cursor['id']
+            if self.reverse:
+                queryset = queryset.filter(
+                    Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, id__gt=pk)
+                )
+
+        if self.reverse:
+            queryset = queryset.order_by('-sent_at', '-id')
+        else:
+            queryset = queryset.order_by('sent_at', 'id')
+
+        # Fetch one extra row to learn whether another page exists
+        # without counting the whole conversation.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        if self.reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return decode_cursor_token(encoded)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, message, reverse):
+        encoded = encode_cursor_token(message.sent_at, message.id, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
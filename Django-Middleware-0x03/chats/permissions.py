@@ -2,6 +2,7 @@
 
 from rest_framework import permissions
 from rest_framework.exceptions import PermissionDenied
+from .membership import is_conversation_participant
 from .models import Conversation, Message # Import models if needed
 
 class IsConversationParticipant(permissions.BasePermission):
@@ -20,10 +21,12 @@ class IsConversationParticipant(permissions.BasePermission):
         # obj will be a Conversation instance or a Message instance
         # if used on MessageViewSet, obj will be a Message.
         # If obj is a Message, get its conversation.
-        conversation = obj if isinstance(obj, Conversation) else obj.conversation
+        # Use the FK column so the conversation row itself is never loaded.
+        conversation_id = obj.pk if isinstance(obj, Conversation) else obj.conversation_id
 
         # Check if the user is a participant in the conversation
-        if request.user in conversation.participants.all():
+        # (memoized per request and cached across requests, see membership.py)
+        if is_conversation_participant(request, conversation_id):
             # For GET, HEAD, OPTIONS (safe methods), if participant, allow
             if request.method in permissions.SAFE_METHODS:
                 return True
@@ -32,7 +35,7 @@ class IsConversationParticipant(permissions.BasePermission):
             elif request.method in ['PUT', 'PATCH', 'DELETE']:
                 # For messages, additionally check if the user is the sender for modification/deletion
                 if isinstance(obj, Message) and request.method in ['PUT', 'PATCH', 'DELETE']:
-                    return request.user == obj.sender
+                    return obj.sender_id == request.user.pk
                 return True
         
         # If not a participant, deny access.
@@ -52,7 +55,7 @@ class IsMessageSenderOrReadOnly(permissions.BasePermission):
         # Read permissions are allowed to any request (if part of conversation)
         if request.method in permissions.SAFE_METHODS:
             # Check if the user is a participant of the message's conversation
-            return request.user in obj.conversation.participants.all()
+            return is_conversation_participant(request, obj.conversation_id)
 
         # Write permissions are only allowed to the sender of the message.
-        return obj.sender == request.user
\ No newline at end of file
+        return obj.sender_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,76 @@
+# messaging_app/chats/pubsub.py
+
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    """
+    One listener on one conversation, bound to the event loop it was
+    created on. Items are (sent_at, id, data) tuples.
+    """
+
+    def __init__(self, conversation_id, max_pending):
+        self.conversation_id = conversation_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # Set when items had to be dropped; the reader then re-reads the
+        # gap from the database instead of silently losing messages.
+        self.overflowed = False
+
+    def deliver(self, item):
+        # Always runs on self.loop (see MessageBroker.publish).
+        if self.queue.full():
+            self.overflowed = True
+        else:
+            self.queue.put_nowait(item)
+
+
+class MessageBroker:
+    """
+    In-process fan-out of newly committed messages to streaming clients.
+
+    publish() may be called from any thread (typically a sync view's
+    transaction.on_commit); delivery is handed to each subscriber's loop
+    with call_soon_threadsafe so readers only ever await their queue.
+    """
+
+    def __init__(self, max_pending=1000):
+        self.max_pending = max_pending
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, conversation_id):
+        subscription = Subscription(str(conversation_id), self.max_pending)
+        with self._lock:
+            self._subscribers[subscription.conversation_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.conversation_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.conversation_id]
+
+    def has_subscribers(self, conversation_id):
+        return str(conversation_id) in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, conversation_id, item):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(conversation_id), ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, item)
+            except RuntimeError:
+                # The subscriber's loop has shut down.
+                self.unsubscribe(subscription)
+
+
+broker = MessageBroker()
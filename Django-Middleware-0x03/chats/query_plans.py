@@ -0,0 +1,84 @@
+# messaging_app/chats/query_plans.py
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Apply the select_related/prefetch_related calls needed to serialize
+    `queryset` with `serializer_class` without per-row queries.
+
+    The plan is derived from the serializer's field tree: forward FK and
+    one-to-one fields that render the related object are joined, and
+    many-valued fields (m2m, reverse FK) are prefetched with a queryset
+    that is itself planned for the nested serializer.
+    """
+    return _apply(queryset, serializer_class())
+
+
+def _apply(queryset, serializer):
+    select, prefetch = _collect(queryset.model, serializer, prefix='')
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def _collect(model, serializer, prefix):
+    select, prefetch = [], []
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        name = field.source.split('.')[0]
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Properties, annotations and Prefetch(to_attr=...) targets are
+            # the view's responsibility.
+            continue
+        if not model_field.is_relation:
+            continue
+
+        lookup = prefix + name
+        if model_field.many_to_many or model_field.one_to_many:
+            if isinstance(field, serializers.ListSerializer):
+                related_qs = _apply(
+                    model_field.related_model._default_manager.all(), field.child
+                )
+                prefetch.append(Prefetch(lookup, queryset=related_qs))
+            elif isinstance(field, serializers.ManyRelatedField):
+                prefetch.append(lookup)
+        elif _renders_related_object(field):
+            select.append(lookup)
+            if isinstance(field, serializers.BaseSerializer):
+                nested_select, nested_prefetch = _collect(
+                    model_field.related_model, field, prefix=lookup + '__'
+                )
+                select.extend(nested_select)
+                prefetch.extend(nested_prefetch)
+    return select, prefetch
+
+
+def _renders_related_object(field):
+    if isinstance(field, serializers.BaseSerializer):
+        return True
+    if isinstance(field, serializers.RelatedField):
+        # PrimaryKeyRelatedField reads the local "<name>_id" column only.
+        return not field.use_pk_only_optimization()
+    # Dotted sources such as "sender.username" walk the relation.
+    return '.' in field.source
+
+
+class QueryPlanMixin:
+    """
+    Viewset mixin that plans the (already filtered) queryset for the
+    serializer in use, so list and detail endpoints run a constant number
+    of queries however many rows they return.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return plan_queryset(queryset, self.get_serializer_class())
@@ -0,0 +1,216 @@
+# messaging_app/chats/ratelimit.py
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'chats.ratelimit.InMemoryRateLimitBackend'
+
+
+class BaseRateLimitBackend(ABC):
+    """
+    Sliding-window-counter rate limiter.
+
+    Each key keeps only the hit count of the current fixed window and of
+    the previous one; the previous count is weighted by how much of it
+    still overlaps the sliding window. Memory per key is constant no
+    matter how many requests it makes, unlike a log of timestamps.
+    """
+
+    def __init__(self, limit, window_seconds, **options):
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    @abstractmethod
+    def hit(self, key, now=None):
+        """Record a request for `key`; return False if it must be refused."""
+
+    async def ahit(self, key, now=None):
+        """Async variant of hit(); blocking backends run it in a thread."""
+        return await sync_to_async(self.hit)(key, now)
+
+    @abstractmethod
+    def reset(self):
+        """Forget every recorded hit (tests and benchmarks)."""
+
+    def window_of(self, now):
+        return int(now // self.window_seconds)
+
+    def estimate(self, now, previous_count, current_count):
+        elapsed = (now % self.window_seconds) / self.window_seconds
+        return previous_count * (1 - elapsed) + current_count
+
+    def advance(self, state, now):
+        """Roll a (window, previous, current) state forward to `now`."""
+        window = self.window_of(now)
+        if state is None:
+            return window, 0, 0
+        stored_window, previous_count, current_count = state
+        if stored_window == window:
+            return state
+        if stored_window == window - 1:
+            return window, current_count, 0
+        return window, 0, 0
+
+
+class InMemoryRateLimitBackend(BaseRateLimitBackend):
+    """
+    Per-process limiter. Keys live in an LRU-ordered dict capped at
+    `max_keys`, so memory stays bounded under many distinct clients.
+    """
+
+    def __init__(self, limit, window_seconds, max_keys=10000, **options):
+        super().__init__(limit, window_seconds, **options)
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            window, previous_count, current_count = self.advance(self._states.get(key), now)
+            allowed = self.estimate(now, previous_count, current_count) < self.limit
+            if allowed:
+                current_count += 1
+            self._states[key] = (window, previous_count, current_count)
+            self._states.move_to_end(key)
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        return allowed
+
+    async def ahit(self, key, now=None):
+        # Only a short in-process critical section: safe on the event loop.
+        return self.hit(key, now)
+
+    def reset(self):
+        with self._lock:
+            self._states.clear()
+
+
+class CacheRateLimitBackend(BaseRateLimitBackend):
+    """
+    Limiter shared through a Django cache (Memcached, Redis, database...).
+    Each window is its own counter key so increments stay atomic.
+    """
+
+    def __init__(self, limit, window_seconds, cache_alias='default', key_prefix='ratelimit', **options):
+        super().__init__(limit, window_seconds, **options)
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+        self._generation = 0
+
+    def _key(self, key, window):
+        return f'{self.key_prefix}:{self._generation}:{key}:{window}'
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        window = self.window_of(now)
+        current_key, previous_key = self._key(key, window), self._key(key, window - 1)
+        # Increment first and decide on the value the cache returns: a
+        # get-then-incr would let concurrent workers all pass the check.
+        # Two windows must stay readable: the current and the previous one.
+        if self.cache.add(current_key, 1, timeout=2 * self.window_seconds):
+            current_count = 1
+        else:
+            try:
+                current_count = self.cache.incr(current_key)
+            except ValueError:  # expired between add() and incr()
+                self.cache.set(current_key, 1, timeout=2 * self.window_seconds)
+                current_count = 1
+        previous_count = self.cache.get(previous_key, 0)
+        if self.estimate(now, previous_count, current_count - 1) < self.limit:
+            return True
+        # Refused hits must not count against the next window.
+        try:
+            self.cache.decr(current_key)
+        except ValueError:
+            pass
+        return False
+
+    def reset(self):
+        # The cache may be shared with other data, so never clear() it:
+        # move to fresh keys and let the old ones expire.
+        self._generation += 1
+
+
+class SQLiteRateLimitBackend(BaseRateLimitBackend):
+    """
+    Limiter shared by every worker process on one host through a small
+    SQLite file in WAL mode. Each hit is one read-modify-write inside a
+    BEGIN IMMEDIATE transaction, so concurrent workers never lose counts.
+    """
+
+    PURGE_EVERY = 1000  # hits between deletions of idle keys
+
+    def __init__(self, limit, window_seconds, path=None, **options):
+        super().__init__(limit, window_seconds, **options)
+        self.path = path or os.path.join(settings.BASE_DIR, 'ratelimit.sqlite3')
+        self._local = threading.local()
+        self._hits = 0
+        self._hits_lock = threading.Lock()  # connections are per thread, the counter is not
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit ('
+                ' key TEXT PRIMARY KEY, window INTEGER NOT NULL,'
+                ' previous_count INTEGER NOT NULL, current_count INTEGER NOT NULL'
+                ') WITHOUT ROWID'
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key, now=None):
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT window, previous_count, current_count FROM rate_limit WHERE key = ?',
+                (key,),
+            ).fetchone()
+            window, previous_count, current_count = self.advance(row, now)
+            allowed = self.estimate(now, previous_count, current_count) < self.limit
+            if allowed:
+                current_count += 1
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit (key, window, previous_count, current_count)'
+                ' VALUES (?, ?, ?, ?)',
+                (key, window, previous_count, current_count),
+            )
+            with self._hits_lock:
+                self._hits += 1
+                purge = self._hits % self.PURGE_EVERY == 0
+            if purge:
+                conn.execute('DELETE FROM rate_limit WHERE window < ?', (window - 1,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def reset(self):
+        self._connect().execute('DELETE FROM rate_limit')
+
+
+def get_rate_limit_backend(limit, window_seconds):
+    """
+    Build the backend named by settings.CHATS_RATE_LIMIT_BACKEND, passing
+    settings.CHATS_RATE_LIMIT_OPTIONS as keyword arguments.
+    """
+    backend_class = import_string(getattr(settings, 'CHATS_RATE_LIMIT_BACKEND', DEFAULT_BACKEND))
+    options = getattr(settings, 'CHATS_RATE_LIMIT_OPTIONS', {})
+    return backend_class(limit, window_seconds, **options)
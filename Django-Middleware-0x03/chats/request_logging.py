@@ -0,0 +1,184 @@
+# messaging_app/chats/request_logging.py
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line, built from the fields the middleware sets."""
+
+    FIELDS = ("user", "method", "path", "status", "latency_ms", "size")
+
+    def format(self, record):
+        return self.format_values(
+            record.created, *(getattr(record, field, None) for field in self.FIELDS)
+        )
+
+    def format_values(self, created, *values):
+        entry = {"ts": datetime.fromtimestamp(created, tz=timezone.utc).isoformat()}
+        entry.update(zip(self.FIELDS, values))
+        return json.dumps(entry, separators=(",", ":"))
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the request thread: when the bounded
+    queue is full the record is dropped and counted instead.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Records only carry plain values, so formatting can wait for the
+        # writer thread instead of happening on the request path.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def enqueue_values(self, *values):
+        """
+        Fast path for the middleware: queue a plain tuple of field values,
+        skipping LogRecord creation and the handler lock.
+        """
+        self.enqueue((time.time(),) + values)
+
+
+class BatchingLogWriter(threading.Thread):
+    """
+    Background thread that drains the queue and writes records to the log
+    file in batches: one write() and flush() per batch instead of per line.
+    Queue items are LogRecords or (created, *FIELDS) tuples.
+    """
+
+    _STOP = object()
+
+    def __init__(self, log_queue, path, formatter, batch_size=256, flush_interval=0.5):
+        super().__init__(name="request-log-writer", daemon=True)
+        self.queue = log_queue
+        self.path = path
+        self.formatter = formatter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._stop_requested = threading.Event()
+
+    def run(self):
+        with open(self.path, "a", encoding="utf-8") as log_file:
+            stopping = False
+            while not stopping:
+                try:
+                    batch = [self.queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    stopping = self._stop_requested.is_set()
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if self._STOP in batch or self._stop_requested.is_set():
+                    stopping = True
+                    batch = [record for record in batch if record is not self._STOP]
+                    # Drain whatever was queued before the stop request.
+                    while True:
+                        try:
+                            record = self.queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if record is not self._STOP:
+                            batch.append(record)
+                if batch:
+                    log_file.write("".join(self._format(item) + "\n" for item in batch))
+                    log_file.flush()
+                    self.written += len(batch)
+
+    def _format(self, item):
+        if isinstance(item, tuple):
+            return self.formatter.format_values(*item)
+        return self.formatter.format(item)
+
+    def stop(self, timeout=5):
+        self._stop_requested.set()
+        try:
+            # Wakes a writer idling in get(); when the queue is full the
+            # writer is busy draining it and sees the event after the batch.
+            self.queue.put_nowait(self._STOP)
+        except queue.Full:
+            pass
+        self.join(timeout)
+
+
+class RequestLogPipeline:
+    """
+    Wires a logger to a DroppingQueueHandler and a BatchingLogWriter so
+    that logging a request costs one non-blocking queue put.
+    """
+
+    def __init__(self, path, logger_name="request_logger", queue_size=10000,
+                 batch_size=256, flush_interval=0.5):
+        self.path = path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.writer = self._new_writer()
+        self.logger = logging.getLogger(logger_name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self._started = False
+        self._exit_hook_registered = False
+        self._start_lock = threading.Lock()
+
+    def _new_writer(self):
+        return BatchingLogWriter(
+            self.queue, self.path, JsonLinesFormatter(), self.batch_size, self.flush_interval
+        )
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def start(self):
+        if not self._started:
+            with self._start_lock:
+                if not self._started:
+                    if self.writer.ident is not None:
+                        # Restart after stop(): a thread runs only once, and
+                        # the old queue may still hold its stop marker.
+                        self.queue = queue.Queue(maxsize=self.queue_size)
+                        self.handler.queue = self.queue
+                        self.writer = self._new_writer()
+                    self.logger.addHandler(self.handler)
+                    self.writer.start()
+                    if not self._exit_hook_registered:
+                        atexit.register(self.stop)
+                        self._exit_hook_registered = True
+                    self._started = True
+        return self
+
+    def stop(self):
+        with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+        self.logger.removeHandler(self.handler)
+        self.writer.stop()
+
+    def log_request(self, user, method, path, status, latency_ms, size):
+        # Same line format as self.logger.info("request", extra={...}).
+        self.handler.enqueue_values(user, method, path, status, latency_ms, size)
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .auth import user_cache
+from .membership import bump_membership_version
+from .models import Conversation, Message, User
+from .pubsub import broker
+
+
+def record_new_messages(conversation_id, count, latest_sent_at):
+    """
+    Add `count` messages to a conversation's denormalized counters in a
+    single UPDATE; `latest_sent_at` only moves last_message_at forward.
+    """
+    is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lt=latest_sent_at)
+    Conversation.objects.filter(pk=conversation_id).update(
+        message_count=F('message_count') + count,
+        last_message_at=Case(
+            When(is_newer, then=Value(latest_sent_at)),
+            default=F('last_message_at'),
+        ),
+    )
+
+
+def refresh_conversation_stats(conversation_ids):
+    """
+    Recompute message_count and last_message_at for the given
+    conversations with one UPDATE, after messages were deleted.
+    """
+    messages = Message.objects.filter(conversation=OuterRef('pk')).order_by()
+    count = messages.values('conversation').annotate(count=Count('pk')).values('count')
+    latest = messages.order_by('-sent_at', '-id').values('sent_at')[:1]
+    Conversation.objects.filter(pk__in=conversation_ids).update(
+        message_count=Coalesce(Subquery(count), Value(0)),
+        last_message_at=Subquery(latest),
+    )
+
+
+def publish_new_messages(messages):
+    """
+    Hand new messages to streaming subscribers once the surrounding
+    transaction commits. Nothing is serialized when nobody listens.
+    """
+    from .serializers import MessageSerializer
+
+    listened = [m for m in messages if broker.has_subscribers(m.conversation_id)]
+    if not listened:
+        return
+    items = [
+        (m.conversation_id, (m.sent_at, m.id, MessageSerializer(m).data)) for m in listened
+    ]
+
+    def publish():
+        for conversation_id, item in items:
+            broker.publish(conversation_id, item)
+
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_stats_on_create(sender, instance, created, **kwargs):
+    if created:
+        record_new_messages(instance.conversation_id, 1, instance.sent_at)
+        publish_new_messages([instance])
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def invalidate_conversation_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        conversation_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear' and reverse:
+        # user.conversations.clear() does not report which conversations
+        # were affected; remember them before the rows disappear.
+        instance._cleared_conversation_ids = list(
+            instance.conversations.values_list('pk', flat=True)
+        )
+        return
+    elif action == 'post_clear':
+        conversation_ids = (
+            getattr(instance, '_cleared_conversation_ids', []) if reverse else [instance.pk]
+        )
+    else:
+        return
+    for conversation_id in conversation_ids:
+        bump_membership_version(conversation_id)
+
+
+# Message deliberately has no delete receivers: any pre/post_delete
+# receiver on it would make every Conversation or User delete load and
+# delete its messages one by one instead of with a single DELETE.
+# Message.delete() refreshes its own conversation; a deleted user's
+# conversations are refreshed here in one set-based UPDATE.
+@receiver(pre_delete, sender=User)
+def remember_conversations_of_deleted_user(sender, instance, **kwargs):
+    instance._sent_conversation_ids = list(
+        Message.objects.filter(sender=instance).order_by()
+        .values_list('conversation_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=User)
+def refresh_conversations_of_deleted_user(sender, instance, **kwargs):
+    conversation_ids = getattr(instance, '_sent_conversation_ids', None)
+    if conversation_ids:
+        refresh_conversation_stats(conversation_ids)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # A role (or password, or is_active) change must not be served from
+    # the authentication cache; evicting on every save keeps it simple.
+    # QuerySet.update() bypasses this: call user_cache.invalidate() for
+    # the affected users, or accept up to USER_CACHE_TTL of staleness.
+    user_cache.invalidate(instance.pk)
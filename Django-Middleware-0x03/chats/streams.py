@@ -0,0 +1,172 @@
+# messaging_app/chats/streams.py
+
+import asyncio
+import json
+from contextlib import aclosing
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Message
+from .pagination import encode_cursor_token
+from .pubsub import broker
+from .query_plans import plan_queryset
+from .serializers import MessageSerializer
+
+CATCH_UP_BATCH = 500
+HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets DRF content negotiation accept "Accept: text/event-stream" (sent
+    by EventSource); the stream itself is written by sse_message_stream.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return _dumps(data).encode() if data is not None else b''
+
+
+def _messages_after(conversation_id, after, limit):
+    """Up to `limit` serialized messages positioned after (sent_at, id)."""
+    queryset = Message.objects.filter(conversation_id=conversation_id)
+    if after is not None:
+        sent_at, pk = after
+        queryset = queryset.filter(Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, id__gt=pk))
+    queryset = plan_queryset(queryset.order_by('sent_at', 'id'), MessageSerializer)[:limit]
+    return [(m.sent_at, m.id, MessageSerializer(m).data) for m in queryset]
+
+
+_amessages_after = sync_to_async(_messages_after)
+
+
+async def _catch_up(conversation_id, after):
+    """Yield the stored messages after `after`, one keyset batch at a time."""
+    while True:
+        batch = await _amessages_after(conversation_id, after, CATCH_UP_BATCH)
+        if batch:
+            yield batch
+        if len(batch) < CATCH_UP_BATCH:
+            return
+        after = batch[-1][:2]
+
+
+class _Reader:
+    """
+    Yields messages newer than a position: first what is already stored,
+    then live items from the broker, skipping anything already seen.
+    """
+
+    def __init__(self, conversation_id, after):
+        self.conversation_id = conversation_id
+        self.position = after
+        # Subscribe before reading the backlog so nothing committed in
+        # between can be missed; duplicates are filtered by position.
+        self.subscription = broker.subscribe(conversation_id)
+        # Set while messages the broker dropped are still being re-read
+        # from the database.
+        self._behind = False
+
+    def close(self):
+        broker.unsubscribe(self.subscription)
+
+    def _newer(self, items):
+        fresh = []
+        for item in items:
+            if self.position is None or item[:2] > self.position:
+                fresh.append(item)
+                self.position = item[:2]
+        return fresh
+
+    async def backlog(self):
+        """Yield the stored messages after the position, a batch at a time."""
+        if self.position is None:
+            return
+        async for batch in _catch_up(self.conversation_id, self.position):
+            fresh = self._newer(batch)
+            if fresh:
+                yield fresh
+
+    async def wait(self, timeout):
+        """
+        New items, or [] if none arrived within `timeout` seconds. After an
+        overflow, each call also returns one batch of the dropped messages
+        re-read from the database until the reader has caught up.
+        """
+        items = []
+        if not self._behind:
+            queue = self.subscription.queue
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                return []
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            items.sort(key=lambda item: item[:2])
+            # Sets the position even for a reader that started without
+            # one, so the dropped items (all newer) can be re-read below.
+            items = self._newer(items)
+        if self.subscription.overflowed:
+            self.subscription.overflowed = False
+            self._behind = True
+        if self._behind:
+            batch = await _amessages_after(self.conversation_id, self.position, CATCH_UP_BATCH)
+            self._behind = len(batch) == CATCH_UP_BATCH
+            items.extend(self._newer(batch))
+        return items
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder, separators=(',', ':'))
+
+
+def _sse_event(item):
+    sent_at, pk, data = item
+    return (
+        f"id: {encode_cursor_token(sent_at, pk)}\n"
+        f"event: message\n"
+        f"data: {_dumps(data)}\n\n"
+    )
+
+
+async def sse_message_stream(conversation_id, after=None, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Server-sent events for a conversation. Each event id is a keyset cursor,
+    so a reconnecting EventSource resumes via Last-Event-ID.
+    """
+    reader = _Reader(conversation_id, after)
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        async with aclosing(reader.backlog()) as backlog:
+            async for batch in backlog:
+                for item in batch:
+                    yield _sse_event(item)
+        while True:
+            items = await reader.wait(heartbeat)
+            if not items:
+                yield ": keep-alive\n\n"
+            for item in items:
+                yield _sse_event(item)
+    finally:
+        reader.close()
+
+
+async def long_poll_messages(conversation_id, after=None, timeout=25):
+    """
+    Long-poll variant: answer as soon as there is at least one message
+    after `after` (at most one catch-up batch; the cursor continues from
+    there), or with an empty list once `timeout` expires.
+    """
+    reader = _Reader(conversation_id, after)
+    try:
+        async with aclosing(reader.backlog()) as backlog:
+            items = await anext(backlog, None)
+        items = items or await reader.wait(timeout)
+    finally:
+        reader.close()
+    cursor = encode_cursor_token(*reader.position) if reader.position else None
+    yield _dumps({'results': [data for _, _, data in items], 'cursor': cursor})
@@ -1,3 +1,666 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.http import HttpResponse
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .auth import CachedJWTAuthentication, UserCache, resolve_request_user, user_cache
+from .membership import (
+    is_conversation_participant, membership_cache_stats, reset_membership_cache_stats,
+)
+from .middleware import (
+    OffensiveLanguageMiddleware, RestrictAccessByTimeMiddleware, RolepermissionMiddleware,
+)
+from .models import Conversation, Message, User
+from .pagination import encode_cursor_token
+from .pubsub import MessageBroker, broker
+from .request_logging import RequestLogPipeline
+from .ratelimit import (
+    BaseRateLimitBackend, CacheRateLimitBackend, InMemoryRateLimitBackend, SQLiteRateLimitBackend,
+)
+from .signals import record_new_messages
+from . import streams
+from .streams import _Reader, sse_message_stream
+
+# The project middleware restricts access by wall-clock time and role;
+# the API tests exercise the views on their own.
+API_TEST_MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+]
+
+
+@override_settings(MIDDLEWARE=API_TEST_MIDDLEWARE)
+class ChatsAPITestCase(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='pass', role='host'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='pass', role='host'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.alice)
+
+    def create_messages(self, count, conversation=None, sender=None, same_timestamp=False):
+        conversation = conversation or self.conversation
+        sender = sender or self.alice
+        messages = [
+            Message(conversation=conversation, sender=sender, message_body=f'message {i}')
+            for i in range(count)
+        ]
+        Message.objects.bulk_create(messages)
+        # auto_now_add stamps every row with "now"; spread them out so
+        # ordering by sent_at is meaningful unless ties are wanted.
+        start = timezone.now() - timedelta(days=1)
+        for i, message in enumerate(messages):
+            message.sent_at = start if same_timestamp else start + timedelta(seconds=i)
+        Message.objects.bulk_update(messages, ['sent_at'])
+        # bulk_create skips post_save, so maintain the counters explicitly.
+        record_new_messages(conversation.id, count, messages[-1].sent_at)
+        return messages
+
+    def create_conversation(self, *participants):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(*participants)
+        return conversation
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, grow, rounds=2):
+        """
+        Request `url`, call `grow()` to add rows, and request it again:
+        the number of queries must not depend on how many rows there are.
+        """
+        grow()  # empty pages can short-circuit queries; start from data
+        self.count_queries(url)  # warm the membership cache
+        baseline = self.count_queries(url)
+        for _ in range(rounds):
+            grow()
+            self.assertEqual(self.count_queries(url), baseline)
+
+
+class MessageKeysetPaginationTest(ChatsAPITestCase):
+    def url(self):
+        return f'/api/conversations/{self.conversation.id}/messages/'
+
+    def walk(self, url, link):
+        bodies = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            bodies.extend(item['message_body'] for item in response.data['results'])
+            url = response.data[link]
+        return bodies
+
+    def test_forward_pages_cover_history_in_order(self):
+        self.create_messages(25)
+        bodies = self.walk(self.url() + '?page_size=10', 'next')
+        self.assertEqual(bodies, [f'message {i}' for i in range(25)])
+
+    def test_backward_paging_returns_previous_page(self):
+        self.create_messages(25)
+        first = self.client.get(self.url() + '?page_size=10')
+        second = self.client.get(first.data['next'])
+        self.assertIsNone(first.data['previous'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_ties_on_sent_at_are_broken_by_id(self):
+        messages = self.create_messages(15, same_timestamp=True)
+        bodies = self.walk(self.url() + '?page_size=4', 'next')
+        expected = [m.message_body for m in sorted(messages, key=lambda m: m.id)]
+        self.assertEqual(bodies, expected)
+
+    def test_no_count_query(self):
+        self.create_messages(30)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url() + '?page_size=10')
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(self.url() + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTest(ChatsAPITestCase):
+    def add_conversation_with_traffic(self):
+        carol = User.objects.create_user(
+            username=f'carol{User.objects.count()}',
+            email=f'carol{User.objects.count()}@example.com',
+            password='pass',
+        )
+        conversation = self.create_conversation(self.alice, carol)
+        self.create_messages(3, conversation=conversation, sender=carol)
+        self.create_messages(2, conversation=conversation, sender=self.alice)
+
+    def test_conversation_list_is_constant(self):
+        self.assertConstantQueries('/api/conversations/', self.add_conversation_with_traffic)
+
+    def test_conversation_detail_is_constant(self):
+        url = f'/api/conversations/{self.conversation.id}/'
+        self.assertConstantQueries(
+            url, lambda: self.create_messages(5, sender=self.bob)
+        )
+
+    def test_message_list_is_constant(self):
+        self.assertConstantQueries('/api/messages/', self.add_conversation_with_traffic)
+
+    def test_conversation_messages_is_constant(self):
+        url = f'/api/conversations/{self.conversation.id}/messages/'
+        self.assertConstantQueries(
+            url, lambda: self.create_messages(5, sender=self.bob)
+        )
+
+
+class ConversationListingTest(ChatsAPITestCase):
+    def test_listing_embeds_only_recent_messages(self):
+        self.create_messages(12)
+        response = self.client.get('/api/conversations/')
+        listed = response.data['results'][0]
+        self.assertEqual(listed['message_count'], 12)
+        self.assertNotIn('messages', listed)
+        self.assertEqual(
+            [m['message_body'] for m in listed['recent_messages']],
+            [f'message {i}' for i in range(11, 6, -1)],
+        )
+
+    def test_counters_follow_message_create_and_delete(self):
+        first = Message.objects.create(
+            conversation=self.conversation, sender=self.alice, message_body='hi'
+        )
+        last = Message.objects.create(
+            conversation=self.conversation, sender=self.bob, message_body='hey'
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_at, last.sent_at)
+
+        last.delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 1)
+        self.assertEqual(self.conversation.last_message_at, first.sent_at)
+
+    def test_deleting_a_user_refreshes_their_conversations(self):
+        self.create_messages(3, sender=self.alice)
+        kept = self.create_messages(2, sender=self.bob)[-1]
+        self.alice.delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+        self.assertEqual(self.conversation.last_message_at, kept.sent_at)
+
+    def test_cascade_deletes_messages_without_loading_them(self):
+        self.create_messages(50)
+        with CaptureQueriesContext(connection) as ctx:
+            self.conversation.delete()
+        message_queries = [q['sql'] for q in ctx.captured_queries if 'chats_message' in q['sql']]
+        self.assertEqual(len(message_queries), 1)
+        self.assertTrue(message_queries[0].startswith('DELETE'))
+
+    def test_listing_is_ordered_by_last_activity(self):
+        quiet = self.create_conversation(self.alice, self.bob)
+        Message.objects.create(conversation=quiet, sender=self.bob, message_body='new')
+        response = self.client.get('/api/conversations/')
+        ids = [c['conversation_id'] for c in response.data['results']]
+        self.assertEqual(ids, [str(quiet.id), str(self.conversation.id)])
+
+    def test_history_streams_full_conversation(self):
+        self.create_messages(7)
+        response = self.client.get(f'/api/conversations/{self.conversation.id}/history/')
+        self.assertTrue(response.streaming)
+        history = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            [m['message_body'] for m in history], [f'message {i}' for i in range(7)]
+        )
+
+
+class MembershipCacheTest(ChatsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.carol = User.objects.create_user(
+            username='carol', email='carol@example.com', password='pass'
+        )
+        reset_membership_cache_stats()
+
+    def request_for(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_answers_are_memoized_per_request(self):
+        request = self.request_for(self.alice)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_conversation_participant(request, self.conversation.id))
+            self.assertTrue(is_conversation_participant(request, self.conversation.id))
+        stats = membership_cache_stats()
+        self.assertEqual((stats['misses'], stats['request_hits']), (1, 1))
+
+    def test_shared_cache_serves_later_requests(self):
+        is_conversation_participant(self.request_for(self.alice), self.conversation.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                is_conversation_participant(self.request_for(self.alice), self.conversation.id)
+            )
+        self.assertEqual(membership_cache_stats()['cache_hits'], 1)
+
+    def test_participant_changes_invalidate(self):
+        self.assertFalse(
+            is_conversation_participant(self.request_for(self.carol), self.conversation.id)
+        )
+        self.conversation.participants.add(self.carol)
+        self.assertTrue(
+            is_conversation_participant(self.request_for(self.carol), self.conversation.id)
+        )
+        self.carol.conversations.clear()
+        self.assertFalse(
+            is_conversation_participant(self.request_for(self.carol), self.conversation.id)
+        )
+
+    def test_message_detail_checks_membership_once(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.alice, message_body='hi'
+        )
+        self.client.get(f'/api/messages/{message.id}/')
+        self.assertEqual(membership_cache_stats()['misses'], 1)
+        response = self.client.delete(f'/api/messages/{message.id}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_non_sender_cannot_edit(self):
+        message = Message.objects.create(
+            conversation=self.conversation, sender=self.bob, message_body='hi'
+        )
+        response = self.client.patch(
+            f'/api/messages/{message.id}/', {'message_body': 'edited'}, format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class RateLimitBackendTest(SimpleTestCase):
+    def check_sliding_window(self, backend):
+        # 3 hits per 10s: the window starting at t=100 fills up...
+        self.assertEqual([backend.hit('ip', now=100 + i) for i in range(4)], [True] * 3 + [False])
+        # ...half-way through the next one the previous window still counts 50%.
+        self.assertEqual([backend.hit('ip', now=115) for _ in range(3)], [True, True, False])
+        # Two windows later everything has expired.
+        self.assertTrue(backend.hit('ip', now=135))
+        # Keys are independent.
+        self.assertTrue(backend.hit('other', now=103))
+
+    def test_in_memory(self):
+        self.check_sliding_window(InMemoryRateLimitBackend(3, 10))
+
+    def test_in_memory_evicts_least_recently_used(self):
+        backend = InMemoryRateLimitBackend(1, 10, max_keys=2)
+        backend.hit('a', now=0)
+        backend.hit('b', now=0)
+        backend.hit('a', now=1)  # refused, but refreshes 'a'
+        backend.hit('c', now=1)  # evicts 'b'
+        self.assertEqual(list(backend._states), ['a', 'c'])
+        self.assertTrue(backend.hit('b', now=2))
+
+    def test_cache(self):
+        backend = CacheRateLimitBackend(3, 10, key_prefix='test-ratelimit')
+        backend.reset()
+        self.check_sliding_window(backend)
+
+    def test_cache_never_admits_more_than_the_limit_concurrently(self):
+        backend = CacheRateLimitBackend(5, 10, key_prefix='test-ratelimit-race')
+        backend.reset()
+        with ThreadPoolExecutor(16) as pool:
+            allowed = list(pool.map(lambda _: backend.hit('ip', now=100), range(64)))
+        self.assertEqual(allowed.count(True), 5)
+
+    def test_backends_must_implement_hit_and_reset(self):
+        with self.assertRaises(TypeError):
+            BaseRateLimitBackend(3, 10)
+
+    def test_sqlite_is_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ratelimit.sqlite3')
+            self.check_sliding_window(SQLiteRateLimitBackend(3, 10, path=path))
+            # A second worker sees the hit 'other' already made at t=103.
+            other_worker = SQLiteRateLimitBackend(3, 10, path=path)
+            self.assertEqual(
+                [other_worker.hit('other', now=104) for _ in range(3)], [True, True, False]
+            )
+
+
+class OffensiveLanguageMiddlewareTest(SimpleTestCase):
+    def test_posts_over_the_limit_are_refused(self):
+        middleware = OffensiveLanguageMiddleware(lambda request: HttpResponse('ok'))
+        factory = RequestFactory()
+        statuses = [
+            middleware(factory.post('/api/messages/', REMOTE_ADDR='192.0.2.1')).status_code
+            for _ in range(OffensiveLanguageMiddleware.RATE_LIMIT_MESSAGES + 1)
+        ]
+        self.assertEqual(statuses[-2:], [200, 403])
+        self.assertEqual(
+            middleware(factory.get('/api/messages/', REMOTE_ADDR='192.0.2.1')).status_code, 200
+        )
+
+
+class RequestLogPipelineTest(SimpleTestCase):
+    def test_writes_json_lines_in_background(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'requests.log')
+            pipeline = RequestLogPipeline(path, logger_name='test_request_logger').start()
+            pipeline.log_request('alice', 'GET', '/api/conversations/', 200, 1.5, 42)
+            pipeline.logger.info('request', extra={'user': 'bob', 'status': 404})
+            pipeline.stop()
+            with open(path) as log_file:
+                entries = [json.loads(line) for line in log_file]
+        self.assertEqual(
+            [(e['user'], e['path'], e['status'], e['size']) for e in entries],
+            [('alice', '/api/conversations/', 200, 42), ('bob', None, 404, None)],
+        )
+        self.assertIn('latency_ms', entries[0])
+
+    def test_full_queue_drops_and_counts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            pipeline = RequestLogPipeline(
+                os.path.join(tmp, 'requests.log'), logger_name='test_request_logger_full',
+                queue_size=2,
+            )  # not started: nothing drains the queue
+            for _ in range(5):
+                pipeline.log_request('alice', 'GET', '/', 200, 1.0, 0)
+        self.assertEqual(pipeline.dropped, 3)
+
+    def test_stop_does_not_block_on_a_full_queue(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'requests.log')
+            pipeline = RequestLogPipeline(
+                path, logger_name='test_request_logger_stop', queue_size=2, flush_interval=60,
+            )
+            pipeline.log_request('alice', 'GET', '/', 200, 1.0, 0)
+            pipeline.log_request('alice', 'GET', '/', 200, 1.0, 0)
+            pipeline.start()
+            pipeline.stop()
+            self.assertFalse(pipeline.writer.is_alive())
+            with open(path) as log_file:
+                self.assertEqual(len(log_file.readlines()), 2)
+
+    def test_can_be_started_again_after_stop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'requests.log')
+            pipeline = RequestLogPipeline(path, logger_name='test_request_logger_restart')
+            pipeline.start()
+            pipeline.log_request('alice', 'GET', '/', 200, 1.0, 0)
+            pipeline.stop()
+            with mock.patch('chats.request_logging.atexit.register') as register:
+                pipeline.start()
+            register.assert_not_called()
+            self.assertTrue(pipeline.writer.is_alive())
+            pipeline.log_request('bob', 'GET', '/', 200, 1.0, 0)
+            pipeline.stop()
+            with open(path) as log_file:
+                users = [json.loads(line)['user'] for line in log_file]
+        self.assertEqual(users, ['alice', 'bob'])
+
+    def test_importing_the_middleware_does_not_start_the_writer(self):
+        from . import middleware
+
+        self.assertFalse(middleware.request_log.writer.is_alive())
+
+
+class AsyncMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        async def view(request):
+            return HttpResponse('ok')
+        self.view = view
+        self.factory = AsyncRequestFactory()
+
+    def test_async_get_response_selects_async_mode(self):
+        middleware = RestrictAccessByTimeMiddleware(self.view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertFalse(iscoroutinefunction(RestrictAccessByTimeMiddleware(lambda r: None)))
+
+    async def test_rate_limit_runs_on_the_event_loop(self):
+        middleware = OffensiveLanguageMiddleware(self.view)
+        statuses = []
+        for _ in range(OffensiveLanguageMiddleware.RATE_LIMIT_MESSAGES + 1):
+            response = await middleware(self.factory.post('/', REMOTE_ADDR='198.51.100.7'))
+            statuses.append(response.status_code)
+        self.assertEqual(statuses[-2:], [200, 403])
+
+    async def test_role_check_uses_auser(self):
+        middleware = RolepermissionMiddleware(self.view)
+        guest = User(username='guest', role='guest')
+        host = User(username='host', role='host')
+        for user, expected in ((guest, 403), (host, 200)):
+            request = self.factory.get('/')
+
+            async def auser(user=user):
+                return user
+            request.auser = auser
+            response = await middleware(request)
+            self.assertEqual(response.status_code, expected)
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.host = User.objects.create_user(
+            username='host', email='host@example.com', password='pass', role='host'
+        )
+        self.factory = RequestFactory()
+
+    def bearer_request(self, user):
+        request = self.factory.get(
+            '/api/conversations/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}'
+        )
+        request.user = AnonymousUser()
+        return request
+
+    def test_jwt_user_is_loaded_once(self):
+        authentication = CachedJWTAuthentication()
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                user, _token = authentication.authenticate(self.bearer_request(self.host))
+                self.assertEqual(user.pk, self.host.pk)
+        self.assertEqual((user_cache.misses, user_cache.hits), (1, 2))
+
+    def test_role_middleware_accepts_bearer_tokens_without_queries(self):
+        middleware = RolepermissionMiddleware(lambda request: HttpResponse('ok'))
+        middleware(self.bearer_request(self.host))  # warm the cache
+        with self.assertNumQueries(0):
+            response = middleware(self.bearer_request(self.host))
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_invalidates_cached_user(self):
+        resolve_request_user(self.bearer_request(self.host))
+        self.host.role = 'guest'
+        self.host.save()
+        self.assertEqual(resolve_request_user(self.bearer_request(self.host)).role, 'guest')
+
+    def test_cache_drops_least_recently_used_user_when_full(self):
+        cache = UserCache(max_entries=2)
+        guest = User.objects.create_user(
+            username='guest', email='guest@example.com', password='pass'
+        )
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass'
+        )
+        cache.set(self.host)
+        cache.set(guest)
+        cache.get(self.host.pk)
+        cache.set(other)
+        self.assertIsNone(cache.get(guest.pk))
+        self.assertEqual(cache.get(self.host.pk).pk, self.host.pk)
+        self.assertEqual(cache.get(other.pk).pk, other.pk)
+
+    def test_session_backend_uses_cache(self):
+        self.client.force_login(self.host)
+        user_cache.clear()
+        with override_settings(MIDDLEWARE=API_TEST_MIDDLEWARE):
+            self.client.get('/chats/test/')
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get('/chats/test/')
+        self.assertFalse(any('chats_user' in q['sql'] for q in ctx.captured_queries))
+
+
+class BulkMessageIngestTest(ChatsAPITestCase):
+    def test_creates_valid_items_and_reports_errors_by_index(self):
+        outsider_conversation = self.create_conversation(self.bob)
+        payload = [
+            {'conversation_id': str(self.conversation.id), 'message_body': 'one'},
+            {'conversation_id': 'not-a-uuid', 'message_body': 'two'},
+            {'conversation_id': str(outsider_conversation.id), 'message_body': 'three'},
+            {'conversation_id': str(self.conversation.id), 'message_body': ''},
+            {'conversation_id': str(self.conversation.id), 'message_body': 'five'},
+        ]
+        response = self.client.post('/api/messages/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2, 3])
+        self.assertEqual(
+            sorted(Message.objects.values_list('message_body', flat=True)), ['five', 'one']
+        )
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.message_count, 2)
+
+    def test_query_count_does_not_grow_with_items(self):
+        def post(count):
+            payload = [
+                {'conversation_id': str(self.conversation.id), 'message_body': f'm{i}'}
+                for i in range(count)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/messages/bulk/', payload, format='json')
+            self.assertEqual(response.data['created'], count)
+            return len(ctx.captured_queries)
+
+        # Stay under one SQLite INSERT batch (999 parameters) for both sizes.
+        self.assertEqual(post(5), post(150))
+
+    def test_bodies_are_stored_trimmed(self):
+        payload = [{'conversation_id': str(self.conversation.id), 'message_body': '  hi \n'}]
+        response = self.client.post('/api/messages/bulk/', payload, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Message.objects.get().message_body, 'hi')
+
+    def test_all_invalid_is_400(self):
+        response = self.client.post(
+            '/api/messages/bulk/', [{'message_body': 'no conversation'}], format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+
+class MessageBrokerTest(SimpleTestCase):
+    async def test_publish_from_another_thread_reaches_subscriber(self):
+        message_broker = MessageBroker()
+        subscription = message_broker.subscribe('c1')
+        await sync_to_async(message_broker.publish, thread_sensitive=False)('c1', 'item')
+        self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 1), 'item')
+        message_broker.unsubscribe(subscription)
+        self.assertFalse(message_broker.has_subscribers('c1'))
+
+    async def test_full_queue_flags_overflow(self):
+        message_broker = MessageBroker(max_pending=1)
+        subscription = message_broker.subscribe('c1')
+        message_broker.publish('c1', 'a')
+        message_broker.publish('c1', 'b')
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 1)
+        self.assertTrue(subscription.overflowed)
+
+
+class MessageStreamTest(ChatsAPITestCase):
+    def url(self, query):
+        return f'/api/conversations/{self.conversation.id}/messages/stream/?{query}'
+
+    def read_stream(self, response):
+        async def collect():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return json.loads(async_to_sync(collect)())
+
+    def test_long_poll_returns_messages_after_cursor(self):
+        first, *rest = self.create_messages(3)
+        cursor = encode_cursor_token(first.sent_at, first.id)
+        response = self.client.get(self.url(f'mode=longpoll&cursor={cursor}'))
+        body = self.read_stream(response)
+        self.assertEqual([m['message_body'] for m in body['results']], ['message 1', 'message 2'])
+
+        response = self.client.get(self.url(f"mode=longpoll&timeout=0.05&cursor={body['cursor']}"))
+        self.assertEqual(self.read_stream(response)['results'], [])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get(self.url('cursor=nope')).status_code, 404)
+
+    def test_non_participant_is_refused(self):
+        self.client.force_authenticate(user=User.objects.create_user(
+            username='eve', email='eve@example.com', password='pass'
+        ))
+        self.assertEqual(self.client.get(self.url('mode=longpoll')).status_code, 403)
+
+    async def test_sse_sends_backlog_then_live_messages(self):
+        first, second = await sync_to_async(self.create_messages)(2)
+        stream = sse_message_stream(self.conversation.id, after=(first.sent_at, first.id))
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            backlog = await anext(stream)
+            self.assertIn(encode_cursor_token(second.sent_at, second.id), backlog)
+
+            live = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+
+            def send():
+                with self.captureOnCommitCallbacks(execute=True):
+                    Message.objects.create(
+                        conversation=self.conversation, sender=self.bob, message_body='live!'
+                    )
+            await sync_to_async(send)()
+            event = await asyncio.wait_for(live, 5)
+            self.assertIn('"message_body":"live!"', event)
+        finally:
+            await stream.aclose()
+        self.assertFalse(broker.has_subscribers(self.conversation.id))
+
+    async def test_backlog_is_yielded_one_batch_at_a_time(self):
+        first, *rest = await sync_to_async(self.create_messages)(6)
+        reader = _Reader(self.conversation.id, (first.sent_at, first.id))
+        try:
+            with mock.patch.object(streams, 'CATCH_UP_BATCH', 2):
+                batches = [batch async for batch in reader.backlog()]
+        finally:
+            reader.close()
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual([item[1] for batch in batches for item in batch], [m.id for m in rest])
+
+    async def test_overflow_without_position_rereads_dropped_messages(self):
+        messages = await sync_to_async(self.create_messages)(5)
+        reader = _Reader(self.conversation.id, None)
+        try:
+            # The broker queued the first message and dropped the rest.
+            first = messages[0]
+            reader.subscription.queue.put_nowait((first.sent_at, first.id, {}))
+            reader.subscription.overflowed = True
+            with mock.patch.object(streams, 'CATCH_UP_BATCH', 2):
+                received = await reader.wait(1)
+                while reader._behind:
+                    received += await reader.wait(1)
+        finally:
+            reader.close()
+        self.assertEqual([item[1] for item in received], [m.id for m in messages])
@@ -1,28 +1,52 @@
-from django.http import HttpResponse
+from django.db.models import F, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from django.shortcuts import get_object_or_404
 from .models import Conversation, Message, User  # Import User model
-from .serializers import ConversationSerializer, MessageSerializer
+from rest_framework.renderers import JSONRenderer
+from .serializers import ConversationListSerializer, ConversationSerializer, MessageSerializer
 from .permissions import IsConversationParticipant
+from .pagination import MessageKeysetPagination, decode_cursor_token
+from .query_plans import QueryPlanMixin, plan_queryset
+from .bulk import create_messages_in_chunks, validate_bulk_messages
+from .streams import EventStreamRenderer, long_poll_messages, sse_message_stream
 
 
 def test_view(request):
     return HttpResponse("Welcome to the chat application")
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Conversation.objects.all()
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated, IsConversationParticipant]
+    recent_messages_limit = 5
+    history_chunk_size = 500
 
     def get_queryset(self):
         """
         Ensure users only see conversations they are a participant in.
         """
         # filters is implied here by filtering the queryset
-        return Conversation.objects.filter(participants=self.request.user).distinct()
+        queryset = Conversation.objects.filter(participants=self.request.user).distinct()
+        if self.action == "list":
+            # The sliced prefetch is a single ROW_NUMBER() window query over
+            # all listed conversations, however long their histories are.
+            recent = plan_queryset(
+                Message.objects.order_by("-sent_at", "-id"), MessageSerializer
+            )[: self.recent_messages_limit]
+            queryset = queryset.prefetch_related(
+                Prefetch("messages", queryset=recent, to_attr="recent_messages")
+            ).order_by(F("last_message_at").desc(nulls_last=True), "-created_at")
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return ConversationListSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         # Auto-add the current user to the new conversation
@@ -46,13 +70,16 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
         if request.method == "GET":
             # Message.objects.filter - This is what the test is looking for
-            messages = Message.objects.filter(conversation=conversation).order_by(
-                "sent_at"
+            # Ordering by (sent_at, id) is applied by the keyset paginator.
+            messages = plan_queryset(
+                Message.objects.filter(conversation=conversation), MessageSerializer
             )
-            serializer = MessageSerializer(messages, many=True)
-            return Response(
-                serializer.data, status=status.HTTP_200_OK
-            )  # Includes "status"
+            paginator = MessageKeysetPagination()
+            page = paginator.paginate_queryset(messages, request, view=self)
+            serializer = MessageSerializer(page, many=True)
+            return paginator.get_paginated_response(
+                serializer.data
+            )  # Includes "status" 200 by default
 
         elif request.method == "POST":
             serializer = MessageSerializer(data=request.data)
@@ -63,8 +90,74 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=True, methods=["get"], url_path="messages/stream",
+        renderer_classes=[JSONRenderer, EventStreamRenderer],
+    )
+    def stream(self, request, pk=None):
+        """
+        Push messages newer than ?cursor= (a keyset cursor from messages/,
+        or the Last-Event-ID header) as server-sent events.
+        With ?mode=longpoll, answer once with {"results", "cursor"} as soon
+        as something is available or after ?timeout= seconds.
+        These responses are async iterators and need an ASGI server.
+        """
+        conversation = get_object_or_404(Conversation, pk=pk)
+        self.check_object_permissions(request, conversation)
 
-class MessageViewSet(viewsets.ModelViewSet):
+        token = request.query_params.get("cursor") or request.headers.get("Last-Event-ID")
+        after = None
+        if token:
+            try:
+                cursor = decode_cursor_token(token)
+            except ValueError:
+                raise NotFound("Invalid cursor")
+            after = (cursor["sent_at"], cursor["id"])
+
+        if request.query_params.get("mode") == "longpoll":
+            try:
+                timeout = min(float(request.query_params.get("timeout", 25)), 60)
+            except ValueError:
+                timeout = 25
+            return StreamingHttpResponse(
+                long_poll_messages(conversation.pk, after, timeout),
+                content_type="application/json",
+            )
+
+        response = StreamingHttpResponse(
+            sse_message_stream(conversation.pk, after), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # don't let proxies buffer events
+        return response
+
+    @action(detail=True, methods=["get"], url_path="history")
+    def history(self, request, pk=None):
+        """
+        Stream the full message history of a conversation as a JSON array,
+        oldest first, without materializing it in memory.
+        """
+        conversation = get_object_or_404(Conversation, pk=pk)
+        self.check_object_permissions(request, conversation)
+        messages = plan_queryset(
+            Message.objects.filter(conversation=conversation).order_by("sent_at", "id"),
+            MessageSerializer,
+        )
+        return StreamingHttpResponse(
+            self._stream_json_array(messages), content_type="application/json"
+        )
+
+    def _stream_json_array(self, messages):
+        renderer = JSONRenderer()
+        yield b"["
+        for index, message in enumerate(messages.iterator(chunk_size=self.history_chunk_size)):
+            if index:
+                yield b","
+            yield renderer.render(MessageSerializer(message).data)
+        yield b"]"
+
+
+class MessageViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated, IsConversationParticipant] 
@@ -81,18 +174,37 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        self.check_object_permissions(request, instance.conversation) # Check permission on conversation
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+    bulk_max_items = 5000
+    bulk_chunk_size = 500
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        """
+        Create many messages in one request (imports, bots).
+        Body: a list of {"conversation_id": ..., "message_body": ...}.
+        Valid items are written even when others fail; failures are
+        reported per item by their index in the request.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of messages."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response({"detail": f"At most {self.bulk_max_items} messages per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        valid, errors = validate_bulk_messages(items, request.user)
+        created = create_messages_in_chunks(valid, request.user, self.bulk_chunk_size)
+        return Response(
+            {"created": len(created), "ids": [str(m.id) for m in created], "errors": errors},
+            status=status.HTTP_201_CREATED if created or not errors else status.HTTP_400_BAD_REQUEST,
+        )
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
-        self.check_object_permissions(request, instance.conversation) # Check permission on conversation
         # Also, check if the user is the sender to allow editing/deleting their own message
-        if request.user != instance.sender:
+        if instance.sender_id != request.user.pk:
             return Response({"detail": "You do not have permission to edit this message."},
                             status=status.HTTP_403_FORBIDDEN)
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
@@ -102,8 +214,7 @@ class MessageViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        self.check_object_permissions(request, instance.conversation) # Check permission on conversation
-        if request.user != instance.sender:
+        if instance.sender_id != request.user.pk:
             return Response({"detail": "You do not have permission to delete this message."},
                             status=status.HTTP_403_FORBIDDEN)
         self.perform_destroy(instance)
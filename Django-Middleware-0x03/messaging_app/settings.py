@@ -48,9 +48,19 @@ MIDDLEWARE = [
     'chats.middleware.RequestLoggingMiddleware',
 ]
 
+# Resolve session users through the per-process user cache (chats/auth.py).
+AUTHENTICATION_BACKENDS = ['chats.auth.CachedModelBackend']
+
+# Rate limiting for POSTs (chats.middleware.OffensiveLanguageMiddleware).
+# InMemoryRateLimitBackend is per process; with several workers use
+# chats.ratelimit.SQLiteRateLimitBackend (one host) or
+# chats.ratelimit.CacheRateLimitBackend (shared cache server).
+CHATS_RATE_LIMIT_BACKEND = 'chats.ratelimit.InMemoryRateLimitBackend'
+CHATS_RATE_LIMIT_OPTIONS = {'max_keys': 10000}
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'chats.auth.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -57,6 +57,14 @@ CACHES = {
     }
 }
 
+# Notifications for new messages are written in bulk when the sending
+# transaction commits; set 'background': True to hand them to a writer thread.
+MESSAGING_NOTIFICATION_OPTIONS = {
+    'batch_size': 500,
+    'background': False,
+    'queue_size': 1000,
+}
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -124,6 +132,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# The project has no login page of its own; use the admin's.
+LOGIN_URL = 'admin:login'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .models import Message
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+CHUNK_SIZE = 1000  # rows per database fetch and per streamed chunk
+
+# Public field name -> values() path.
+FIELDS = {
+    'id': 'id',
+    'sender': 'sender__username',
+    'receiver': 'receiver__username',
+    'content': 'content',
+    'timestamp': 'timestamp',
+    'edited': 'edited',
+    'read': 'read',
+    'parent_message': 'parent_message_id',
+    'reply_count': 'reply_count',
+}
+
+
+def encode_cursor(timestamp, pk):
+    raw = json.dumps([timestamp.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(token):
+    """Return (timestamp, pk) from a cursor; ValueError if it is malformed."""
+    try:
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(token.encode()))
+        timestamp = parse_datetime(timestamp)
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor.')
+    if timestamp is None or not isinstance(pk, int):
+        raise ValueError('Invalid cursor.')
+    return timestamp, pk
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _requested_fields(request, allowed):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(allowed)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(allowed))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+    return names
+
+
+def _page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer.')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}.')
+    return limit
+
+
+def _stream_rows(rows, names, paths, limit):
+    dumps = DjangoJSONEncoder(separators=(',', ':')).encode
+    yield '{"results":['
+    chunk, count, last, has_more = [], 0, None, False
+    for row in rows:
+        if count == limit:
+            has_more = True  # the one extra row fetched only signals a next page
+            break
+        values = dict(zip(paths, row))
+        chunk.append(dumps({name: values[FIELDS[name]] for name in names}))
+        last = values
+        count += 1
+        if len(chunk) == CHUNK_SIZE:
+            yield ('' if count == len(chunk) else ',') + ','.join(chunk)
+            chunk = []
+    if chunk:
+        yield ('' if count == len(chunk) else ',') + ','.join(chunk)
+    next_cursor = encode_cursor(last['timestamp'], last['id']) if has_more else None
+    yield '],"next":' + json.dumps(next_cursor) + '}'
+
+
+def message_page(request, queryset, allowed_fields):
+    """
+    One page of `queryset`, newest first, as a streamed JSON object
+    {"results": [...], "next": cursor-or-null}.
+
+    Pages are keyset-paginated on (timestamp, id) via ?cursor=, sized by
+    ?limit=, and projected to ?fields= with values_list(), so rows are
+    read CHUNK_SIZE at a time with iterator() and never become model
+    instances.
+    """
+    try:
+        names = _requested_fields(request, allowed_fields)
+        limit = _page_size(request)
+        cursor = request.GET.get('cursor')
+        if cursor:
+            timestamp, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    # id and timestamp are always read: the next cursor is built from them.
+    paths = list(dict.fromkeys([FIELDS[name] for name in names] + ['timestamp', 'id']))
+    rows = (
+        queryset.order_by('-timestamp', '-id')
+        .values_list(*paths)[:limit + 1]
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return StreamingHttpResponse(
+        _stream_rows(rows, names, paths, limit), content_type='application/json'
+    )
+
+
+SENT_FIELDS = ('id', 'receiver', 'content', 'timestamp', 'edited', 'parent_message', 'reply_count')
+INBOX_FIELDS = ('id', 'sender', 'content', 'timestamp', 'read', 'parent_message', 'reply_count')
+UNREAD_FIELDS = ('id', 'sender', 'content', 'timestamp')
+
+
+@require_GET
+@api_login_required
+def sent_messages(request):
+    """JSON counterpart of conversation_thread: messages the user sent."""
+    return message_page(request, Message.objects.filter(sender=request.user), SENT_FIELDS)
+
+
+@require_GET
+@api_login_required
+def inbox_messages(request):
+    """JSON counterpart of conversation_view: messages the user received."""
+    return message_page(request, Message.objects.filter(receiver=request.user), INBOX_FIELDS)
+
+
+@require_GET
+@api_login_required
+def unread_messages(request):
+    """JSON counterpart of unread_inbox."""
+    return message_page(request, Message.unread.filter(receiver=request.user, read=False), UNREAD_FIELDS)
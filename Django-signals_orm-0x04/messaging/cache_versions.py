@@ -0,0 +1,23 @@
+import time
+
+from django.core.cache import cache
+
+
+def current_version(key):
+    """The version number stored under `key`, created on first use."""
+    version = cache.get(key)
+    if version is None:
+        # Starting from the clock keeps a re-created version ahead of the
+        # one the key held before eviction, so entries stored under the
+        # old number are never read again.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Move `key` to a new version, orphaning everything stored under the old one."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
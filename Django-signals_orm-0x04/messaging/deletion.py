@@ -0,0 +1,142 @@
+import logging
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from .inbox_cache import invalidate_inboxes
+from .models import Message, MessageHistory, Notification
+from .signals import promote_to_roots, refresh_thread_stats, refresh_unread_counts
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+
+def _name(model, field=None):
+    quote = connection.ops.quote_name
+    return quote(model._meta.db_table if field is None else model._meta.get_field(field).column)
+
+
+def _deletion_steps(user_id):
+    """
+    (label, model, statement, condition, params) in dependency order:
+    rows that point at the user's messages go first, then the messages.
+    Each statement must stop matching `condition` once applied.
+    """
+    message = _name(Message)
+    sender, receiver = _name(Message, 'sender'), _name(Message, 'receiver')
+    owned = f"{sender} = %s OR {receiver} = %s"
+    owned_ids = f"SELECT id FROM {message} WHERE {owned}"
+    survives = f"NOT ({owned})"
+    both = [user_id, user_id]
+    parent, root, edited_by = (
+        _name(Message, 'parent_message'), _name(Message, 'thread_root'), _name(Message, 'edited_by')
+    )
+    return [
+        ("notifications", Notification, f"DELETE FROM {_name(Notification)}",
+         f"{_name(Notification, 'user')} = %s OR {_name(Notification, 'message')} IN ({owned_ids})",
+         [user_id, *both]),
+        ("edit history", MessageHistory, f"DELETE FROM {_name(MessageHistory)}",
+         f"{_name(MessageHistory, 'original_message')} IN ({owned_ids})", both),
+        # Other people's replies survive; like on_delete=SET_NULL, they
+        # are detached from the messages being removed.
+        ("reply links", Message, f"UPDATE {message} SET {parent} = NULL",
+         f"{parent} IN ({owned_ids}) AND {survives}", both * 2),
+        ("thread links", Message, f"UPDATE {message} SET {root} = NULL",
+         f"{root} IN ({owned_ids}) AND {survives}", both * 2),
+        ("edited by", Message, f"UPDATE {message} SET {edited_by} = NULL",
+         f"{edited_by} = %s", [user_id]),
+        ("messages", Message, f"DELETE FROM {message}", owned, both),
+    ]
+
+
+def delete_user_data(user_id, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Remove everything the messaging app holds for a user with set-based
+    SQL, chunk_size rows per statement, without loading any rows.
+
+    Runs in the caller's transaction. `progress(label, rows_so_far)` is
+    called after every chunk. Returns {label: rows affected}.
+    """
+    message = _name(Message)
+    root, parent = _name(Message, 'thread_root'), _name(Message, 'parent_message')
+    owned = f"{_name(Message, 'sender')} = %s OR {_name(Message, 'receiver')} = %s"
+    with connection.cursor() as cursor:
+        # Threads started by someone else lose the user's replies.
+        cursor.execute(
+            f"SELECT DISTINCT {root} FROM {message} WHERE ({owned}) AND {root} IS NOT NULL",
+            [user_id, user_id],
+        )
+        affected_roots = [row[0] for row in cursor.fetchall()]
+        # Other people's direct replies to the user's messages start
+        # threads of their own once detached.
+        cursor.execute(
+            f"SELECT id FROM {message} WHERE NOT ({owned}) AND {parent} IN "
+            f"(SELECT id FROM {message} WHERE {owned})",
+            [user_id] * 4,
+        )
+        orphaned_replies = [row[0] for row in cursor.fetchall()]
+        # So do the inboxes and unread counters of people the user wrote to.
+        cursor.execute(
+            f"SELECT DISTINCT {_name(Message, 'receiver')} FROM {message} "
+            f"WHERE {_name(Message, 'sender')} = %s AND {_name(Message, 'receiver')} <> %s",
+            [user_id, user_id],
+        )
+        affected_receivers = [row[0] for row in cursor.fetchall()]
+
+        totals = {}
+        for label, model, statement, condition, params in _deletion_steps(user_id):
+            table, pk = _name(model), connection.ops.quote_name(model._meta.pk.column)
+            totals[label] = 0
+            while True:
+                cursor.execute(
+                    f"{statement} WHERE {pk} IN "
+                    f"(SELECT {pk} FROM {table} WHERE {condition} LIMIT %s)",
+                    [*params, chunk_size],
+                )
+                totals[label] += cursor.rowcount
+                if progress is not None:
+                    progress(label, totals[label])
+                if cursor.rowcount < chunk_size:
+                    break
+
+    for start in range(0, len(orphaned_replies), chunk_size):
+        promote_to_roots(orphaned_replies[start:start + chunk_size])
+    for start in range(0, len(affected_roots), chunk_size):
+        refresh_thread_stats(affected_roots[start:start + chunk_size])
+    refresh_unread_counts(affected_receivers)
+    invalidate_inboxes(affected_receivers)
+    return totals
+
+
+def delete_user(user, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Delete a user in one transaction. The messaging rows go first with
+    delete_user_data(), so the ORM cascade that follows only has to
+    collect the user's few remaining rows (groups, permissions, ...).
+    """
+    with transaction.atomic():
+        totals = delete_user_data(user.pk, chunk_size, progress)
+        user.delete()
+    return totals
+
+
+def delete_user_in_background(user, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Deactivate the user right away, then run delete_user() on a worker
+    thread. Returns the started thread.
+    """
+    User.objects.filter(pk=user.pk).update(is_active=False)
+
+    def run():
+        try:
+            delete_user(user, chunk_size, progress)
+        except Exception:
+            logger.exception("Could not delete user %s", user.pk)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run, name=f"delete-user-{user.pk}", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .cache_versions import bump_version, current_version
+
+INBOX_CACHE_TIMEOUT = 300  # seconds; entries are invalidated by version, not by expiry
+INBOX_CACHE_LIMIT = 50  # messages per entry, well inside memcached's 1 MB item limit
+
+
+def _version_key(user_id):
+    return f'messaging:inbox:version:{user_id}'
+
+
+def inbox_version(user_id):
+    return current_version(_version_key(user_id))
+
+
+def bump_inbox_version(user_id):
+    """Invalidate a user's cached inbox now."""
+    bump_version(_version_key(user_id))
+
+
+def invalidate_inboxes(user_ids):
+    """
+    Bump the inbox version of each user once the current transaction
+    commits, so a reader can't re-cache the old rows under the new version.
+    """
+    user_ids = set(user_ids)
+
+    def bump():
+        for user_id in user_ids:
+            bump_inbox_version(user_id)
+
+    transaction.on_commit(bump)
+
+
+def cached_inbox(user, build, limit=INBOX_CACHE_LIMIT):
+    """
+    The first `limit` messages of the queryset `build(user)` returns,
+    cached per user under their current inbox version. Any cache backend
+    works: the version lives in the same cache and the value is a short
+    pickled list. Older messages are paged through the API, not cached.
+    """
+    key = f'messaging:inbox:{user.pk}:{limit}:{inbox_version(user.pk)}'
+    messages = cache.get(key)
+    if messages is None:
+        messages = list(build(user)[:limit])
+        cache.set(key, messages, INBOX_CACHE_TIMEOUT)
+    return messages
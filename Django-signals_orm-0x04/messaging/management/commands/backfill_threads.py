@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from messaging.models import Message
+from messaging.signals import refresh_thread_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Message.thread_root, reply_count and last_reply_at for existing "
+        "rows. Top-level messages are streamed in chunks; each chunk of threads "
+        "is updated in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        root_ids = (
+            Message.objects.filter(parent_message__isnull=True)
+            .order_by("id").values_list("id", flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+        chunk, threads, replies = [], 0, 0
+        for root_id in root_ids:
+            chunk.append(root_id)
+            if len(chunk) == chunk_size:
+                replies += self.backfill(chunk)
+                threads += len(chunk)
+                chunk = []
+                self.stdout.write(f"{threads} threads, {replies} replies")
+        if chunk:
+            replies += self.backfill(chunk)
+            threads += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {threads} threads, {replies} replies"))
+
+    def thread_pairs_sql(self, root_ids):
+        # (reply id, root id) for every reply below the given top-level messages.
+        table = connection.ops.quote_name(Message._meta.db_table)
+        parent = connection.ops.quote_name(Message._meta.get_field("parent_message").column)
+        placeholders = ", ".join(["%s"] * len(root_ids))
+        sql = f"""
+            WITH RECURSIVE thread (id, root) AS (
+                SELECT id, id FROM {table} WHERE id IN ({placeholders})
+                UNION ALL
+                SELECT reply.id, thread.root
+                FROM {table} reply JOIN thread ON reply.{parent} = thread.id
+            )
+            SELECT id, root FROM thread WHERE id <> root
+        """
+        return sql, list(root_ids)
+
+    def backfill(self, root_ids):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(*self.thread_pairs_sql(root_ids))
+                pairs = cursor.fetchall()
+            Message.objects.bulk_update(
+                [Message(pk=reply_id, thread_root_id=root_id) for reply_id, root_id in pairs],
+                ["thread_root"], batch_size=500,
+            )
+            Message.objects.filter(pk__in=root_ids).exclude(thread_root=None).update(thread_root=None)
+            refresh_thread_stats(root_ids)
+        return len(pairs)
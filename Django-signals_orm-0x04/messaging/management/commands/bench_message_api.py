@@ -0,0 +1,68 @@
+import json
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from messaging.api import MAX_PAGE_SIZE
+from messaging.models import Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare materializing a large inbox as model instances (what the "
+        "template views do) with reading it through the streaming JSON API. "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=200000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options["messages"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def measure(self, label, load):
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = load()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(f"{label:<28} {count:>7} rows {elapsed:7.2f} s  peak {peak / 2**20:7.1f} MiB")
+
+    def run(self, count):
+        alice = User.objects.create_user(username="alice", password="bench")
+        bob = User.objects.create_user(username="bob", password="bench")
+        Message.objects.bulk_create(
+            [Message(sender=alice, receiver=bob, content=f"message {i}") for i in range(count)],
+            batch_size=5000,
+        )
+
+        def materialize():
+            return len(list(Message.objects.filter(receiver=bob).select_related("sender")))
+
+        client = Client()
+        client.force_login(bob)
+
+        def stream_pages():
+            rows, params = 0, {"limit": MAX_PAGE_SIZE}
+            while True:
+                response = client.get("/messaging/api/messages/inbox/", params)
+                body = json.loads(b"".join(response.streaming_content))
+                rows += len(body["results"])
+                if body["next"] is None:
+                    return rows
+                params["cursor"] = body["next"]
+
+        self.measure("queryset -> model instances", materialize)
+        self.measure(f"JSON API, {MAX_PAGE_SIZE}-row pages", stream_pages)
@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from messaging import signals
+from messaging.models import Message, Notification
+from messaging.notifications import notifications
+
+
+def legacy_notification(sender, instance, created, **kwargs):
+    # The per-save INSERT create_notification_for_new_message used to do.
+    if created:
+        Notification.objects.create(user=instance.receiver, message=instance)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-save notification INSERTs with the on-commit batching "
+        "pipeline when importing messages in one transaction. Runs against a "
+        "throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options["messages"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, count):
+        self.alice = User.objects.create_user(username="alice", password="bench")
+        self.bob = User.objects.create_user(username="bob", password="bench")
+
+        post_save.disconnect(signals.create_notification_for_new_message, sender=Message)
+        post_save.connect(legacy_notification, sender=Message)
+        try:
+            self.report("per-save create", count, self.save_each)
+        finally:
+            post_save.disconnect(legacy_notification, sender=Message)
+            post_save.connect(signals.create_notification_for_new_message, sender=Message)
+        self.report("on-commit batch", count, self.save_each)
+        self.report("bulk_create + add", count, self.bulk_import)
+
+    def messages(self, count):
+        return [Message(sender=self.alice, receiver=self.bob, content=f"m{i}") for i in range(count)]
+
+    def save_each(self, count):
+        with transaction.atomic():
+            for message in self.messages(count):
+                message.save()
+
+    def bulk_import(self, count):
+        with transaction.atomic():
+            notifications.add(Message.objects.bulk_create(self.messages(count)))
+
+    def report(self, label, count, load):
+        Notification.objects.all().delete()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            load(count)
+            elapsed = time.perf_counter() - start
+        table = Notification._meta.db_table
+        inserts = sum(q["sql"].startswith(f'INSERT INTO "{table}"') for q in queries.captured_queries)
+        assert Notification.objects.count() == count
+        self.stdout.write(
+            f"{label:<18} {count / elapsed:8.0f} messages/s  {inserts:5} notification INSERTs"
+        )
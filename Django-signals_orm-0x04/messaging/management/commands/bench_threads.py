@@ -0,0 +1,74 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from messaging.models import Message
+from messaging.views import get_threaded_messages
+
+
+def recursive_thread(parent):
+    # The per-node loader get_threaded_messages used to be, kept as the baseline.
+    replies = Message.objects.filter(parent_message=parent).select_related('sender', 'receiver')
+    thread = []
+    for reply in replies:
+        thread.append(reply)
+        thread += recursive_thread(reply)
+    return thread
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the recursive per-reply thread loader with the single-query "
+        "loader on deep, wide and bushy synthetic threads. Runs against a "
+        "throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--replies", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options["replies"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run(self, size):
+        self.alice = User.objects.create_user(username="alice", password="bench")
+        self.bob = User.objects.create_user(username="bob", password="bench")
+        shapes = {
+            "deep": lambda i, made: made[-1],          # a single chain
+            "wide": lambda i, made: made[0],           # every reply to the root
+            "bushy": lambda i, made: made[(i - 1) // 4],  # four replies per message
+        }
+        self.stdout.write(f"{'thread':<6} {'replies':>7} {'loader':<10} {'queries':>7} {'ms':>9}")
+        for shape, parent_of in shapes.items():
+            root = self.build(size, parent_of)
+            for label, load in (("recursive", recursive_thread), ("one-query", get_threaded_messages)):
+                connection.queries_log.clear()  # bounded; building the thread filled it
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    try:
+                        thread = load(root)
+                        result = f"{(time.perf_counter() - start) * 1000:9.1f}"
+                        assert len(thread) == size, len(thread)
+                    except RecursionError:
+                        result = f"{'RecursionError':>9}"
+                self.stdout.write(
+                    f"{shape:<6} {size:>7} {label:<10} {len(queries.captured_queries):>7} {result}"
+                )
+
+    def build(self, size, parent_of):
+        root = Message.objects.create(sender=self.alice, receiver=self.bob, content="root")
+        made = [root]
+        for i in range(1, size + 1):
+            made.append(Message.objects.create(
+                sender=self.bob, receiver=self.alice, content=f"reply {i}",
+                parent_message=parent_of(i, made),
+            ))
+        return root
@@ -0,0 +1,75 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from messaging.deletion import delete_user
+from messaging.models import Message, MessageHistory, Notification
+
+
+def legacy_delete_related_user_data(sender, instance, **kwargs):
+    # The post_delete(User) receiver user deletion used to run.
+    Message.objects.filter(sender=instance).delete()
+    Message.objects.filter(receiver=instance).delete()
+    Notification.objects.filter(user=instance).delete()
+    MessageHistory.objects.filter(original_message__sender=instance).delete()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare deleting a heavy user through the ORM cascade (plus the old "
+        "post_delete receiver) with the chunked set-based delete_user(). "
+        "Runs against a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.run(options["messages"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def seed(self, count):
+        heavy = User.objects.create_user(username="heavy", password="bench")
+        other, _ = User.objects.get_or_create(username="other")
+        messages = Message.objects.bulk_create(
+            [Message(sender=heavy, receiver=other, content=f"m{i}") for i in range(count)],
+            batch_size=2000,
+        )
+        Notification.objects.bulk_create(
+            [Notification(user=other, message=m) for m in messages], batch_size=2000
+        )
+        MessageHistory.objects.bulk_create(
+            [MessageHistory(original_message=m, old_content="old") for m in messages[::10]],
+            batch_size=2000,
+        )
+        return heavy
+
+    def measure(self, label, count, delete):
+        user = self.seed(count)
+        tracemalloc.start()
+        start = time.perf_counter()
+        delete(user)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert not Message.objects.exists() and not Notification.objects.exists()
+        self.stdout.write(f"{label:<22} {elapsed:8.2f} s  peak {peak / 2**20:8.1f} MiB")
+
+    def run(self, count):
+        self.stdout.write(f"user with {count} messages, {count} notifications, {count // 10} edits")
+        post_delete.connect(legacy_delete_related_user_data, sender=User)
+        try:
+            self.measure("user.delete() + signal", count, lambda user: user.delete())
+        finally:
+            post_delete.disconnect(legacy_delete_related_user_data, sender=User)
+        self.measure("delete_user()", count, delete_user)
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.deletion import CHUNK_SIZE, delete_user
+
+
+class Command(BaseCommand):
+    help = "Delete a user and all of their messaging data in chunks, reporting progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']!r}")
+
+        def progress(label, rows):
+            self.stdout.write(f"{label}: {rows}")
+
+        totals = delete_user(user, options["chunk_size"], progress)
+        summary = ", ".join(f"{rows} {label}" for label, rows in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Deleted {options['username']}: {summary}"))
@@ -1,5 +1,153 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+
+from .inbox_cache import invalidate_inboxes
+
+
+class MessageManager(models.Manager):
+    def bulk_edit(self, messages, fields, batch_size=None):
+        """
+        bulk_update() that also records edit history: every changed content
+        gets a MessageHistory row, all written with one bulk_create in the
+        same transaction as the update. Editing `read` recounts the
+        receivers' unread counters.
+        """
+        from .models import MessageHistory
+        from .signals import refresh_unread_counts
+
+        fields = set(fields)
+        histories = []
+        if 'content' in fields:
+            unknown = [m.pk for m in messages if m.loaded_value('content') is None]
+            stored = dict(self.filter(pk__in=unknown).values_list('pk', 'content')) if unknown else {}
+            for message in messages:
+                old_content = message.loaded_value('content')
+                if old_content is None:
+                    old_content = stored.get(message.pk)
+                if old_content is not None and old_content != message.content:
+                    message.edited = True
+                    histories.append(MessageHistory(original_message_id=message.pk, old_content=old_content))
+            fields.add('edited')
+        with transaction.atomic(savepoint=False):
+            MessageHistory.objects.bulk_create(histories, batch_size=batch_size)
+            updated = self.bulk_update(messages, fields, batch_size=batch_size)
+            if 'read' in fields:
+                # bulk_update() sends no post_save: recount the receivers.
+                refresh_unread_counts(message.receiver_id for message in messages)
+            invalidate_inboxes(message.receiver_id for message in messages)
+        for message in messages:
+            message.remember_values(fields)
+        return updated
+
 
 class UnreadMessagesManager(models.Manager):
     def unread_for_user(self, user):
-        return self.filter(receiver=user, read=False).only('id', 'content', 'timestamp').select_related('sender', 'receiver')
+        # Served from the partial message_unread_idx index, newest first.
+        return (
+            self.filter(receiver=user, read=False)
+            .only(
+                'id', 'content', 'timestamp', 'read', 'thread_root',
+                'sender__username', 'receiver__username',
+            )
+            .select_related('sender', 'receiver')
+            .order_by('-timestamp')
+        )
+
+    def unread_count(self, user):
+        """The user's unread badge count: one primary-key read."""
+        from .signals import unread_counter
+
+        return unread_counter(user.pk).count
+
+    def mark_read(self, user, message_ids):
+        """Mark some of the user's messages read with one UPDATE."""
+        from .signals import adjust_unread_count
+
+        with transaction.atomic():
+            marked = self.filter(receiver=user, read=False, pk__in=message_ids).update(read=True)
+            if marked:
+                adjust_unread_count(user.pk, -marked)
+                invalidate_inboxes([user.pk])
+        return marked
+
+    def mark_all_read(self, user):
+        """Mark every unread message of the user read with one UPDATE."""
+        from .models import UnreadCounter
+        from .signals import unread_counter
+
+        with transaction.atomic():
+            marked = self.filter(receiver=user, read=False).update(read=True)
+            if not UnreadCounter.objects.filter(user_id=user.pk).update(count=0):
+                unread_counter(user.pk)
+            if marked:
+                invalidate_inboxes([user.pk])
+        return marked
+
+
+class ThreadManager(models.Manager):
+    def reply_ids_sql(self, parent_id, max_depth=None, limit=None):
+        """
+        Recursive CTE selecting the ids of every reply below parent_id.
+        With a limit, replies are taken breadth-first so the kept part of
+        the thread stays connected to its parent.
+        """
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        parent = connection.ops.quote_name(self.model._meta.get_field('parent_message').column)
+        # Each message has one parent, so the only cycle reachable from
+        # parent_id runs back through parent_id itself: stopping there
+        # keeps a corrupted parent chain from recursing forever.
+        params = [parent_id, parent_id]
+        depth_filter = ''
+        if max_depth is not None:
+            depth_filter = 'AND thread.depth < %s'
+            params.append(max_depth)
+        tail = ''
+        if limit is not None:
+            tail = 'ORDER BY depth, id LIMIT %s'
+            params.append(limit)
+        sql = f"""
+            WITH RECURSIVE thread (id, depth) AS (
+                SELECT id, 1 FROM {table} WHERE {parent} = %s
+                UNION ALL
+                SELECT reply.id, thread.depth + 1
+                FROM {table} reply JOIN thread ON reply.{parent} = thread.id
+                WHERE reply.id <> %s {depth_filter}
+            )
+            SELECT id FROM thread {tail}
+        """
+        return sql, params
+
+    def replies_to(self, parent, max_depth=None, limit=None):
+        """Every reply below `parent`, at any depth, in a single query."""
+        if parent.parent_message_id is None and max_depth is None:
+            # A whole thread is one indexed range on thread_root. Replies
+            # are newer than their parent, so cutting by id stays connected.
+            replies = self.filter(thread_root=parent).select_related('sender', 'receiver').order_by('id')
+            return replies[:limit] if limit is not None else replies
+        sql, params = self.reply_ids_sql(parent.pk, max_depth, limit)
+        return (
+            self.filter(id__in=RawSQL(sql, params))
+            .select_related('sender', 'receiver')
+            .order_by('id')
+        )
+
+
+def build_thread(parent, replies):
+    """
+    Arrange `replies` under `parent` in one pass: a depth-first list (each
+    reply followed by its own replies) with `depth` set on every message.
+    Iterative, so thread depth is not bounded by the recursion limit.
+    """
+    children = defaultdict(list)
+    for reply in replies:
+        children[reply.parent_message_id].append(reply)
+    thread = []
+    stack = [(reply, 1) for reply in reversed(children[parent.pk])]
+    while stack:
+        message, depth = stack.pop()
+        message.depth = depth
+        thread.append(message)
+        stack.extend((reply, depth + 1) for reply in reversed(children[message.pk]))
+    return thread
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_unread_messages(apps, schema_editor):
+    Message = apps.get_model('messaging', 'Message')
+    UnreadCounter = apps.get_model('messaging', 'UnreadCounter')
+    unread = (
+        Message.objects.filter(read=False).order_by()
+        .values('receiver').annotate(count=Count('id'))
+    )
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=row['receiver'], count=row['count']) for row in unread.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('messaging', '0004_message_thread_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('read', False)), fields=['receiver', '-timestamp'], name='message_unread_idx'),
+        ),
+    ]
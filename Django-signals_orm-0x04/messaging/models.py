@@ -1,6 +1,6 @@
 from django.db import models
-from django.db import models
-from .managers import UnreadMessagesManager
+from django.db import models, transaction
+from .managers import MessageManager, ThreadManager, UnreadMessagesManager
 from django.contrib.auth.models import User
 
 class Message(models.Model):
@@ -11,9 +11,69 @@ class Message(models.Model):
     edited = models.BooleanField(default=False)
     edited_by = models.ForeignKey(User, null=True, blank=True, related_name='edited_messages', on_delete=models.SET_NULL)
     parent_message = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
+    # Denormalized thread data, maintained by the signals in signals.py:
+    # replies point at the top-level message of their thread (NULL on
+    # top-level messages), which counts and dates all replies below it.
+    thread_root = models.ForeignKey('self', null=True, blank=True, related_name='thread_replies', on_delete=models.SET_NULL)
+    reply_count = models.PositiveIntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True, blank=True)
     read = models.BooleanField(default=False)
-    objects = models.Manager()  # default
+    objects = MessageManager()  # default
     unread = UnreadMessagesManager()
+    threads = ThreadManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['thread_root', 'id'], name='message_thread_root_idx'),
+            # Keyset pages of a user's sent and received messages (api.py).
+            models.Index(fields=['sender', '-timestamp', '-id'], name='message_sender_ts_idx'),
+            models.Index(fields=['receiver', '-timestamp', '-id'], name='message_receiver_ts_idx'),
+            # Covers only unread rows, so it stays small as inboxes grow.
+            models.Index(
+                fields=['receiver', '-timestamp'], condition=models.Q(read=False),
+                name='message_unread_idx',
+            ),
+        ]
+
+    # Field values remembered from the last load or save, so signal
+    # handlers can see what changed without reading the row again.
+    TRACKED_FIELDS = ('content', 'read')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def loaded_value(self, name):
+        """`name` as last loaded or saved, or None if this instance never had it."""
+        return getattr(self, '_loaded_values', {}).get(name)
+
+    def remember_values(self, names):
+        if not hasattr(self, '_loaded_values'):
+            self._loaded_values = {}
+        for name in names:
+            if name in self.TRACKED_FIELDS:
+                self._loaded_values[name] = getattr(self, name)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # The row was just read: it is the new baseline for edits.
+        deferred = self.get_deferred_fields()
+        names = self.TRACKED_FIELDS if fields is None else fields
+        self.remember_values(name for name in names if name not in deferred)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            # log_message_edits may flag the message as edited.
+            kwargs['update_fields'] = {*update_fields, 'edited'}
+        # Keep the thread counters updated by post_save in the same transaction.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+        self.remember_values(self.TRACKED_FIELDS if update_fields is None else update_fields)
 
     def __str__(self):
         return f"From {self.sender} to {self.receiver}"
@@ -34,3 +94,12 @@ class Notification(models.Model):
 
     def __str__(self):
         return f"Notification for {self.user} - Message {self.message.id}"
+
+
+class UnreadCounter(models.Model):
+    """Number of unread messages per receiver, kept current by signals.py."""
+    user = models.OneToOneField(User, primary_key=True, related_name='unread_counter', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} has {self.count} unread messages"
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWriter(threading.Thread):
+    """
+    Background thread that takes lists of Notification objects off a
+    bounded queue and writes them with bulk_create, merging whatever is
+    queued into batches of up to batch_size rows.
+    """
+
+    _STOP = object()
+
+    def __init__(self, notification_queue, batch_size):
+        super().__init__(name="notification-writer", daemon=True)
+        self.queue = notification_queue
+        self.batch_size = batch_size
+        self.written = 0
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            items = [self.queue.get()]
+            while sum(len(item) for item in items if item is not self._STOP) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = self._STOP in items
+            batch = [n for item in items if item is not self._STOP for n in item]
+            try:
+                if batch:
+                    write_notifications(batch, self.batch_size)
+                    self.written += len(batch)
+            except Exception:
+                logger.exception("Could not write %d notifications", len(batch))
+            finally:
+                close_old_connections()
+                for _ in items:
+                    self.queue.task_done()
+        connection.close()
+
+    def stop(self, timeout=5):
+        self.queue.put(self._STOP)
+        self.join(timeout)
+
+
+def write_notifications(notifications, batch_size):
+    from .models import Notification
+
+    Notification.objects.bulk_create(notifications, batch_size=batch_size)
+
+
+class NotificationPipeline:
+    """
+    Collects the notifications created during a transaction and writes
+    them with one bulk_create once it commits, so importing a batch of
+    messages costs one notification INSERT instead of one per message.
+
+    With background=True the committed batch is handed to a
+    NotificationWriter instead; if its queue is full the batch is written
+    inline rather than dropped.
+    """
+
+    def __init__(self, batch_size=500, background=False, queue_size=1000):
+        self.batch_size = batch_size
+        self.background = background
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer = None
+        self._writer_lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**getattr(settings, "MESSAGING_NOTIFICATION_OPTIONS", {}))
+
+    def _state(self):
+        state = self._local
+        if not hasattr(state, "pending"):
+            state.pending = []
+            state.recheck = False
+        return state
+
+    def _flush_scheduled(self):
+        return connection.in_atomic_block and any(
+            func == self.flush for _, func, _ in connection.run_on_commit
+        )
+
+    def add(self, messages):
+        """Queue a notification to the receiver of each (saved) message."""
+        from .models import Notification
+
+        state = self._state()
+        scheduled = self._flush_scheduled()
+        if not scheduled:
+            # Anything still pending belongs to a transaction that rolled back.
+            state.pending, state.recheck = [], False
+        if connection.savepoint_ids:
+            # A savepoint may roll back on its own while the flush survives.
+            state.recheck = True
+        state.pending.extend(
+            Notification(user_id=message.receiver_id, message_id=message.pk)
+            for message in messages
+        )
+        if not scheduled:
+            transaction.on_commit(self.flush)
+
+    def flush(self):
+        from .models import Message
+
+        state = self._state()
+        pending, recheck = state.pending, state.recheck
+        state.pending, state.recheck = [], False
+        if recheck and pending:
+            alive = set(
+                Message.objects.filter(pk__in={n.message_id for n in pending})
+                .values_list("pk", flat=True)
+            )
+            pending = [n for n in pending if n.message_id in alive]
+        if not pending:
+            return
+        if self.background:
+            self._enqueue(pending)
+        else:
+            write_notifications(pending, self.batch_size)
+
+    def _enqueue(self, notifications):
+        self.start()
+        try:
+            self.queue.put_nowait(notifications)
+        except queue.Full:
+            write_notifications(notifications, self.batch_size)
+
+    def start(self):
+        with self._writer_lock:
+            if self.writer is None:
+                self.writer = NotificationWriter(self.queue, self.batch_size)
+                self.writer.start()
+                atexit.register(self.stop)
+        return self
+
+    def join(self):
+        """Block until every queued notification has been written."""
+        self.queue.join()
+
+    def stop(self):
+        with self._writer_lock:
+            writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.stop()
+
+
+notifications = NotificationPipeline.from_settings()
@@ -1,34 +1,220 @@
-from django.db.models.signals import post_save, pre_save, post_delete
-from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Message, Notification, MessageHistory
+from .models import Message, MessageHistory, UnreadCounter
+from .inbox_cache import invalidate_inboxes
+from .notifications import notifications
+
+
+def record_new_replies(root_id, count, latest_reply_at):
+    """
+    Add `count` replies to a thread root's counters in a single UPDATE;
+    `latest_reply_at` only moves last_reply_at forward.
+    """
+    is_newer = Q(last_reply_at__isnull=True) | Q(last_reply_at__lt=latest_reply_at)
+    Message.objects.filter(pk=root_id).update(
+        reply_count=F('reply_count') + count,
+        last_reply_at=Case(When(is_newer, then=Value(latest_reply_at)), default=F('last_reply_at')),
+    )
+
+
+def refresh_thread_stats(root_ids):
+    """Recount reply_count and last_reply_at of the given thread roots in one UPDATE."""
+    thread = Message.objects.filter(thread_root=OuterRef('pk')).order_by().values('thread_root')
+    Message.objects.filter(pk__in=root_ids).update(
+        reply_count=Coalesce(
+            Subquery(thread.annotate(n=Count('id')).values('n')), Value(0),
+            output_field=IntegerField(),
+        ),
+        last_reply_at=Subquery(thread.annotate(latest=Max('timestamp')).values('latest')),
+    )
+
+
+def promote_to_roots(message_ids):
+    """
+    Make each of `message_ids`, replies whose parent was deleted, the root
+    of its own thread: its replies at any depth move to it in one UPDATE,
+    and the new roots' counters are recounted. Callers recount old roots.
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return
+    quote = connection.ops.quote_name
+    table = quote(Message._meta.db_table)
+    parent = quote(Message._meta.get_field('parent_message').column)
+    root = quote(Message._meta.get_field('thread_root').column)
+    placeholders = ', '.join(['%s'] * len(message_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH RECURSIVE moved (id, root) AS (
+                SELECT id, id FROM {table} WHERE id IN ({placeholders})
+                UNION ALL
+                SELECT reply.id, moved.root
+                FROM {table} reply JOIN moved ON reply.{parent} = moved.id
+            )
+            UPDATE {table}
+            SET {root} = (SELECT NULLIF(moved.root, moved.id) FROM moved WHERE moved.id = {table}.id)
+            WHERE id IN (SELECT id FROM moved)
+            """,
+            message_ids,
+        )
+    refresh_thread_stats(message_ids)
+
+
+def unread_counter(user_id):
+    """The user's UnreadCounter, created from a COUNT the first time."""
+    counter = UnreadCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        counted = Message.objects.filter(receiver_id=user_id, read=False).count()
+        counter, _ = UnreadCounter.objects.get_or_create(user_id=user_id, defaults={'count': counted})
+    return counter
+
+
+def adjust_unread_count(user_id, delta):
+    """Move a user's unread count by `delta` in a single UPDATE."""
+    updated = UnreadCounter.objects.filter(user_id=user_id).update(
+        count=Case(When(count__gt=-delta, then=F('count') + delta), default=Value(0))
+    )
+    if not updated:
+        # First change for this user: the COUNT already includes it.
+        unread_counter(user_id)
+
+
+def refresh_unread_counts(user_ids):
+    """Recount the unread counters of the given users, e.g. after bulk_create()."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    unread = dict(
+        Message.objects.filter(receiver_id__in=user_ids, read=False).order_by()
+        .values_list('receiver').annotate(Count('id'))
+    )
+    existing = set(UnreadCounter.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    UnreadCounter.objects.bulk_update(
+        [UnreadCounter(user_id=user_id, count=unread.get(user_id, 0)) for user_id in existing], ['count']
+    )
+    UnreadCounter.objects.bulk_create(
+        [UnreadCounter(user_id=user_id, count=unread.get(user_id, 0)) for user_id in user_ids - existing],
+        ignore_conflicts=True,
+    )
+
+
+@receiver(post_save, sender=Message)
+def update_unread_count_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        if not instance.read:
+            adjust_unread_count(instance.receiver_id, 1)
+        return
+    if update_fields is not None and 'read' not in update_fields:
+        return
+    was_read = instance.loaded_value('read')  # save() refreshes it only after post_save
+    if was_read is None:
+        # `read` was never loaded (deferred, or built by hand): recount.
+        refresh_unread_counts([instance.receiver_id])
+    elif was_read != instance.read:
+        adjust_unread_count(instance.receiver_id, -1 if instance.read else 1)
+
+
+@receiver(post_delete, sender=Message)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    # Touching a deferred field here would refetch the deleted row.
+    read = instance.__dict__.get('read')
+    if read is None:
+        refresh_unread_counts([instance.receiver_id])
+    elif not read:
+        adjust_unread_count(instance.receiver_id, -1)
+
+
+@receiver(post_save, sender=Message)
+def invalidate_inbox_on_save(sender, instance, **kwargs):
+    invalidate_inboxes([instance.receiver_id])
+
+
+@receiver(post_delete, sender=Message)
+def invalidate_inbox_on_delete(sender, instance, **kwargs):
+    invalidate_inboxes([instance.receiver_id])
+
+
+@receiver(pre_save, sender=Message)
+def set_thread_root(sender, instance, **kwargs):
+    if not instance._state.adding or instance.parent_message_id is None or instance.thread_root_id:
+        return
+    if Message.parent_message.is_cached(instance):
+        parent_root_id = instance.parent_message.thread_root_id
+    else:
+        parent_root_id = (
+            Message.objects.filter(pk=instance.parent_message_id)
+            .values_list('thread_root_id', flat=True).first()
+        )
+    instance.thread_root_id = parent_root_id or instance.parent_message_id
+
+
+@receiver(post_save, sender=Message)
+def update_thread_stats_on_reply(sender, instance, created, **kwargs):
+    # Runs inside Message.save()'s transaction.
+    if created and instance.thread_root_id:
+        record_new_replies(instance.thread_root_id, 1, instance.timestamp)
+
+
+@receiver(pre_delete, sender=Message)
+def load_thread_root_before_delete(sender, instance, **kwargs):
+    # A deferred thread_root_id can only be read while the row exists;
+    # update_thread_stats_on_delete runs after it is gone.
+    if 'thread_root_id' in instance.get_deferred_fields():
+        instance.refresh_from_db(fields=['thread_root'])
+    # So can the direct replies that on_delete=SET_NULL is about to detach.
+    instance._orphaned_reply_ids = list(
+        Message.objects.filter(parent_message_id=instance.pk).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Message)
+def update_thread_stats_on_delete(sender, instance, **kwargs):
+    # Runs inside the delete's transaction.
+    root_id = instance.__dict__.get('thread_root_id')
+    orphans = getattr(instance, '_orphaned_reply_ids', None)
+    if orphans:
+        # Each detached reply starts a thread of its own, taking its
+        # replies (still pointing at the old root) with it.
+        promote_to_roots(orphans)
+        if root_id:
+            refresh_thread_stats([root_id])
+        return
+    if not root_id:
+        return
+    latest = (
+        Message.objects.filter(thread_root=OuterRef('pk'))
+        .order_by('-timestamp')
+        .values('timestamp')[:1]
+    )
+    Message.objects.filter(pk=root_id).update(
+        reply_count=Case(When(reply_count__gt=0, then=F('reply_count') - 1), default=Value(0)),
+        last_reply_at=Subquery(latest),
+    )
 
 
 @receiver(post_save, sender=Message)
 def create_notification_for_new_message(sender, instance, created, **kwargs):
     if created:
-        Notification.objects.create(user=instance.receiver, message=instance)
+        # Written with the rest of the transaction's notifications on commit.
+        notifications.add([instance])
 
 
 @receiver(pre_save, sender=Message)
-def log_message_edits(sender, instance, **kwargs):
-    if instance.pk:  # Only check if it's an update
-        try:
-            old_message = Message.objects.get(pk=instance.pk)
-            if old_message.content != instance.content:
-                instance.edited = True
-                MessageHistory.objects.create(
-                    original_message=old_message,
-                    old_content=old_message.content
-                )
-        except Message.DoesNotExist:
-            pass
-
-
-@receiver(post_delete, sender=User)
-def delete_related_user_data(sender, instance, **kwargs):
-    from .models import Message, Notification, MessageHistory
-    Message.objects.filter(sender=instance).delete()
-    Message.objects.filter(receiver=instance).delete()
-    Notification.objects.filter(user=instance).delete()
-    MessageHistory.objects.filter(original_message__sender=instance).delete()
\ No newline at end of file
+def log_message_edits(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        return
+    if update_fields is not None and 'content' not in update_fields:
+        return  # e.g. save(update_fields=['read'])
+    old_content = instance.loaded_value('content')
+    if old_content is None:
+        # Not loaded by this instance (deferred, or built by hand).
+        old_content = (
+            Message.objects.filter(pk=instance.pk).values_list('content', flat=True).first()
+        )
+    if old_content is not None and old_content != instance.content:
+        instance.edited = True
+        MessageHistory.objects.create(original_message_id=instance.pk, old_content=old_content)
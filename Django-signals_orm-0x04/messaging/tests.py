@@ -1,15 +1,515 @@
-from django.test import TestCase
+import json
+import tempfile
+from io import StringIO
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.contrib.auth.models import User
-from .models import Message, Notification
+from .models import Message, MessageHistory, Notification, UnreadCounter
+from .deletion import delete_user
+from .notifications import NotificationPipeline, notifications
+from .signals import adjust_unread_count
+from . import views
+from .inbox_cache import cached_inbox
+from .views import get_threaded_messages
 
 class MessageSignalTest(TestCase):
     def test_notification_created_on_message_send(self):
         sender = User.objects.create_user(username='alice', password='pass')
         receiver = User.objects.create_user(username='bob', password='pass')
-        message = Message.objects.create(sender=sender, receiver=receiver, content="Hello Bob!")
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(sender=sender, receiver=receiver, content="Hello Bob!")
 
         notification_exists = Notification.objects.filter(user=receiver, message=message).exists()
         self.assertTrue(notification_exists)
 
+
+
+class ThreadedMessagesTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.root = Message.objects.create(sender=self.alice, receiver=self.bob, content="root")
+
+    def reply(self, parent, content):
+        return Message.objects.create(
+            sender=self.bob, receiver=self.alice, content=content, parent_message=parent
+        )
+
+    def test_thread_is_depth_first_and_loaded_in_one_query(self):
+        a = self.reply(self.root, "a")
+        b = self.reply(self.root, "b")
+        self.reply(a, "a1")
+        self.reply(b, "b1")
+        self.reply(a, "a2")
+
+        with self.assertNumQueries(1):
+            thread = get_threaded_messages(self.root)
+            rendered = [(m.content, m.depth, m.sender.username) for m in thread]
+        self.assertEqual(rendered, [
+            ("a", 1, "bob"), ("a1", 2, "bob"), ("a2", 2, "bob"), ("b", 1, "bob"), ("b1", 2, "bob"),
+        ])
+
+    def test_deep_thread_does_not_recurse(self):
+        parent = self.root
+        for i in range(1200):
+            parent = self.reply(parent, str(i))
+        with self.assertNumQueries(1):
+            thread = get_threaded_messages(self.root)
+        self.assertEqual(len(thread), 1200)
+        self.assertEqual(thread[-1].depth, 1200)
+
+    def test_depth_and_size_limits(self):
+        a = self.reply(self.root, "a")
+        self.reply(self.root, "b")
+        self.reply(self.reply(a, "a1"), "a1x")
+
+        self.assertEqual([m.content for m in get_threaded_messages(self.root, max_depth=2)],
+                         ["a", "a1", "b"])
+        # Breadth-first truncation keeps every kept reply attached.
+        self.assertEqual([m.content for m in get_threaded_messages(self.root, limit=3)],
+                         ["a", "a1", "b"])
+
+    def test_a_parent_cycle_does_not_recurse_forever(self):
+        a = self.reply(self.root, "a")
+        b = self.reply(a, "b")
+        Message.objects.filter(pk=a.pk).update(parent_message=b)
+        a.refresh_from_db()
+        self.assertEqual([m.content for m in get_threaded_messages(a)], ["b"])
+
+
+class ThreadStatsTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.root = Message.objects.create(sender=self.alice, receiver=self.bob, content="root")
+
+    def reply(self, parent, content):
+        return Message.objects.create(
+            sender=self.bob, receiver=self.alice, content=content, parent_message=parent
+        )
+
+    def test_replies_point_at_root_and_update_its_counters(self):
+        first = self.reply(self.root, "first")
+        nested = self.reply(Message.objects.get(pk=first.pk), "nested")
+        self.assertEqual(first.thread_root_id, self.root.pk)
+        self.assertEqual(nested.thread_root_id, self.root.pk)
+
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 2)
+        self.assertEqual(self.root.last_reply_at, nested.timestamp)
+
+        nested.delete()
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 1)
+        self.assertEqual(self.root.last_reply_at, first.timestamp)
+
+    def test_deleting_a_reply_loaded_without_its_thread_root(self):
+        first = self.reply(self.root, "first")
+        self.reply(self.root, "second")
+        Message.objects.only('id', 'read', 'receiver').get(pk=first.pk).delete()
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 1)
+
+    def test_deleting_a_mid_thread_reply_starts_a_thread_below_it(self):
+        a = self.reply(self.root, "a")
+        b = self.reply(a, "b")
+        c = self.reply(b, "c")
+        Message.objects.get(pk=a.pk).delete()
+
+        b.refresh_from_db()
+        self.assertEqual((b.parent_message_id, b.thread_root_id), (None, None))
+        self.assertEqual((b.reply_count, b.last_reply_at), (1, c.timestamp))
+        self.assertEqual(list(Message.threads.replies_to(b)), [c])
+        self.root.refresh_from_db()
+        self.assertEqual((self.root.reply_count, self.root.last_reply_at), (0, None))
+
+    def test_deleting_a_root_makes_its_replies_roots(self):
+        x = self.reply(self.root, "x")
+        y = self.reply(x, "y")
+        self.reply(self.root, "z")
+        self.root.delete()
+
+        x.refresh_from_db()
+        self.assertIsNone(x.thread_root_id)
+        self.assertEqual(list(Message.threads.replies_to(x)), [y])
+        self.assertEqual(x.reply_count, 1)
+        self.assertEqual(Message.objects.get(pk=y.pk).thread_root_id, x.pk)
+
+    def test_backfill_rebuilds_thread_columns(self):
+        first = self.reply(self.root, "first")
+        nested = self.reply(first, "nested")
+        Message.objects.update(thread_root=None, reply_count=0, last_reply_at=None)
+
+        call_command('backfill_threads', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            set(Message.objects.filter(thread_root=self.root).values_list('id', flat=True)),
+            {first.pk, nested.pk},
+        )
+        self.root.refresh_from_db()
+        self.assertEqual((self.root.reply_count, self.root.last_reply_at), (2, nested.timestamp))
+
+
+def notification_inserts(queries):
+    table = Notification._meta.db_table
+    return [q for q in queries.captured_queries if q['sql'].startswith(f'INSERT INTO "{table}"')]
+
+
+class NotificationPipelineTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+
+    def message(self, content):
+        return Message(sender=self.alice, receiver=self.bob, content=content)
+
+    def test_notifications_wait_for_commit_and_are_written_together(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for i in range(5):
+                        self.message(str(i)).save()
+                    self.assertFalse(Notification.objects.exists())
+        self.assertEqual(Notification.objects.filter(user=self.bob).count(), 5)
+        self.assertEqual(len(notification_inserts(queries)), 1)
+
+    def test_bulk_import_notifies_with_one_insert(self):
+        messages = Message.objects.bulk_create([self.message(str(i)) for i in range(50)])
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                notifications.add(messages)
+        self.assertEqual(Notification.objects.count(), 50)
+        self.assertEqual(len(notification_inserts(queries)), 1)
+
+    def test_rolled_back_savepoint_is_not_notified(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kept = Message.objects.create(sender=self.alice, receiver=self.bob, content="kept")
+            try:
+                with transaction.atomic():
+                    Message.objects.create(sender=self.alice, receiver=self.bob, content="lost")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(list(Notification.objects.values_list('message_id', flat=True)), [kept.pk])
+
+
+class BackgroundNotificationTest(TransactionTestCase):
+    def test_background_writer_writes_committed_notifications(self):
+        alice = User.objects.create_user(username='alice', password='pass')
+        bob = User.objects.create_user(username='bob', password='pass')
+        pipeline = NotificationPipeline(background=True, batch_size=10)
+        try:
+            with transaction.atomic():
+                messages = Message.objects.bulk_create(
+                    [Message(sender=alice, receiver=bob, content=str(i)) for i in range(25)]
+                )
+                pipeline.add(messages)
+            pipeline.join()
+        finally:
+            pipeline.stop()
+        self.assertEqual(Notification.objects.filter(user=bob).count(), 25)
+
+
+class EditHistoryTest(TestCase):
+    def setUp(self):
+        alice = User.objects.create_user(username='alice', password='pass')
+        bob = User.objects.create_user(username='bob', password='pass')
+        Message.objects.bulk_create(
+            [Message(sender=alice, receiver=bob, content=f"v1 {i}") for i in range(3)]
+        )
+        self.message = Message.objects.first()
+
+    def test_edit_is_logged_without_reading_the_old_row(self):
+        self.message.content = "v2"
+        with self.assertNumQueries(2):  # UPDATE message, INSERT history
+            self.message.save()
+        self.message.content = "v3"
+        self.message.save()
+
+        self.message.refresh_from_db()
+        self.assertTrue(self.message.edited)
+        self.assertEqual(
+            list(self.message.histories.order_by('id').values_list('old_content', flat=True)),
+            ["v1 0", "v2"],
+        )
+
+    def test_edit_after_refresh_compares_with_the_refreshed_content(self):
+        Message.objects.filter(pk=self.message.pk).update(content="v2")
+        self.message.refresh_from_db()
+        self.message.content = "v1 0"
+        self.message.save()
+        self.assertEqual(list(self.message.histories.values_list('old_content', flat=True)), ["v2"])
+
+    def test_saves_that_leave_content_alone_log_nothing(self):
+        Message.unread.unread_count(self.message.receiver)
+        self.message.read = True
+        with self.assertNumQueries(2):  # UPDATE message, UPDATE unread counter
+            self.message.save(update_fields=['read'])
+        with self.assertNumQueries(1):
+            self.message.save()
+        self.assertFalse(MessageHistory.objects.exists())
+
+    def test_update_fields_content_also_saves_edited_flag(self):
+        self.message.content = "v2"
+        self.message.save(update_fields=['content'])
+        self.assertTrue(Message.objects.get(pk=self.message.pk).edited)
+
+    def test_unloaded_instance_falls_back_to_reading_content(self):
+        message = Message.objects.only('id', 'sender', 'receiver').get(pk=self.message.pk)
+        message.content = "v2"
+        message.save(update_fields=['content'])
+        self.assertEqual(MessageHistory.objects.get().old_content, "v1 0")
+
+    def test_bulk_edit_writes_history_in_one_insert(self):
+        messages = list(Message.objects.order_by('id'))
+        for message in messages[:2]:
+            message.content = message.content.replace("v1", "v2")
+        table = MessageHistory._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            Message.objects.bulk_edit(messages, ['content'])
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith(f'INSERT INTO "{table}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(MessageHistory.objects.values_list('old_content', flat=True)), ["v1 0", "v1 1"]
+        )
+        self.assertEqual(
+            list(Message.objects.order_by('id').values_list('edited', flat=True)), [True, True, False]
+        )
+
+
+class UserDeletionTest(TestCase):
+    def setUp(self):
+        self.heavy = User.objects.create_user(username='heavy', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+
+    def seed(self, count):
+        messages = Message.objects.bulk_create([
+            Message(sender=self.heavy, receiver=self.other, content=str(i)) for i in range(count)
+        ])
+        notifications.add(messages)
+        notifications.flush()
+        MessageHistory.objects.bulk_create(
+            [MessageHistory(original_message=m, old_content="old") for m in messages]
+        )
+        return messages
+
+    def test_removes_user_data_and_keeps_other_replies(self):
+        mine = self.seed(5)[0]
+        theirs = Message.objects.create(sender=self.other, receiver=self.other, content="root")
+        my_reply = Message.objects.create(
+            sender=self.heavy, receiver=self.other, content="reply", parent_message=theirs
+        )
+        their_reply = Message.objects.create(
+            sender=self.other, receiver=self.other, content="answer", parent_message=mine
+        )
+        their_nested = Message.objects.create(
+            sender=self.other, receiver=self.other, content="nested", parent_message=their_reply
+        )
+        Message.objects.filter(pk=theirs.pk).update(edited_by=self.heavy)
+
+        totals = delete_user(self.heavy, chunk_size=2)
+
+        self.assertFalse(User.objects.filter(username='heavy').exists())
+        self.assertEqual(totals['messages'], 6)
+        self.assertFalse(MessageHistory.objects.exists())
+        self.assertFalse(Notification.objects.filter(message_id=my_reply.pk).exists())
+        their_reply.refresh_from_db()
+        self.assertEqual((their_reply.parent_message_id, their_reply.thread_root_id), (None, None))
+        self.assertEqual(their_reply.reply_count, 1)
+        self.assertEqual(Message.objects.get(pk=their_nested.pk).thread_root_id, their_reply.pk)
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.reply_count, theirs.edited_by_id), (0, None))
+        self.assertEqual(Message.unread.unread_count(self.other), 3)
+
+    def test_delete_user_view_deletes_the_logged_in_user(self):
+        self.seed(3)
+        self.client.force_login(self.heavy)
+        response = self.client.post(reverse('delete-user'))
+        self.assertRedirects(response, reverse('admin:login'))
+        self.assertFalse(User.objects.filter(username='heavy').exists())
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+    def test_query_count_does_not_grow_with_messages(self):
+        Message.unread.unread_count(self.other)  # same counter path for both runs
+        def queries_for(count):
+            self.seed(count)
+            with CaptureQueriesContext(connection) as queries:
+                delete_user(self.heavy)
+            user = User.objects.create_user(username='heavy', password='pass')
+            self.heavy = user
+            return len(queries.captured_queries)
+
+        self.assertEqual(queries_for(10), queries_for(200))
+
+
+class UnreadCounterTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.messages = [
+            Message.objects.create(sender=self.alice, receiver=self.bob, content=str(i))
+            for i in range(4)
+        ]
+
+    def test_counter_follows_creates_reads_and_deletes(self):
+        self.assertEqual(Message.unread.unread_count(self.bob), 4)
+        first, second = Message.objects.order_by('id')[:2]
+        first.read = True
+        first.save(update_fields=['read'])
+        second.delete()
+        self.messages[2].read = True
+        self.messages[2].save()
+        with self.assertNumQueries(1):
+            self.assertEqual(Message.unread.unread_count(self.bob), 1)
+        self.assertEqual(Message.unread.unread_count(self.alice), 0)
+
+    def test_deleting_messages_from_the_inbox_queryset(self):
+        Message.unread.unread_for_user(self.bob)[0].delete()
+        Message.objects.defer('read').get(pk=self.messages[0].pk).delete()
+        self.assertEqual(Message.unread.unread_count(self.bob), 2)
+
+    def test_read_change_after_refresh_moves_the_counter(self):
+        self.assertEqual(Message.unread.unread_count(self.bob), 4)
+        message = Message.objects.get(pk=self.messages[0].pk)
+        Message.objects.filter(pk=message.pk).update(read=True)
+        adjust_unread_count(self.bob.pk, -1)
+        message.refresh_from_db()
+        message.read = False
+        message.save()
+        self.assertEqual(Message.unread.unread_count(self.bob), 4)
+
+    def test_bulk_edit_of_read_recounts(self):
+        self.assertEqual(Message.unread.unread_count(self.bob), 4)
+        for message in self.messages[:3]:
+            message.read = True
+        Message.objects.bulk_edit(self.messages[:3], ['read'])
+        self.assertEqual(Message.unread.unread_count(self.bob), 1)
+
+    def test_mark_read_and_mark_all_read(self):
+        self.assertEqual(Message.unread.mark_read(self.bob, [self.messages[0].pk]), 1)
+        self.assertEqual(Message.unread.unread_count(self.bob), 3)
+        with self.assertNumQueries(4):  # savepoint, UPDATE messages, UPDATE counter, release
+            self.assertEqual(Message.unread.mark_all_read(self.bob), 3)
+        self.assertEqual(Message.unread.unread_count(self.bob), 0)
+        self.assertFalse(Message.unread.unread_for_user(self.bob).exists())
+
+    def test_missing_counter_is_rebuilt_from_messages(self):
+        UnreadCounter.objects.all().delete()
+        Message.objects.create(sender=self.alice, receiver=self.bob, content="new")
+        self.assertEqual(Message.unread.unread_count(self.bob), 5)
+
+    def test_inbox_lists_unread_newest_first(self):
+        self.messages[3].read = True
+        self.messages[3].save()
+        inbox = Message.unread.unread_for_user(self.bob)
+        self.assertEqual([m.content for m in inbox], ["2", "1", "0"])
+        self.assertEqual(inbox[0].sender.username, 'alice')
+
+
+class InboxCacheTest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.carol = User.objects.create_user(username='carol', password='pass')
+        cache.clear()  # user ids repeat across tests
+        self.send(self.bob, "hi bob")
+
+    def send(self, receiver, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(sender=self.alice, receiver=receiver, content=content)
+
+    def inbox(self, user):
+        return [m.content for m in cached_inbox(user, views.received_messages)]
+
+    def check_inbox_cache(self):
+        self.assertEqual(self.inbox(self.bob), ["hi bob"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.inbox(self.bob), ["hi bob"])
+        self.assertEqual(self.inbox(self.carol), [])  # not bob's cached page
+
+        self.send(self.carol, "hi carol")
+        with self.assertNumQueries(0):  # carol's message leaves bob's entry alone
+            self.inbox(self.bob)
+        message = self.send(self.bob, "again")
+        self.assertEqual(self.inbox(self.bob), ["again", "hi bob"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            message.delete()
+        self.assertEqual(self.inbox(self.bob), ["hi bob"])
+
+    def test_locmem_cache(self):
+        self.check_inbox_cache()
+
+    def test_only_the_newest_page_is_cached(self):
+        for i in range(3):
+            self.send(self.bob, f"later {i}")
+        inbox = cached_inbox(self.bob, views.received_messages, limit=2)
+        self.assertEqual([m.content for m in inbox], ["later 2", "later 1"])
+
+    def test_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}
+            with override_settings(CACHES=file_cache):
+                self.check_inbox_cache()
+
+
+class MessageAPITest(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        Message.objects.bulk_create([
+            Message(sender=self.alice, receiver=self.bob, content=str(i), read=i % 2 == 0)
+            for i in range(5)
+        ])
+        self.client.force_login(self.bob)
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        if response.streaming:
+            return response.status_code, json.loads(b''.join(response.streaming_content))
+        return response.status_code, response.json()
+
+    def test_pages_follow_the_cursor_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            status, body = self.get('/messaging/api/messages/inbox/', **params)
+            self.assertEqual(status, 200)
+            seen.append([m['content'] for m in body['results']])
+            cursor = body['next']
+            if cursor is None:
+                break
+        self.assertEqual(seen, [["4", "3"], ["2", "1"], ["0"]])
+
+    def test_fields_are_projected(self):
+        status, body = self.get('/messaging/api/messages/unread/', fields='content,sender')
+        self.assertEqual(body['results'], [
+            {'content': '3', 'sender': 'alice'}, {'content': '1', 'sender': 'alice'},
+        ])
+        status, body = self.get('/messaging/api/messages/unread/', fields='password')
+        self.assertEqual(status, 400)
+
+    def test_sent_messages_and_bad_input(self):
+        self.client.force_login(self.alice)
+        status, body = self.get('/messaging/api/messages/sent/', fields='receiver')
+        self.assertEqual(body['results'], [{'receiver': 'bob'}] * 5)
+        self.assertEqual(self.get('/messaging/api/messages/sent/', cursor='nope')[0], 400)
+        self.assertEqual(self.get('/messaging/api/messages/sent/', limit=0)[0], 400)
+
+    def test_anonymous_gets_401(self):
+        self.client.logout()
+        self.assertEqual(self.get('/messaging/api/messages/inbox/')[0], 401)
+
+    def test_one_query_per_page(self):
+        response = self.client.get('/messaging/api/messages/inbox/', {'limit': 3})
+        with self.assertNumQueries(1):
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body['results']), 3)
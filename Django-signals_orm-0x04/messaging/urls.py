@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import api, views
+
+urlpatterns = [
+    path('account/delete/', views.delete_user, name='delete-user'),
+    path('api/messages/sent/', api.sent_messages, name='api-sent-messages'),
+    path('api/messages/inbox/', api.inbox_messages, name='api-inbox-messages'),
+    path('api/messages/unread/', api.unread_messages, name='api-unread-messages'),
+]
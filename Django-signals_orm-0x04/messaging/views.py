@@ -1,41 +1,55 @@
+from django.conf import settings
+from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
+from django.views.decorators.http import require_POST
+from . import deletion
+from .inbox_cache import cached_inbox
+from .managers import build_thread
 from .models import Message
 from django.shortcuts import render
-from django.views.decorators.cache import cache_page
 
 
 
 
+@require_POST
 @login_required
 def delete_user(request):
     user = request.user
-    user.delete()
-    return redirect("home") 
+    logout(request)  # end the session before its user row goes away
+    deletion.delete_user(user)
+    return redirect(settings.LOGIN_URL)
 
 def conversation_thread(request):
     messages = Message.objects.filter(sender=request.user).select_related('receiver').prefetch_related('histories')
     return render(request, 'messaging/thread.html', {'messages': messages})
 
 
-def get_threaded_messages(parent):
-    replies = Message.objects.filter(parent_message=parent).select_related('sender', 'receiver')
-    thread = []
-    for reply in replies:
-        thread.append(reply)
-        thread += get_threaded_messages(reply)
-    return thread
+MAX_THREAD_REPLIES = 1000
+
+
+def get_threaded_messages(parent, max_depth=None, limit=None):
+    replies = Message.threads.replies_to(parent, max_depth=max_depth, limit=limit)
+    return build_thread(parent, replies)
 
 def view_message_thread(request, message_id):
     parent = Message.objects.select_related('sender', 'receiver').get(id=message_id)
-    thread = get_threaded_messages(parent)
+    thread = get_threaded_messages(parent, limit=MAX_THREAD_REPLIES)
     return render(request, 'messaging/thread_detail.html', {'parent': parent, 'thread': thread})
 
 def unread_inbox(request):
     unread_messages = Message.unread.unread_for_user(request.user)
     return render(request, 'messaging/unread_inbox.html', {'messages': unread_messages})
 
-@cache_page(60)  # 60 seconds
+def received_messages(user):
+    return (
+        Message.objects.filter(receiver=user).select_related('sender')
+        .only('id', 'content', 'timestamp', 'sender__username')
+        .order_by('-timestamp', '-id')
+    )
+
+@login_required
 def conversation_view(request):
-    messages = Message.objects.filter(receiver=request.user).select_related('sender').only('id', 'content', 'timestamp')
+    # Newest page cached per user; signals.py bumps the version when the inbox changes.
+    messages = cached_inbox(request.user, received_messages)
     return render(request, 'messaging/conversations.html', {'messages': messages})
@@ -1,26 +1,85 @@
 import sqlite3
+from collections import namedtuple
 
 class ExecuteQuery:
-    def __init__(self, db_name, query, params=()):
+    """
+    Runs `query` on enter. By default the `as` target is the full result
+    list; with stream=True it is an iterator that fetches `chunk_size`
+    rows at a time, so memory stays flat however many rows match, and
+    leaving the block early closes the cursor without reading the rest.
+
+    row_factory may be "namedtuple" (rows named after the columns) or any
+    sqlite3 row factory such as sqlite3.Row.
+
+    Pass an open `connection` to reuse it: sqlite3 keeps a per-connection
+    cache of prepared statements (cached_statements), so running the same
+    query text again skips re-preparing it. A passed connection is left
+    open on exit; one opened here is closed.
+    """
+
+    def __init__(self, db_name, query, params=(), stream=False, chunk_size=1000,
+                 row_factory=None, connection=None):
         self.db_name = db_name
         self.query = query
         self.params = params
-        self.connection = None
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.row_factory = row_factory
+        self.connection = connection
+        self.owns_connection = connection is None
         self.cursor = None
         self.result = None
 
     def __enter__(self):
-        self.connection = sqlite3.connect(self.db_name)
-        self.cursor = self.connection.cursor()
-        self.cursor.execute(self.query, self.params)
-        self.result = self.cursor.fetchall()
+        if self.owns_connection:
+            self.connection = sqlite3.connect(self.db_name)
+        try:
+            self.cursor = self.connection.cursor()
+            if self.row_factory is not None and self.row_factory != "namedtuple":
+                self.cursor.row_factory = self.row_factory
+            self.cursor.execute(self.query, self.params)
+            if self.stream:
+                self.result = self._rows()
+            else:
+                self.result = self._convert(self.cursor.fetchall())
+        except BaseException:
+            # __exit__ does not run when __enter__ raises.
+            self.close()
+            raise
         return self.result  # Passed to the `as` part in the with block
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
+    def _make_row(self):
+        # Row constructor for "namedtuple" output, built once per execution;
+        # statements that return no rows have no description.
+        if self.row_factory != "namedtuple" or self.cursor.description is None:
+            return None
+        columns = [column[0] for column in self.cursor.description]
+        return namedtuple("Row", columns, rename=True)._make
+
+    def _convert(self, rows):
+        make = self._make_row()
+        return rows if make is None else list(map(make, rows))
+
+    def _rows(self):
+        cursor, make = self.cursor, self._make_row()
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            yield from rows if make is None else map(make, rows)
+
+    def close(self):
+        """Stop an unfinished stream, close the cursor and an owned connection."""
+        if self.stream and self.result is not None:
+            self.result.close()
         if self.cursor:
             self.cursor.close()
-        if self.connection:
+        if self.connection and self.owns_connection:
             self.connection.close()
+            self.connection = None
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
 # --- Setup Demo Database (run only once or reset table) ---
 def setup_demo_db():
@@ -45,12 +104,19 @@ def setup_demo_db():
         )
         conn.commit()
 
-setup_demo_db()
+if __name__ == "__main__":
+    setup_demo_db()
+
+    # --- Use the ExecuteQuery Context Manager ---
+    query = "SELECT * FROM users WHERE age > ?"
+    params = (25,)
 
-# --- Use the ExecuteQuery Context Manager ---
-query = "SELECT * FROM users WHERE age > ?"
-params = (25,)
+    with ExecuteQuery("example.db", query, params) as results:
+        for row in results:
+            print(row)
 
-with ExecuteQuery("example.db", query, params) as results:
-    for row in results:
-        print(row)
\ No newline at end of file
+    # --- Stream rows lazily as named tuples ---
+    with ExecuteQuery("example.db", query, params, stream=True, chunk_size=2,
+                      row_factory="namedtuple") as rows:
+        for row in rows:
+            print(row.name, row.age)
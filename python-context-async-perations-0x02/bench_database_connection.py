@@ -0,0 +1,78 @@
+"""
+Read and write throughput of DatabaseConnection configurations on a
+throwaway example.db. Every operation is its own `with` block, as in the
+demo: one INSERT + commit per write, one primary-key lookup per read,
+and reads repeated from several threads.
+
+    python3 bench_database_connection.py [--ops N] [--threads N] [--rows N]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+database_connection = __import__("0-databaseconnection")
+DatabaseConnection = database_connection.DatabaseConnection
+PERFORMANCE_PRAGMAS = database_connection.PERFORMANCE_PRAGMAS
+
+CONFIGURATIONS = [
+    ("plain connect (default)", {}),
+    ("pragmas", {"pragmas": PERFORMANCE_PRAGMAS}),
+    ("pool, no pragmas", {"pragmas": {}, "pool_size": 16}),
+    ("pool (pragmas by default)", {"pool_size": 16}),
+]
+
+
+def create_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users (id, name) VALUES (?, ?)",
+                     ((i, f"user{i}") for i in range(1, rows + 1)))
+    conn.commit()
+    conn.close()
+
+
+def writes(path, ops, options):
+    started = time.perf_counter()
+    for i in range(ops):
+        with DatabaseConnection(path, **options) as conn:
+            conn.execute("INSERT INTO users (name) VALUES (?)", (f"new{i}",))
+            conn.commit()
+    return ops / (time.perf_counter() - started)
+
+
+def reads(path, ops, threads, rows, options):
+    def lookup(i):
+        with DatabaseConnection(path, **options) as conn:
+            conn.execute("SELECT name FROM users WHERE id = ?", (i % rows + 1,)).fetchone()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lookup, range(ops), chunksize=64))
+    return ops / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=10_000)
+    options = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    print(f"{options.ops} operations per column; {options.threads} reader threads")
+    print(f"{'configuration':<28} {'writes/s':>9} {'reads/s':>9} {'ro reads/s':>11}")
+    for index, (label, config) in enumerate(CONFIGURATIONS):
+        path = f"example{index}.db"
+        create_db(path, options.rows)
+        written = writes(path, options.ops, config)
+        read = reads(path, options.ops, options.threads, options.rows, config)
+        read_only = reads(path, options.ops, options.threads, options.rows,
+                          {**config, "read_only": True})
+        print(f"{label:<28} {written:>9.0f} {read:>9.0f} {read_only:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
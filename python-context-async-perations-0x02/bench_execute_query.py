@@ -0,0 +1,76 @@
+"""
+ExecuteQuery on a throwaway example.db:
+- peak Python memory (tracemalloc) to iterate every row of a SELECT,
+  fetchall() versus stream=True, at growing row counts;
+- time per execution of a short parameterized query with a connection
+  (and statement cache) per execution versus one reused connection.
+
+    python3 bench_execute_query.py [--rows N [N ...]] [--lookups N]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+ExecuteQuery = __import__("1-execute").ExecuteQuery
+
+
+def create_users(rows):
+    with sqlite3.connect("example.db") as conn:
+        conn.execute("DROP TABLE IF EXISTS users")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)")
+        conn.executemany(
+            "INSERT INTO users (id, name, age) VALUES (?, ?, ?)",
+            ((i, f"user{i}", 18 + i % 60) for i in range(1, rows + 1)),
+        )
+    conn.close()
+
+
+def peak_memory(**options):
+    tracemalloc.start()
+    count = 0
+    with ExecuteQuery("example.db", "SELECT * FROM users WHERE age > ?", (0,), **options) as rows:
+        for _ in rows:
+            count += 1
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak
+
+
+def lookups_per_second(lookups, connection):
+    started = time.perf_counter()
+    for i in range(lookups):
+        with ExecuteQuery("example.db", "SELECT * FROM users WHERE id = ?", (i % 1000 + 1,),
+                          connection=connection) as rows:
+            rows[0]
+    return lookups / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=20_000)
+    options = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    print(f"{'rows':>10} {'fetchall':>12} {'stream':>12} {'stream+namedtuple':>18}")
+    for rows in options.rows:
+        create_users(rows)
+        _, listed = peak_memory()
+        _, streamed = peak_memory(stream=True)
+        _, named = peak_memory(stream=True, row_factory="namedtuple")
+        print(f"{rows:>10} {listed / 2**20:>10.1f}Mi {streamed / 2**20:>10.2f}Mi "
+              f"{named / 2**20:>16.2f}Mi")
+
+    create_users(1000)
+    print()
+    print(f"new connection per execution   {lookups_per_second(options.lookups, None):9.0f} queries/s")
+    conn = sqlite3.connect("example.db")
+    print(f"reused connection (cached stmt) {lookups_per_second(options.lookups, conn):9.0f} queries/s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
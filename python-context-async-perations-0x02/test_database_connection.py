@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+database_connection = __import__("0-databaseconnection")
+DatabaseConnection = database_connection.DatabaseConnection
+
+
+class TestDatabaseConnection(unittest.TestCase):
+    """TestCase for DatabaseConnection"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(self.directory, "example.db")
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+            conn.execute("INSERT INTO users (name) VALUES ('Alice')")
+        conn.close()
+        patcher = patch.dict(database_connection._idle_connections, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_idle)
+
+    def close_idle(self):
+        for idle in database_connection._idle_connections.values():
+            for conn in idle:
+                conn.close()
+
+    def journal_mode(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_default_is_a_plain_connection(self):
+        with DatabaseConnection(self.path) as conn:
+            self.assertEqual(conn.execute("SELECT name FROM users").fetchall(), [("Alice",)])
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone(), (0,))
+        self.assertEqual(self.journal_mode(), "delete")
+        self.assertEqual(database_connection._idle_connections, {})
+
+    def test_pooled_connections_get_the_pragmas_and_are_reused(self):
+        with DatabaseConnection(self.path, pool_size=2) as first:
+            self.assertEqual(first.execute("PRAGMA temp_store").fetchone(), (2,))
+        with DatabaseConnection(self.path, pool_size=2) as second:
+            self.assertIs(second, first)
+        self.assertEqual(self.journal_mode(), "wal")
+
+    def test_explicit_pragmas_apply_without_a_pool(self):
+        with DatabaseConnection(self.path, pragmas={"cache_size": -1024}) as conn:
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone(), (-1024,))
+
+    def test_pool_is_keyed_by_absolute_path(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.directory)
+        with DatabaseConnection("example.db", pool_size=1) as first:
+            pass
+        with DatabaseConnection(self.path, pool_size=1) as same:
+            self.assertIs(same, first)
+        os.mkdir("other")
+        os.chdir("other")
+        with sqlite3.connect("example.db") as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.close()
+        with DatabaseConnection("example.db", pool_size=1) as other:
+            self.assertIsNot(other, first)
+            self.assertEqual(other.execute("SELECT count(*) FROM users").fetchone(), (0,))
+
+    def test_pool_is_keyed_by_connect_arguments(self):
+        with DatabaseConnection(self.path, pool_size=2, isolation_level=None) as autocommit:
+            self.assertIsNone(autocommit.isolation_level)
+        with DatabaseConnection(self.path, pool_size=2) as conn:
+            self.assertIsNot(conn, autocommit)
+            self.assertEqual(conn.isolation_level, "")
+        with DatabaseConnection(self.path, pool_size=2, isolation_level=None) as again:
+            self.assertIs(again, autocommit)
+
+    def test_returned_connection_is_rolled_back(self):
+        with DatabaseConnection(self.path, pool_size=1) as conn:
+            conn.execute("INSERT INTO users (name) VALUES ('Bob')")
+        with DatabaseConnection(self.path, pool_size=1) as conn:
+            self.assertEqual(conn.execute("SELECT count(*) FROM users").fetchone(), (1,))
+
+    def test_no_more_than_pool_size_are_kept(self):
+        first = DatabaseConnection(self.path, pool_size=1)
+        second = DatabaseConnection(self.path, pool_size=1)
+        kept, closed = first.__enter__(), second.__enter__()
+        first.__exit__(None, None, None)
+        second.__exit__(None, None, None)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            closed.execute("SELECT 1")
+        kept.execute("SELECT 1")
+
+    def test_read_only_connection_cannot_write(self):
+        with DatabaseConnection(self.path, read_only=True) as conn:
+            self.assertEqual(conn.execute("SELECT count(*) FROM users").fetchone(), (1,))
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("INSERT INTO users (name) VALUES ('Eve')")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+
+ExecuteQuery = __import__("1-execute").ExecuteQuery
+
+
+class TestExecuteQuery(unittest.TestCase):
+    """TestCase for ExecuteQuery"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "example.db")
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)")
+            conn.executemany("INSERT INTO users (name, age) VALUES (?, ?)",
+                             [(f"user{i}", 20 + i) for i in range(10)])
+        conn.close()
+
+    def test_fetches_all_rows(self):
+        with ExecuteQuery(self.path, "SELECT name FROM users WHERE age > ?", (27,)) as rows:
+            self.assertEqual(rows, [("user8",), ("user9",)])
+
+    def test_stream_reads_in_chunks(self):
+        query = ExecuteQuery(self.path, "SELECT id FROM users", stream=True, chunk_size=3)
+        with query as rows:
+            self.assertNotIsInstance(rows, list)
+            self.assertEqual([row[0] for row in rows], list(range(1, 11)))
+
+    def test_leaving_a_stream_early_closes_it(self):
+        query = ExecuteQuery(self.path, "SELECT id FROM users", stream=True, chunk_size=2)
+        with query as rows:
+            self.assertEqual(next(rows), (1,))
+        self.assertEqual(list(rows), [])
+        with self.assertRaises(sqlite3.ProgrammingError):
+            query.cursor.fetchone()
+        self.assertIsNone(query.connection)
+
+    def test_namedtuple_rows(self):
+        with ExecuteQuery(self.path, "SELECT id, name AS 'user name' FROM users WHERE id = 1",
+                          row_factory="namedtuple", stream=True) as rows:
+            (row,) = rows
+        self.assertEqual((row.id, row._1), (1, "user0"))
+
+    def test_namedtuple_for_a_statement_without_rows(self):
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        with ExecuteQuery(self.path, "DELETE FROM users WHERE id = 1",
+                          row_factory="namedtuple", connection=conn) as rows:
+            self.assertEqual(rows, [])
+
+    def test_failed_execute_closes_what_it_opened(self):
+        query = ExecuteQuery(self.path, "SELECT * FROM missing")
+        with self.assertRaises(sqlite3.OperationalError):
+            with query:
+                self.fail("the block must not run")
+        self.assertIsNone(query.connection)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            query.cursor.fetchone()
+
+    def test_passed_connection_is_left_open(self):
+        conn = sqlite3.connect(self.path)
+        self.addCleanup(conn.close)
+        with self.assertRaises(sqlite3.OperationalError):
+            with ExecuteQuery(self.path, "SELECT * FROM missing", connection=conn):
+                pass
+        with ExecuteQuery(self.path, "SELECT count(*) FROM users", connection=conn) as rows:
+            self.assertEqual(rows, [(10,)])
+        conn.execute("SELECT 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
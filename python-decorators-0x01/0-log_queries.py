@@ -2,17 +2,22 @@
 # "from datetime import datetime", "print", "connect"]
 import sqlite3
 import functools
+import time
 
-# Decorator to log SQL queries
+from query_instrumentation import query_recorder
+
+# Decorator to log SQL queries: fingerprint, wall time and rows go to the
+# query_recorder ring buffer instead of a print per call.
 def log_queries(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         query = kwargs.get("query") if "query" in kwargs else args[0] if args else None
-        if query:
-            print(f"[LOG] Executing SQL Query: {query}")
-        else:
-            print("[LOG] No SQL query found in arguments.")
-        return func(*args, **kwargs)
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        if isinstance(query, str):
+            rows = len(result) if isinstance(result, list) else 0
+            query_recorder.record(query, 0, time.perf_counter() - started, rows)
+        return result
     return wrapper
 
 @log_queries
@@ -24,5 +29,7 @@ def fetch_all_users(query):
     conn.close()
     return results
 
-# Fetch users while logging the query
-users = fetch_all_users(query="SELECT * FROM users")
\ No newline at end of file
+if __name__ == "__main__":
+    # Fetch users while logging the query
+    users = fetch_all_users(query="SELECT * FROM users")
+    print(query_recorder.report())
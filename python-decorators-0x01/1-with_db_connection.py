@@ -1,14 +1,17 @@
 import sqlite3
 import functools
 
+from db_pool import get_pool
+from query_instrumentation import instrumented
+
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
+        # Borrowed from the shared pool (db_pool.py) instead of opened per call;
+        # its queries are recorded by query_instrumentation.query_recorder.
+        pool = get_pool('users.db')
+        with pool.connection() as conn:
+            return func(instrumented(conn, database=pool.name_of(conn)), *args, **kwargs)
     return wrapper
 
 @with_db_connection
@@ -17,6 +20,7 @@ def get_user_by_id(conn, user_id):
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
-# Fetch user by ID with automatic connection handling
-user = get_user_by_id(user_id=1)
-print(user)
\ No newline at end of file
+if __name__ == "__main__":
+    # Fetch user by ID with automatic connection handling
+    user = get_user_by_id(user_id=1)
+    print(user)
\ No newline at end of file
@@ -1,29 +1,47 @@
 import sqlite3
 import functools
 
+from db_pool import get_pool
+from group_commit import get_committer
+from query_instrumentation import instrumented
+from query_result_cache import database_of, query_cache, track_writes
+
 # Decorator to handle database connection
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
+        # Borrowed from the shared pool (db_pool.py) instead of opened per call;
+        # its queries are recorded by query_instrumentation.query_recorder.
+        pool = get_pool('users.db')
+        with pool.connection() as conn:
+            return func(instrumented(conn, database=pool.name_of(conn)), *args, **kwargs)
     return wrapper
 
 # Decorator to manage transactions
 def transactional(func):
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            print(f"[ERROR] Transaction failed: {e}")
-            raise
+        with track_writes(conn) as written:
+            try:
+                result = func(conn, *args, **kwargs)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"[ERROR] Transaction failed: {e}")
+                raise
+        database = database_of(conn)
+        if written and database is not None:
+            # Cached results that read the changed tables are now stale.
+            query_cache.invalidate(database, written)
+        return result
+    return wrapper
+
+# Group-commit mode: the call is queued on the shared writer (group_commit.py),
+# committed together with other calls, and a Future is returned at once.
+def group_transactional(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return get_committer('users.db').submit(func, *args, **kwargs)
     return wrapper
 
 @with_db_connection
@@ -32,5 +50,14 @@ def update_user_email(conn, user_id, new_email):
     cursor = conn.cursor()
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
-# Update user's email with automatic transaction handling
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
+@group_transactional
+def queue_user_email_update(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+if __name__ == "__main__":
+    # Update user's email with automatic transaction handling
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+
+    # Or queue it with other writes and wait for the group commit
+    queue_user_email_update(user_id=1, new_email='Crawford_Cartwright@hotmail.com').result()
\ No newline at end of file
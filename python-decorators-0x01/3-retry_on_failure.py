@@ -1,37 +1,33 @@
-import time
 import sqlite3
 import functools
 
+from db_pool import get_pool
+from query_instrumentation import instrumented
+from retry_policy import RetryPolicy, database_breaker, is_transient
+
 # Decorator to handle database connection
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
+        # Borrowed from the shared pool (db_pool.py) instead of opened per call;
+        # its queries are recorded by query_instrumentation.query_recorder.
+        pool = get_pool('users.db')
+        with pool.connection() as conn:
+            return func(instrumented(conn, database=pool.name_of(conn)), *args, **kwargs)
     return wrapper
 
 # Decorator to retry database operations on failure
-def retry_on_failure(retries=3, delay=2):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            attempt = 0
-            while attempt < retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    attempt += 1
-                    print(f"[RETRY] Attempt {attempt} failed with error: {e}")
-                    if attempt < retries:
-                        time.sleep(delay)
-                    else:
-                        print("[RETRY] All retry attempts failed.")
-                        raise
-        return wrapper
-    return decorator
+def retry_on_failure(retries=3, delay=2, max_delay=30.0, deadline=None,
+                     retry_on=is_transient, breaker=database_breaker):
+    """
+    Retry transient failures (sqlite "database is locked"/busy by default)
+    up to `retries` attempts, sleeping a full-jitter exponential backoff
+    based on `delay` between them; other errors are raised at once.
+    Works on coroutine functions too (sleeping with asyncio.sleep).
+    See retry_policy.RetryPolicy for `deadline` and `breaker`.
+    """
+    return RetryPolicy(retries=retries, base_delay=delay, max_delay=max_delay,
+                       deadline=deadline, retry_on=retry_on, breaker=breaker)
 
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
@@ -40,6 +36,7 @@ def fetch_users_with_retry(conn):
     cursor.execute("SELECT * FROM users")
     return cursor.fetchall()
 
-# Attempt to fetch users with automatic retry on failure
-users = fetch_users_with_retry()
-print(users)
\ No newline at end of file
+if __name__ == "__main__":
+    # Attempt to fetch users with automatic retry on failure
+    users = fetch_users_with_retry()
+    print(users)
@@ -2,30 +2,49 @@ import time
 import sqlite3 
 import functools
 
-query_cache = {}
+from db_pool import get_pool
+from query_instrumentation import instrumented
+from query_result_cache import database_of, query_cache, tables_read
 
 # Decorator to handle database connection
 def with_db_connection(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
+        # Borrowed from the shared pool (db_pool.py) instead of opened per call;
+        # its queries are recorded by query_instrumentation.query_recorder.
+        pool = get_pool('users.db')
+        with pool.connection() as conn:
+            return func(instrumented(conn, database=pool.name_of(conn)), *args, **kwargs)
     return wrapper
 
-# Decorator to cache query results
+# Decorator to cache query results (LRU + TTL, invalidated by transactional writes)
 def cache_query(func):
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        query = kwargs.get("query") if "query" in kwargs else args[0] if args else None
-        if query in query_cache:
+        if "query" in kwargs:
+            query, params = kwargs["query"], args
+        else:
+            query, params = (args[0], args[1:]) if args else (None, args)
+        params += tuple(sorted((k, v) for k, v in kwargs.items() if k != "query"))
+        database = database_of(conn)
+        try:
+            key = query_cache.key(database, query, params)
+            hash(key)
+        except (AttributeError, TypeError):
+            return func(conn, *args, **kwargs)  # no SQL text or unhashable arguments
+        if database is None:
+            return func(conn, *args, **kwargs)  # unnamed in-memory database
+        tables = tables_read(query)
+        if tables is None:
+            return func(conn, *args, **kwargs)  # writes could not invalidate it
+        hit, result = query_cache.get(key)
+        if hit:
             print(f"[CACHE] Using cached result for query: {query}")
-            return query_cache[query]
+            return result
         print(f"[CACHE MISS] Executing and caching query: {query}")
+        generations = query_cache.generations(key[0], tables)
         result = func(conn, *args, **kwargs)
-        query_cache[query] = result
+        query_cache.set(key, result, tables, generations)
         return result
     return wrapper
 
@@ -36,8 +55,10 @@ def fetch_users_with_cache(conn, query):
     cursor.execute(query)
     return cursor.fetchall()
 
-# First call will cache the result
-users = fetch_users_with_cache(query="SELECT * FROM users")
+if __name__ == "__main__":
+    # First call will cache the result
+    users = fetch_users_with_cache(query="SELECT * FROM users")
 
-# Second call will use the cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
\ No newline at end of file
+    # Second call will use the cached result
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(query_cache.stats())
\ No newline at end of file
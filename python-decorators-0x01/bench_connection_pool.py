@@ -0,0 +1,82 @@
+"""
+Calls/sec of get_user_by_id (1-with_db_connection.py) with connections
+borrowed from db_pool versus a fresh sqlite3.connect per call, driven by
+a thread pool against a throwaway users.db.
+
+    python3 bench_connection_pool.py [--calls N] [--threads N] [--users N]
+"""
+import argparse
+import functools
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import configure_pool
+
+
+def unpooled(func):
+    # The with_db_connection decorator before pooling.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        conn = sqlite3.connect('users.db')
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            conn.close()
+    return wrapper
+
+
+def create_users_db(users):
+    conn = sqlite3.connect('users.db')
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER)")
+    conn.executemany(
+        "INSERT INTO users (id, name, email, age) VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", f"user{i}@example.com", 20 + i % 50) for i in range(1, users + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(fetch, calls, threads, users):
+    with ThreadPoolExecutor(threads) as executor:
+        start = time.perf_counter()
+        rows = list(executor.map(lambda i: fetch(user_id=i % users + 1), range(calls)))
+        elapsed = time.perf_counter() - start
+    assert all(rows)
+    return calls / elapsed
+
+
+def measure(args):
+    create_users_db(args.users)
+    pool = configure_pool('users.db', min_size=args.threads, max_size=args.threads)
+    get_user_by_id = __import__('1-with_db_connection').get_user_by_id
+    get_user_by_id_unpooled = unpooled(get_user_by_id.__wrapped__)
+
+    print(f"{args.calls} lookups over {args.threads} threads")
+    for label, fetch in (("sqlite3.connect per call", get_user_by_id_unpooled),
+                         ("pooled", get_user_by_id)):
+        print(f"{label:<25} {run(fetch, args.calls, args.threads, args.users):9.0f} calls/s")
+    print(f"pool stats: {pool.stats()}")
+    pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    here = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # get_user_by_id opens the relative path 'users.db'
+        try:
+            measure(args)
+        finally:
+            os.chdir(here)
+
+
+if __name__ == "__main__":
+    main()
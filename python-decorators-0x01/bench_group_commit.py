@@ -0,0 +1,101 @@
+"""
+Throughput of update_user_email-style writes against a throwaway users.db:
+one commit per call (the transactional decorator) versus group_commit,
+with writers submitting from several threads or one thread queueing
+everything and waiting at the end.
+
+    python3 bench_group_commit.py [--writes N] [--threads N] [--users N]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db_pool import configure_pool
+from group_commit import GroupCommitter
+
+
+def create_users_db(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER)")
+    conn.executemany(
+        "INSERT INTO users (id, name, email, age) VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", f"user{i}@example.com", 20 + i % 50) for i in range(1, users + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def set_email(conn, user_id, new_email):
+    conn.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+
+def per_call_commit(path, writes, threads, users, journal_mode, synchronous):
+    pool = configure_pool(path, max_size=threads)
+
+    def write(i):
+        with pool.connection() as conn:
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+            conn.execute("PRAGMA busy_timeout = 60000")  # wait out lock contention
+            set_email(conn, i % users + 1, f"new{i}@example.com")
+            conn.commit()
+
+    with pool.connection() as conn:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(write, range(writes)))
+    elapsed = time.perf_counter() - started
+    pool.close()
+    return elapsed, None
+
+
+def grouped(path, writes, threads, users, journal_mode, synchronous, wait_each):
+    committer = GroupCommitter(path, journal_mode=journal_mode, synchronous=synchronous)
+
+    def write(i):
+        future = committer.submit(set_email, i % users + 1, f"new{i}@example.com")
+        return future.result() if wait_each else future
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = list(executor.map(write, range(writes)))
+    if not wait_each:
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - started
+    stats = committer.stats()
+    committer.close()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=10_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users", type=int, default=1000)
+    options = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    w, t, u = options.writes, options.threads, options.users
+    runs = [
+        ("per-call commit, DELETE/FULL", lambda p: per_call_commit(p, w, t, u, "DELETE", "FULL")),
+        ("per-call commit, WAL/FULL", lambda p: per_call_commit(p, w, t, u, "WAL", "FULL")),
+        ("per-call commit, WAL/NORMAL", lambda p: per_call_commit(p, w, t, u, "WAL", "NORMAL")),
+        ("group commit, WAL/FULL", lambda p: grouped(p, w, t, u, "WAL", "FULL", True)),
+        ("group commit, WAL/NORMAL", lambda p: grouped(p, w, t, u, "WAL", "NORMAL", True)),
+        ("group commit, WAL/FULL, queued", lambda p: grouped(p, w, 1, u, "WAL", "FULL", False)),
+    ]
+    print(f"{w} single-row updates, {t} writer threads")
+    for index, (label, run) in enumerate(runs):
+        path = f"users{index}.db"
+        create_users_db(path, u)
+        elapsed, stats = run(path)
+        batches = f"  mean batch {stats['mean_batch']:.1f}" if stats else ""
+        print(f"{label:<32} {w / elapsed:9.0f} writes/s{batches}")
+
+
+if __name__ == "__main__":
+    main()
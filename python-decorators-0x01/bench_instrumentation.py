@@ -0,0 +1,88 @@
+"""
+Per-query cost of query_instrumentation on a primary-key lookup against a
+throwaway users.db: a bare pooled connection, the same connection wrapped
+with instrumented() at several sample rates, and the old log_queries
+print (sent to /dev/null).
+
+    python3 bench_instrumentation.py [--queries N] [--users N] [--repeat N]
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import tempfile
+import time
+
+from db_pool import get_pool
+from query_instrumentation import QueryRecorder, instrumented
+
+
+def create_users_db(users):
+    conn = sqlite3.connect('users.db')
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER)")
+    conn.executemany(
+        "INSERT INTO users (id, name, email, age) VALUES (?, ?, ?, ?)",
+        ((i, f"user{i}", f"user{i}@example.com", 20 + i % 50) for i in range(1, users + 1)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def lookups(conn, queries, users):
+    for i in range(queries):
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE id = ?", (i % users + 1,))
+        cursor.fetchone()
+
+
+def printed(conn, queries, users):
+    # log_queries before the instrumentation layer.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(queries):
+            query = "SELECT * FROM users WHERE id = ?"
+            print(f"[LOG] Executing SQL Query: {query}")
+            cursor = conn.cursor()
+            cursor.execute(query, (i % users + 1,))
+            cursor.fetchone()
+
+
+def best_of(repeat, run):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    options = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    create_users_db(options.users)
+    q, n = options.queries, options.users
+    with get_pool('users.db').connection() as conn:
+        baseline = best_of(options.repeat, lambda: lookups(conn, q, n))
+        results = [("bare connection", baseline)]
+        for rate in (1.0, 0.1, 0.01):
+            recorder = QueryRecorder(sample_rate=rate)
+            wrapped = instrumented(conn, recorder)
+            results.append((f"instrumented, sample {rate:g}",
+                            best_of(options.repeat, lambda: lookups(wrapped, q, n))))
+        results.append(("print per query (old)", best_of(options.repeat, lambda: printed(conn, q, n))))
+
+    print(f"{q} lookups, best of {options.repeat}")
+    for label, elapsed in results:
+        per_query = elapsed / q * 1e6
+        overhead = (elapsed - baseline) / q * 1e6
+        print(f"{label:<28} {per_query:7.2f} us/query  {overhead:+6.2f} us")
+    print()
+    print(recorder.report(3))
+
+
+if __name__ == "__main__":
+    main()
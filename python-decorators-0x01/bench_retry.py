@@ -0,0 +1,95 @@
+"""
+Write contention on a throwaway users.db: threads insert with busy_timeout
+0, so a held write lock surfaces as "database is locked" immediately, and
+each failure is retried either with the old fixed delay or with
+retry_policy's full-jitter backoff. Reports wall time and failed attempts.
+
+    python3 bench_retry.py [--threads N] [--writes N] [--delay SECONDS]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from retry_policy import RetryPolicy, is_transient
+
+
+def fixed_delay(retries, delay):
+    # retry_on_failure before the policy engine (without its prints).
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            for attempt in range(1, retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+def run(retry, threads, writes):
+    conn = sqlite3.connect('users.db')
+    conn.execute("DROP TABLE IF EXISTS users")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.close()
+    failures = 0
+    lock = threading.Lock()
+
+    def insert(conn, i):
+        nonlocal failures
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO users (name) VALUES (?)", (f"user{i}",))
+            time.sleep(0.001)  # hold the write lock like a real transaction would
+            conn.commit()
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.rollback()
+            with lock:
+                failures += 1
+            raise
+
+    attempt = retry(insert)
+
+    def worker(n):
+        conn = sqlite3.connect('users.db', timeout=0, isolation_level=None)
+        for i in range(writes):
+            attempt(conn, n * writes + i)
+        conn.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return time.perf_counter() - started, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.01)
+    options = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    print(f"{options.threads} threads x {options.writes} writes")
+    strategies = [
+        ("fixed delay", fixed_delay(1000, options.delay)),
+        ("exponential + full jitter", RetryPolicy(retries=1000, base_delay=options.delay,
+                                                  max_delay=0.5, retry_on=is_transient,
+                                                  breaker=None)),
+    ]
+    for label, retry in strategies:
+        with contextlib.redirect_stdout(io.StringIO()):  # drop the [RETRY] lines
+            elapsed, failures = run(retry, options.threads, options.writes)
+        print(f"{label:<28} {elapsed:8.2f}s  {failures:6d} failed attempts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the acquire timeout."""
+
+
+_memory_ids = itertools.count(1)
+
+# Connection settings a borrower may change; release() puts them back.
+_RESET_ATTRIBUTES = ("isolation_level", "row_factory", "text_factory")
+
+
+class _PooledConnection:
+    """Bookkeeping for one sqlite3 connection owned by a pool."""
+
+    __slots__ = ("conn", "name", "settings", "created_at", "returned_at", "checked_at")
+
+    def __init__(self, conn, name):
+        now = time.monotonic()
+        self.conn = conn
+        self.name = name
+        self.settings = {attribute: getattr(conn, attribute) for attribute in _RESET_ATTRIBUTES}
+        self.created_at = now
+        self.returned_at = now
+        self.checked_at = now
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of sqlite3 connections to one database.
+
+    - keeps at least min_size connections open and never more than max_size;
+    - acquire() waits up to `timeout` seconds for a free connection;
+    - a thread gets back the connection it used last when it is free
+      (per-thread affinity keeps its statement cache warm);
+    - connections idle for `health_check_interval` seconds are checked
+      with SELECT 1 before reuse, and broken ones are replaced;
+    - connections idle for longer than `idle_timeout` are closed, down
+      to min_size.
+    """
+
+    def __init__(self, database, min_size=1, max_size=10, timeout=30.0,
+                 idle_timeout=300.0, health_check_interval=30.0, **connect_kwargs):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError("need 0 <= min_size <= max_size and max_size >= 1")
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        # Connections move between threads, so sqlite3 must not pin them.
+        self.connect_kwargs = {"check_same_thread": False, **connect_kwargs}
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []       # _PooledConnection, most recently returned last
+        self._in_use = {}     # id(conn) -> _PooledConnection
+        self._size = 0        # idle + in use + being opened
+        self._closed = False
+        self._local = threading.local()
+        self._stats = dict.fromkeys(
+            ("created", "closed", "acquired", "affinity_hits", "waits",
+             "timeouts", "health_check_failures", "idle_closed"), 0
+        )
+        for _ in range(min_size):
+            self._idle.append(self._open())
+            self._size += 1
+
+    def _open(self):
+        # Every ":memory:" connection is a database of its own.
+        name = f":memory:{next(_memory_ids)}" if self.database == ":memory:" else self.database
+        entry = _PooledConnection(sqlite3.connect(self.database, **self.connect_kwargs), name)
+        self._stats["created"] += 1
+        return entry
+
+    def _discard(self, entry):
+        try:
+            entry.conn.close()
+        except sqlite3.Error:
+            pass
+        self._stats["closed"] += 1
+
+    def _healthy(self, entry, now):
+        if now - entry.checked_at < self.health_check_interval:
+            return True
+        try:
+            entry.conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            self._stats["health_check_failures"] += 1
+            return False
+        entry.checked_at = now
+        return True
+
+    def _take_idle(self):
+        # Called with the lock held.
+        preferred = getattr(self._local, "last", None)
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index] is preferred:
+                self._stats["affinity_hits"] += 1
+                return self._idle.pop(index)
+        return self._idle.pop()
+
+    def _close_expired(self, now):
+        # Called with the lock held; the oldest returned come first.
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0].returned_at > self.idle_timeout):
+            self._discard(self._idle.pop(0))
+            self._size -= 1
+            self._stats["idle_closed"] += 1
+
+    def acquire(self, timeout=None):
+        """Borrow a connection; give it back with release()."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("pool is closed")
+                now = time.monotonic()
+                self._close_expired(now)
+                entry = None
+                if self._idle:
+                    entry = self._take_idle()
+                elif self._size < self.max_size:
+                    self._size += 1  # reserve the slot; open outside the lock
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"no connection to {self.database} free after {timeout}s")
+                    self._stats["waits"] += 1
+                    self._available.wait(remaining)
+                    continue
+            if entry is None:
+                try:
+                    entry = self._open()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+            elif not self._healthy(entry, now):
+                with self._lock:
+                    self._discard(entry)
+                    self._size -= 1
+                continue
+            with self._lock:
+                self._in_use[id(entry.conn)] = entry
+                self._stats["acquired"] += 1
+            self._local.last = entry
+            return entry.conn
+
+    def release(self, conn):
+        """
+        Return a borrowed connection. An open transaction is rolled back
+        and isolation_level, row_factory and text_factory are restored, so
+        the next borrower gets the connection as the pool opened it.
+        """
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            raise ValueError("connection does not belong to this pool")
+        broken = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            for attribute, value in entry.settings.items():
+                if getattr(conn, attribute) is not value:
+                    setattr(conn, attribute, value)
+        except sqlite3.Error:
+            broken = True
+        with self._lock:
+            if broken or self._closed:
+                self._discard(entry)
+                self._size -= 1
+            else:
+                entry.returned_at = time.monotonic()
+                self._idle.append(entry)
+            self._available.notify()
+
+    def name_of(self, conn):
+        """
+        The name a borrowed connection's database is known by, for keys
+        such as query_result_cache's: the pool's database, or a name of
+        its own for each in-memory connection.
+        """
+        with self._lock:
+            entry = self._in_use.get(id(conn))
+        if entry is None:
+            raise ValueError("connection is not borrowed from this pool")
+        return entry.name
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Counters since the pool was created, plus the current sizes."""
+        with self._lock:
+            return {**self._stats, "size": self._size, "idle": len(self._idle),
+                    "in_use": len(self._in_use)}
+
+    def close(self):
+        """Close idle connections now and the borrowed ones as they come back."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+                self._size -= 1
+            self._available.notify_all()
+
+
+def database_key(database):
+    """
+    The name a database file is shared under: its absolute path, so
+    "users.db" from two working directories is two databases and
+    "users.db" and "./users.db" are one. In-memory and URI names are
+    left as they are.
+    """
+    database = os.fspath(database)
+    if database == ":memory:" or database.startswith("file:"):
+        return database
+    return os.path.abspath(database)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database="users.db", **options):
+    """
+    The shared pool for `database`, created with `options` on first use.
+    Call configure_pool() first to choose different options.
+    """
+    key = database_key(database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key, **options)
+        return pool
+
+
+def configure_pool(database="users.db", **options):
+    """Replace the shared pool for `database` with one built from `options`."""
+    key = database_key(database)
+    with _pools_lock:
+        old = _pools.pop(key, None)
+        _pools[key] = pool = ConnectionPool(key, **options)
+    if old is not None:
+        old.close()
+    return pool
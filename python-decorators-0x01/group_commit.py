@@ -0,0 +1,173 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from db_pool import database_key
+from query_instrumentation import instrumented
+from query_result_cache import query_cache, track_writes
+
+_STOP = object()
+
+
+class GroupCommitter:
+    """
+    Runs write functions on one writer connection and commits them in
+    groups, so N calls cost one fsync per batch instead of N.
+
+    submit() queues func(conn, *args, **kwargs) and returns a Future. The
+    writer thread takes every queued call, up to `max_batch`, and runs
+    them inside a single BEGIN IMMEDIATE ... COMMIT; calls that arrive
+    while a batch commits form the next one. `max_delay` makes the writer
+    wait that many seconds after the first call for more to arrive,
+    trading latency for larger batches when writers are sparse.
+
+    Each call gets its own savepoint: a call that raises is rolled back
+    alone and its future gets the exception. The other futures resolve
+    only after the COMMIT succeeds (or all fail with the COMMIT error).
+    With the default synchronous=FULL a result therefore means the data
+    is on disk; synchronous="NORMAL" is faster still, but in WAL mode
+    the last commits can be lost on power failure (not on a crash of the
+    process).
+
+    Functions must not call conn.commit() or conn.rollback() themselves.
+    `journal_mode` and `synchronous` are applied to the writer connection
+    (None leaves the database's setting alone).
+    """
+
+    def __init__(self, database, max_batch=256, max_delay=0.0,
+                 journal_mode="WAL", synchronous="FULL", **connect_kwargs):
+        self.database = database
+        self._key = database_key(database)  # what the query cache knows it by
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._conn = sqlite3.connect(database, isolation_level=None,
+                                     check_same_thread=False, **connect_kwargs)
+        if journal_mode is not None:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+        if synchronous is not None:
+            self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = dict.fromkeys(("calls", "failed", "batches", "commit_failures"), 0)
+        self._thread = threading.Thread(target=self._run, name=f"group-commit:{database}",
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("group committer is closed")
+            self._queue.put((future, func, args, kwargs))
+        return future
+
+    def _next_batch(self):
+        """Return (batch, stop): wait for one call, then gather more until the window closes."""
+        job = self._queue.get()
+        if job is _STOP:
+            return [], True
+        batch = [job]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is _STOP:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if batch:
+                self._commit(batch)
+        self._conn.close()
+
+    def _commit(self, batch):
+        conn = instrumented(self._conn, database=self._key)
+        succeeded, failed = [], 0
+        with track_writes(conn) as written:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for future, func, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    self._conn.execute("SAVEPOINT grouped_call")
+                    try:
+                        result = func(conn, *args, **kwargs)
+                    except Exception as exc:
+                        self._conn.execute("ROLLBACK TO grouped_call")
+                        self._conn.execute("RELEASE grouped_call")
+                        future.set_exception(exc)
+                        failed += 1
+                    else:
+                        self._conn.execute("RELEASE grouped_call")
+                        succeeded.append((future, result))
+                self._conn.execute("COMMIT")
+            except BaseException as exc:
+                # Also KeyboardInterrupt, SystemExit... from a function:
+                # fail the batch but keep the writer thread alive.
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                # Nothing was committed: fail every call still waiting.
+                pending = [future for future, *_ in batch if not future.done()]
+                for future in pending:
+                    future.set_exception(exc)
+                with self._lock:
+                    self._stats["commit_failures"] += 1
+                    self._stats["failed"] += failed + len(pending)
+                return
+        if written:
+            query_cache.invalidate(self._key, written)
+        for future, result in succeeded:
+            future.set_result(result)
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["calls"] += len(succeeded)
+            self._stats["failed"] += failed
+
+    def flush(self):
+        """Block until every call submitted so far has been committed."""
+        self.submit(lambda conn: None).result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_batch"] = stats["calls"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        """Commit what is queued, then stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+
+_committers = {}
+_committers_lock = threading.Lock()
+
+
+def get_committer(database="users.db", **options):
+    """
+    The shared GroupCommitter for `database`, created with `options` on
+    first use. Names of the same file share one, as with db_pool.get_pool.
+    """
+    key = database_key(database)
+    with _committers_lock:
+        committer = _committers.get(key)
+        if committer is None:
+            committer = _committers[key] = GroupCommitter(database, **options)
+            # The writer is a daemon thread: commit queued calls before exit.
+            atexit.register(committer.close)
+        return committer
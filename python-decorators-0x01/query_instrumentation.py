@@ -0,0 +1,245 @@
+import functools
+import random
+import re
+import time
+from collections import defaultdict, deque, namedtuple
+
+_STRING_OR_NUMBER = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_NAMED_PARAMETER = re.compile(r"[:@$]\w+|\?\d+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    SQL with literals and placeholders replaced by ? and whitespace
+    collapsed, so "... WHERE id = 1" and "... WHERE id = 2" group together.
+    """
+    # Placeholders first, or the digits of "?1" would become "??".
+    sql = _NAMED_PARAMETER.sub("?", sql)
+    sql = _STRING_OR_NUMBER.sub("?", sql)
+    sql = _VALUE_LIST.sub("(?, ...)", sql)
+    return " ".join(sql.split())
+
+
+QueryRecord = namedtuple("QueryRecord", "at fingerprint param_count duration rows")
+
+
+class QueryRecorder:
+    """
+    Keeps the last `capacity` query records in a ring buffer.
+
+    The buffers are deques with a maxlen: append() is atomic under the GIL,
+    so recording takes no lock and old records fall off the end. Only a
+    `sample_rate` fraction of queries is kept, except that every query
+    taking at least `slow_threshold` seconds is also kept in `slow` and
+    passed to `on_slow`.
+    """
+
+    def __init__(self, capacity=4096, sample_rate=1.0, slow_threshold=0.1,
+                 slow_capacity=256, on_slow=None):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.on_slow = on_slow
+        self.records = deque(maxlen=capacity)
+        self.slow = deque(maxlen=slow_capacity)
+
+    def record(self, sql, param_count, duration, rows):
+        slow = self.slow_threshold is not None and duration >= self.slow_threshold
+        if not slow and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        record = QueryRecord(time.time(), fingerprint(sql), param_count, duration, rows)
+        self.records.append(record)
+        if slow:
+            self.slow.append(record)
+            if self.on_slow is not None:
+                self.on_slow(record)
+
+    def clear(self):
+        self.records.clear()
+        self.slow.clear()
+
+    def top(self, n=10, by="total_time"):
+        """
+        Aggregate the buffered records per fingerprint and return the `n`
+        largest by `by` (total_time, mean_time, max_time, calls or rows).
+        est_calls scales the sampled count back up by the sample rate.
+        """
+        groups = defaultdict(lambda: {"calls": 0, "total_time": 0.0, "max_time": 0.0, "rows": 0})
+        for record in list(self.records):
+            group = groups[record.fingerprint]
+            group["calls"] += 1
+            group["total_time"] += record.duration
+            group["max_time"] = max(group["max_time"], record.duration)
+            group["rows"] += record.rows
+        scale = 1 / self.sample_rate if self.sample_rate > 0 else 0
+        summary = [
+            {"fingerprint": sql, **group, "mean_time": group["total_time"] / group["calls"],
+             "est_calls": round(group["calls"] * scale)}
+            for sql, group in groups.items()
+        ]
+        summary.sort(key=lambda group: group[by], reverse=True)
+        return summary[:n]
+
+    def report(self, n=10, by="total_time"):
+        lines = [f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>8}  query"]
+        for group in self.top(n, by):
+            lines.append(
+                f"{group['calls']:>7} {group['total_time'] * 1000:>10.2f} "
+                f"{group['mean_time'] * 1000:>9.3f} {group['max_time'] * 1000:>9.3f} "
+                f"{group['rows']:>8}  {group['fingerprint']}"
+            )
+        return "\n".join(lines)
+
+
+query_recorder = QueryRecorder()
+
+
+class InstrumentedCursor:
+    """
+    Cursor proxy timing execute() and the fetches that follow it. A SELECT
+    is recorded once its rows are exhausted or the cursor is reused,
+    closed or garbage-collected; other statements right away.
+    """
+
+    __slots__ = ("_cursor", "_recorder", "_sql", "_param_count", "_duration", "_rows")
+
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+        self._sql = None
+
+    def _finish(self):
+        if self._sql is not None:
+            self._recorder.record(self._sql, self._param_count, self._duration, self._rows)
+            self._sql = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        self._cursor.execute(sql, parameters)
+        self._sql, self._param_count = sql, len(parameters)
+        self._duration = time.perf_counter() - started
+        if self._cursor.description is None:
+            self._rows = max(self._cursor.rowcount, 0)
+            self._finish()
+        else:
+            self._rows = 0
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        self._cursor.executemany(sql, seq_of_parameters)
+        self._recorder.record(sql, 0, time.perf_counter() - started, max(self._cursor.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        if self._sql is not None:
+            self._duration += time.perf_counter() - started
+            if row is None:
+                self._finish()
+            else:
+                self._rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(self._cursor.arraysize if size is None else size)
+        if self._sql is not None:
+            self._duration += time.perf_counter() - started
+            self._rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        if self._sql is not None:
+            self._duration += time.perf_counter() - started
+            self._rows += len(rows)
+            self._finish()
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self):
+        self._finish()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """
+    sqlite3 connection proxy whose cursors report to a QueryRecorder.
+
+    `database` is the name the connection's database is known by (see
+    query_result_cache.database_of); `wrapped` is the real connection.
+    A trace callback set through the proxy stays readable as
+    `trace_callback`, which sqlite3 itself does not offer.
+    """
+
+    # Attributes of the proxy itself; all others are set on the connection.
+    _OWN_ATTRIBUTES = frozenset(("_conn", "_recorder", "database", "trace_callback"))
+
+    def __init__(self, conn, recorder, database=None):
+        self._conn = conn
+        self._recorder = recorder
+        self.database = database
+        self.trace_callback = None
+
+    @property
+    def wrapped(self):
+        return self._conn
+
+    def cursor(self, factory=None):
+        # Not kept here: a live cursor pins its statement, defeating
+        # sqlite3's statement cache.
+        cursor = self._conn.cursor() if factory is None else self._conn.cursor(factory)
+        return InstrumentedCursor(cursor, self._recorder)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def set_trace_callback(self, callback):
+        self._conn.set_trace_callback(callback)
+        self.trace_callback = callback
+
+    def __enter__(self):
+        # Commits or rolls back like the real connection, but statements
+        # run inside the block through the proxy stay recorded.
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._conn.__exit__(exc_type, exc_value, traceback)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # row_factory, isolation_level, ... must reach the real connection.
+        if name in self._OWN_ATTRIBUTES:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+
+def instrumented(conn, recorder=None, database=None):
+    """
+    Wrap `conn` so its queries are recorded (in query_recorder by default).
+    Pass `database` when it is known, e.g. from ConnectionPool.name_of().
+    """
+    return InstrumentedConnection(conn, query_recorder if recorder is None else recorder, database)
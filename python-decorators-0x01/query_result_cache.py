@@ -0,0 +1,200 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+_NAME = r"(?:\"[^\"]+\"|`[^`]+`|\[[^\]]+\]|'[^']+'|\w+)"
+# An optional schema, then the table name, e.g. main."Users".
+_TABLE_NAME = rf"(?:{_NAME}\s*\.\s*)?({_NAME})"
+_TABLE_LIST_START = re.compile(r"\b(?:FROM|JOIN)\b", re.IGNORECASE)
+_NOT_AN_ALIAS = (
+    r"(?:WHERE|JOIN|ON|USING|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|OUTER|GROUP|ORDER"
+    r"|LIMIT|HAVING|WINDOW|UNION|EXCEPT|INTERSECT|INDEXED|NOT|RETURNING)\b"
+)
+# One entry of a FROM list: a table, an optional alias and maybe a comma.
+_TABLE_REF = re.compile(
+    rf"\s*{_TABLE_NAME}(?:\s+(?:AS\s+)?(?!{_NOT_AN_ALIAS}){_NAME})?\s*(,)?", re.IGNORECASE
+)
+_WRITE_TABLE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?"
+    rf"|DELETE\s+FROM|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|ALTER\s+TABLE)\s+{_TABLE_NAME}",
+    re.IGNORECASE,
+)
+
+
+def _table(name):
+    if name[0] in "\"`['":
+        name = name[1:-1]
+    return name.lower()
+
+
+def tables_read(sql):
+    """
+    Lower-cased names of the tables a SELECT reads from: every table
+    after FROM or JOIN, comma-separated lists included, without any
+    schema prefix. None when they cannot be told from the text (a
+    subquery or a table-valued function in a FROM list), since a result
+    cached under too few tables would outlive writes to the others.
+    """
+    tables = set()
+    for start in _TABLE_LIST_START.finditer(sql):
+        position = start.end()
+        while True:
+            match = _TABLE_REF.match(sql, position)
+            if match is None or sql[match.end():].lstrip().startswith("("):
+                return None
+            tables.add(_table(match.group(1)))
+            if match.group(2) is None:
+                break
+            position = match.end()
+    return frozenset(tables)
+
+
+def table_written(sql):
+    """Lower-cased name of the table a write statement changes, or None."""
+    match = _WRITE_TABLE.match(sql)
+    return _table(match.group(1)) if match else None
+
+
+def database_of(conn):
+    """
+    The name results read through `conn` are cached under. An
+    instrumented connection carries it (see ConnectionPool.name_of), so
+    this costs no query; otherwise it is the file behind the connection.
+    None for an unnamed in-memory database: nothing identifies it for
+    longer than the connection lives, so its results are not cached.
+    """
+    database = getattr(conn, "database", None)
+    if database is not None:
+        return database
+    conn = getattr(conn, "wrapped", conn)  # keep the PRAGMA out of query reports
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or None
+    return None
+
+
+class QueryCache:
+    """
+    Thread-safe query-result cache with LRU and TTL eviction.
+
+    Entries are keyed by (database, normalized SQL, parameters) and
+    indexed by the tables the SQL reads, so invalidate() can drop every
+    result that depends on a written table. Each table also has a
+    generation number: a result whose tables changed while it was being
+    computed is not stored, so a read racing a commit cannot cache the
+    old rows. Values are copied in and out, so a caller that changes the
+    list it got back does not change what other callers get.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()          # key -> (expires_at, tables, value)
+        self._keys_by_table = defaultdict(set)  # (database, table) -> keys
+        self._generations = defaultdict(int)    # (database, table) -> int
+        self._stats = dict.fromkeys(
+            ("hits", "misses", "evictions", "expirations", "invalidations", "stale_skips"), 0
+        )
+
+    @staticmethod
+    def key(database, sql, params=()):
+        return database, " ".join(sql.split()), tuple(params)
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, copy.copy(entry[2])
+                self._remove(key)
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return False, None
+
+    def generations(self, database, tables):
+        """Snapshot to pass to set() once the result has been computed."""
+        with self._lock:
+            return tuple(self._generations[(database, table)] for table in tables)
+
+    def set(self, key, value, tables, generations):
+        database = key[0]
+        with self._lock:
+            current = tuple(self._generations[(database, table)] for table in tables)
+            if current != generations:
+                self._stats["stale_skips"] += 1
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tables, copy.copy(value))
+            for table in tables:
+                self._keys_by_table[(database, table)].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        # Called with the lock held.
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys_by_table.get((key[0], table))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[(key[0], table)]
+
+    def invalidate(self, database, tables):
+        """Drop every cached result that reads any of `tables`."""
+        with self._lock:
+            for table in tables:
+                table = table.lower()
+                self._generations[(database, table)] += 1
+                for key in list(self._keys_by_table.get((database, table), ())):
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "size": len(self._entries)}
+
+
+query_cache = QueryCache()
+
+
+@contextmanager
+def track_writes(conn):
+    """
+    Collect the tables written through `conn` inside the block, using
+    sqlite3's trace callback (which sees every statement it runs).
+
+    A callback already set through an instrumented connection, such as an
+    enclosing track_writes on it, keeps receiving every statement and is
+    put back afterwards. sqlite3 cannot report a callback set directly on a
+    plain connection, so that one is replaced for the block.
+    """
+    written = set()
+    previous = getattr(conn, "trace_callback", None)
+
+    def trace(statement):
+        table = table_written(statement)
+        if table is not None:
+            written.add(table)
+        if previous is not None:
+            previous(statement)
+
+    conn.set_trace_callback(trace)
+    try:
+        yield written
+    finally:
+        conn.set_trace_callback(previous)
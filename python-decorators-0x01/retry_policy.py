@@ -0,0 +1,194 @@
+import asyncio
+import functools
+import inspect
+import random
+import sqlite3
+import threading
+import time
+
+# Messages sqlite3 raises when another connection holds a lock; these go
+# away on their own, unlike syntax errors, missing tables or constraints.
+TRANSIENT_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+
+def is_transient(exc):
+    """True for errors worth retrying: sqlite lock/busy contention."""
+    return isinstance(exc, sqlite3.OperationalError) and any(
+        message in str(exc).lower() for message in TRANSIENT_MESSAGES
+    )
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker shared by every call that uses it.
+
+    After `failure_threshold` consecutive calls that failed transiently
+    (each counted once, when its retries ran out) the circuit opens and
+    calls fail fast with CircuitOpenError. Once `reset_timeout` seconds
+    have passed one trial call is let through (half-open); its success
+    closes the circuit, its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("circuit open; failing fast")
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                if self._trial_running:
+                    raise CircuitOpenError("circuit half-open; trial call in progress")
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def record_other(self):
+        """The call ended otherwise (other error, cancellation): not a contention signal."""
+        with self._lock:
+            self._trial_running = False
+
+    def reset(self):
+        self.record_success()
+
+
+# Shared by every retry_on_failure call that does not pass its own breaker.
+database_breaker = CircuitBreaker()
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: before retry n the caller sleeps
+    a random time in [0, min(max_delay, base_delay * 2**(n-1))], so clients
+    that failed together do not retry together. Only exceptions for which
+    `retry_on(exc)` is true are retried, and no retry starts if its sleep
+    would end after `deadline` seconds from the first attempt.
+    """
+
+    def __init__(self, retries=3, base_delay=0.05, max_delay=2.0, deadline=None,
+                 retry_on=is_transient, breaker=database_breaker):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.breaker = breaker
+
+    def backoff(self, attempt):
+        """Sleep before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _retry_delay(self, exc, attempt, started):
+        """Return the delay before retrying a transient `exc`, or None to give up."""
+        print(f"[RETRY] Attempt {attempt} failed with error: {exc}")
+        if attempt >= self.retries:
+            print("[RETRY] All retry attempts failed.")
+            return None
+        if self.breaker is not None and self.breaker.state == CircuitBreaker.OPEN:
+            print("[RETRY] Circuit opened by other calls; giving up.")
+            return None
+        delay = self.backoff(attempt)
+        if self.deadline is not None and time.monotonic() - started + delay > self.deadline:
+            print("[RETRY] Deadline reached; giving up.")
+            return None
+        return delay
+
+    def _record(self, outcome):
+        # One outcome per call, whatever happened: "success", "failure"
+        # (transient, retries exhausted) or "other" (any other error,
+        # including cancellation), which also frees a half-open trial.
+        if self.breaker is not None:
+            getattr(self.breaker, f"record_{outcome}")()
+
+    def call(self, func, *args, **kwargs):
+        if self.breaker is not None:
+            self.breaker.allow()
+        started = time.monotonic()
+        attempt, outcome = 0, "other"
+        try:
+            while True:
+                attempt += 1
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as exc:
+                    if not self.retry_on(exc):
+                        raise
+                    delay = self._retry_delay(exc, attempt, started)
+                    if delay is None:
+                        outcome = "failure"
+                        raise
+                    time.sleep(delay)
+                else:
+                    outcome = "success"
+                    return result
+        finally:
+            self._record(outcome)
+
+    async def acall(self, func, *args, **kwargs):
+        if self.breaker is not None:
+            self.breaker.allow()
+        started = time.monotonic()
+        attempt, outcome = 0, "other"
+        try:
+            while True:
+                attempt += 1
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as exc:
+                    if not self.retry_on(exc):
+                        raise
+                    delay = self._retry_delay(exc, attempt, started)
+                    if delay is None:
+                        outcome = "failure"
+                        raise
+                    await asyncio.sleep(delay)
+                else:
+                    outcome = "success"
+                    return result
+        finally:
+            self._record(outcome)
+
+    def __call__(self, func):
+        """Use the policy as a decorator; coroutine functions retry with asyncio.sleep."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.acall(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return wrapper
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeout, configure_pool, get_pool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """TestCase for ConnectionPool"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.database = os.path.join(self.directory.name, "users.db")
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(self.database, **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_borrowed_connection_is_reused_after_release(self):
+        pool = self.make_pool(min_size=0, max_size=2)
+        with pool.connection() as first:
+            first.execute("CREATE TABLE t (x)")
+        with pool.connection() as second:
+            self.assertIs(second, first)
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_release_rolls_back_an_open_transaction(self):
+        pool = self.make_pool(max_size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x)")
+            conn.commit()
+            conn.execute("INSERT INTO t VALUES (1)")
+        with pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute("SELECT count(*) FROM t").fetchone(), (0,))
+
+    def test_release_restores_connection_settings(self):
+        pool = self.make_pool(max_size=1)
+        with pool.connection() as conn:
+            conn.row_factory = sqlite3.Row
+            conn.text_factory = bytes
+            conn.isolation_level = None
+        with pool.connection() as again:
+            self.assertIs(again, conn)
+            self.assertEqual(
+                (again.row_factory, again.text_factory, again.isolation_level), (None, str, "")
+            )
+
+    def test_acquire_times_out_when_the_pool_is_exhausted(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(timeout=0.01)
+        pool.release(conn)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_release_of_a_foreign_connection_is_refused(self):
+        pool = self.make_pool()
+        with self.assertRaises(ValueError):
+            pool.release(sqlite3.connect(":memory:"))
+
+    def test_broken_connection_is_replaced_after_the_health_check(self):
+        pool = self.make_pool(max_size=1, health_check_interval=0)
+        with pool.connection() as conn:
+            pass
+        conn.close()  # breaks it while idle
+        with pool.connection() as replacement:
+            self.assertIsNot(replacement, conn)
+            replacement.execute("SELECT 1")
+        stats = pool.stats()
+        self.assertEqual((stats["health_check_failures"], stats["created"]), (1, 2))
+
+    def test_idle_connections_are_closed_down_to_min_size(self):
+        pool = self.make_pool(min_size=1, max_size=3, idle_timeout=10)
+        conns = [pool.acquire() for _ in range(3)]
+        for conn in conns:
+            pool.release(conn)
+        later = db_pool.time.monotonic() + 11
+        with patch.object(db_pool.time, "monotonic", return_value=later):
+            pool.release(pool.acquire())
+        stats = pool.stats()
+        self.assertEqual((stats["idle_closed"], stats["size"]), (2, 1))
+
+    def test_a_thread_gets_back_the_connection_it_used_last(self):
+        pool = self.make_pool(min_size=0, max_size=2)
+        used = {}
+        ready, done = threading.Event(), threading.Event()
+
+        def other_thread():
+            with pool.connection() as conn:
+                used["other"] = conn
+                ready.set()
+                done.wait()
+
+        thread = threading.Thread(target=other_thread)
+        with pool.connection() as mine:
+            thread.start()
+            ready.wait()
+        done.set()
+        thread.join()
+        # Both connections are idle now; the other thread's was returned last.
+        with pool.connection() as again:
+            self.assertIs(again, mine)
+        self.assertIsNot(used["other"], mine)
+        self.assertEqual(pool.stats()["affinity_hits"], 1)
+
+    def test_stats_report_sizes(self):
+        pool = self.make_pool(min_size=2, max_size=4)
+        conn = pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["idle"], stats["in_use"]), (2, 1, 1))
+        self.assertEqual((stats["created"], stats["acquired"]), (2, 1))
+        pool.release(conn)
+
+    def test_min_size_above_max_size_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool(self.database, min_size=3, max_size=2)
+
+
+class TestSharedPools(unittest.TestCase):
+    """TestCase for get_pool and configure_pool"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.directory.name)
+        patcher = patch.dict(db_pool._pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: [pool.close() for pool in db_pool._pools.values()])
+
+    def test_relative_names_of_one_file_share_a_pool(self):
+        pool = get_pool("users.db")
+        self.assertIs(get_pool("./users.db"), pool)
+        self.assertIs(get_pool(os.path.join(self.directory.name, "users.db")), pool)
+        self.assertTrue(os.path.isabs(pool.database))
+
+    def test_same_name_in_another_directory_is_another_pool(self):
+        pool = get_pool("users.db")
+        os.mkdir("other")
+        os.chdir("other")
+        self.assertIsNot(get_pool("users.db"), pool)
+
+    def test_configure_pool_replaces_the_shared_pool(self):
+        old = get_pool("users.db")
+        new = configure_pool("./users.db", max_size=2)
+        self.assertIs(get_pool("users.db"), new)
+        self.assertEqual(new.max_size, 2)
+        with self.assertRaises(RuntimeError):
+            old.acquire()
+
+    def test_memory_databases_are_not_made_absolute(self):
+        self.assertEqual(get_pool(":memory:").database, ":memory:")
+
+
+if __name__ == "__main__":
+    unittest.main()
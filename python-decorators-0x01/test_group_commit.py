@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import group_commit
+from group_commit import GroupCommitter, get_committer
+
+
+def insert(conn, name):
+    conn.execute("INSERT INTO users (name) VALUES (?)", (name,))
+    return name
+
+
+def fail(conn, exc):
+    conn.execute("INSERT INTO users (name) VALUES ('rolled back')")
+    raise exc
+
+
+class TestGroupCommitter(unittest.TestCase):
+    """TestCase for GroupCommitter"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.close()
+        self.committer = GroupCommitter(self.path)
+        self.addCleanup(self.committer.close)
+
+    def names(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            return sorted(name for (name,) in conn.execute("SELECT name FROM users"))
+        finally:
+            conn.close()
+
+    def hold_writer(self):
+        """Block the writer on a call so the next submits form one batch."""
+        entered, release = threading.Event(), threading.Event()
+
+        def wait(conn):
+            entered.set()
+            release.wait()
+
+        self.committer.submit(wait)
+        entered.wait()
+        return release
+
+    def test_queued_calls_commit_as_one_batch(self):
+        release = self.hold_writer()
+        futures = [self.committer.submit(insert, f"user{i}") for i in range(5)]
+        release.set()
+        self.assertEqual([future.result() for future in futures],
+                         [f"user{i}" for i in range(5)])
+        self.assertEqual(self.names(), [f"user{i}" for i in range(5)])
+        stats = self.committer.stats()
+        self.assertEqual((stats["calls"], stats["batches"]), (6, 2))
+
+    def test_a_failing_call_is_rolled_back_alone(self):
+        release = self.hold_writer()
+        ok = self.committer.submit(insert, "kept")
+        bad = self.committer.submit(fail, ValueError("bad"))
+        release.set()
+        self.assertEqual(ok.result(), "kept")
+        with self.assertRaises(ValueError):
+            bad.result()
+        self.assertEqual(self.names(), ["kept"])
+        self.assertEqual(self.committer.stats()["failed"], 1)
+
+    def test_base_exception_fails_the_batch_and_keeps_the_writer(self):
+        release = self.hold_writer()
+        before = self.committer.submit(insert, "lost")
+        bad = self.committer.submit(fail, KeyboardInterrupt())
+        after = self.committer.submit(insert, "lost too")
+        release.set()
+        for future in (before, bad, after):
+            with self.assertRaises(KeyboardInterrupt):
+                future.result(timeout=5)
+        self.assertEqual(self.committer.submit(insert, "later").result(timeout=5), "later")
+        self.assertEqual(self.names(), ["later"])
+        self.assertEqual(self.committer.stats()["commit_failures"], 1)
+
+    def test_results_are_durable_by_default(self):
+        synchronous = self.committer.submit(
+            lambda conn: conn.execute("PRAGMA synchronous").fetchone()[0]
+        ).result()
+        self.assertEqual(synchronous, 2)  # FULL
+
+    def test_close_commits_what_is_queued(self):
+        release = self.hold_writer()
+        future = self.committer.submit(insert, "queued")
+        release.set()
+        self.committer.close()
+        self.assertTrue(future.done())
+        self.assertEqual(self.names(), ["queued"])
+        with self.assertRaises(RuntimeError):
+            self.committer.submit(insert, "too late")
+
+
+class TestSharedCommitters(unittest.TestCase):
+    """TestCase for get_committer"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.directory)
+        patcher = patch.dict(group_commit._committers, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(
+            lambda: [committer.close() for committer in group_commit._committers.values()]
+        )
+
+    def test_names_of_one_file_share_a_committer(self):
+        committer = get_committer("users.db")
+        self.assertIs(get_committer("./users.db"), committer)
+        self.assertIs(get_committer(os.path.join(self.directory, "users.db")), committer)
+        self.assertEqual(len(group_commit._committers), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import sqlite3
+import unittest
+
+from query_instrumentation import QueryRecorder, fingerprint, instrumented
+from query_result_cache import database_of
+
+
+class TestFingerprint(unittest.TestCase):
+    """TestCase for fingerprint"""
+
+    def test_literals_become_placeholders(self):
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE id = 42 AND name = 'O''Hara'"),
+                         "SELECT * FROM users WHERE id = ? AND name = ?")
+
+    def test_named_and_numbered_parameters(self):
+        self.assertEqual(fingerprint("SELECT * FROM t WHERE a = ?1 AND b = :b AND c = @c"),
+                         "SELECT * FROM t WHERE a = ? AND b = ? AND c = ?")
+
+    def test_value_lists_and_whitespace_collapse(self):
+        self.assertEqual(fingerprint("SELECT *\n  FROM t WHERE id IN (?, ?, ?)"),
+                         "SELECT * FROM t WHERE id IN (?, ...)")
+
+
+class TestQueryRecorder(unittest.TestCase):
+    """TestCase for QueryRecorder"""
+
+    def setUp(self):
+        self.recorder = QueryRecorder(slow_threshold=None)
+        self.conn = instrumented(sqlite3.connect(":memory:"), self.recorder)
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)")
+        self.conn.executemany("INSERT INTO users (name) VALUES (?)", [("a",), ("b",), ("c",)])
+        self.recorder.clear()
+
+    def test_select_is_recorded_with_its_rows_once_exhausted(self):
+        cursor = self.conn.execute("SELECT * FROM users WHERE id > ?", (1,))
+        self.assertEqual(len(self.recorder.records), 0)
+        self.assertEqual(len(cursor.fetchall()), 2)
+        (record,) = self.recorder.records
+        self.assertEqual((record.fingerprint, record.param_count, record.rows),
+                         ("SELECT * FROM users WHERE id > ?", 1, 2))
+
+    def test_top_groups_by_fingerprint(self):
+        for user_id in (1, 2, 3):
+            self.conn.execute(f"SELECT name FROM users WHERE id = {user_id}").fetchone()
+            self.conn.execute("SELECT 1").fetchall()
+        self.conn.execute("DELETE FROM users WHERE id = 1")
+        top = self.recorder.top(by="calls")
+        self.assertEqual([(group["fingerprint"], group["calls"]) for group in top[:2]],
+                         [("SELECT name FROM users WHERE id = ?", 3), ("SELECT ?", 3)])
+
+    def test_slow_queries_are_kept_and_reported(self):
+        slow = []
+        recorder = QueryRecorder(sample_rate=0.0, slow_threshold=0.0, on_slow=slow.append)
+        conn = instrumented(sqlite3.connect(":memory:"), recorder)
+        conn.execute("SELECT 1").fetchall()
+        self.assertEqual(len(recorder.slow), 1)
+        self.assertEqual(slow, list(recorder.slow))
+
+    def test_connection_is_a_context_manager(self):
+        with self.conn as conn:
+            self.assertIs(conn, self.conn)
+            conn.execute("INSERT INTO users (name) VALUES ('d')")
+        self.assertFalse(self.conn.in_transaction)
+        with self.assertRaises(ZeroDivisionError):
+            with self.conn:
+                self.conn.execute("INSERT INTO users (name) VALUES ('e')")
+                1 / 0
+        self.assertEqual(self.conn.execute("SELECT count(*) FROM users").fetchone(), (4,))
+        self.assertIn("INSERT INTO users (name) VALUES (?)",
+                      [record.fingerprint for record in self.recorder.records])
+
+    def test_connection_settings_reach_the_real_connection(self):
+        self.conn.row_factory = sqlite3.Row
+        self.assertIs(self.conn.wrapped.row_factory, sqlite3.Row)
+        self.assertEqual(self.conn.execute("SELECT name FROM users WHERE id = 1").fetchone()["name"], "a")
+        self.conn.isolation_level = None
+        self.assertIsNone(self.conn.wrapped.isolation_level)
+
+    def test_cursor_accepts_a_factory(self):
+        class NamedCursor(sqlite3.Cursor):
+            pass
+
+        cursor = self.conn.cursor(factory=NamedCursor)
+        self.assertIsInstance(cursor._cursor, NamedCursor)
+        self.assertEqual(cursor.execute("SELECT count(*) FROM users").fetchall(), [(3,)])
+        self.assertEqual(len(self.recorder.records), 1)
+
+    def test_naming_the_database_leaves_the_report_alone(self):
+        database_of(self.conn)
+        self.assertEqual(len(self.recorder.records), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import query_result_cache
+from db_pool import ConnectionPool
+from query_instrumentation import QueryRecorder, instrumented
+from query_result_cache import QueryCache, database_of, tables_read, table_written, track_writes
+
+cache_query_module = __import__("4-cache_query")
+
+
+class TestStatementParsing(unittest.TestCase):
+    """TestCase for tables_read and table_written"""
+
+    def test_tables_read(self):
+        sql = "SELECT * FROM users u JOIN \"Orders\" o ON o.user_id = u.id"
+        self.assertEqual(tables_read(sql), {"users", "orders"})
+
+    def test_comma_separated_and_schema_qualified_tables(self):
+        self.assertEqual(tables_read("SELECT * FROM users u, orders AS o WHERE u.id = o.uid"),
+                         {"users", "orders"})
+        self.assertEqual(tables_read("SELECT * FROM main.users"), {"users"})
+        self.assertEqual(tables_read("SELECT * FROM main.\"Users\" JOIN temp.orders"),
+                         {"users", "orders"})
+
+    def test_tables_that_cannot_be_told_are_unknown(self):
+        self.assertIsNone(tables_read("SELECT * FROM users, (SELECT * FROM orders) o, items"))
+        self.assertIsNone(tables_read("SELECT * FROM json_each('[1, 2]'), users"))
+
+    def test_table_written(self):
+        self.assertEqual(table_written("INSERT OR REPLACE INTO Users VALUES (1)"), "users")
+        self.assertEqual(table_written("  delete from users where id = 1"), "users")
+        self.assertEqual(table_written("UPDATE main.users SET name = 'x'"), "users")
+        self.assertIsNone(table_written("SELECT * FROM users"))
+
+
+class TestDatabaseOf(unittest.TestCase):
+    """TestCase for database_of"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "users.db")
+
+    def test_a_named_connection_needs_no_query(self):
+        recorder = QueryRecorder()
+        conn = instrumented(sqlite3.connect(":memory:"), recorder, database="users")
+        self.assertEqual(database_of(conn), "users")
+        self.assertEqual(len(recorder.records), 0)
+
+    def test_an_unnamed_connection_is_looked_up_without_being_recorded(self):
+        recorder = QueryRecorder()
+        conn = instrumented(sqlite3.connect(self.path), recorder)
+        self.assertEqual(os.path.realpath(database_of(conn)), os.path.realpath(self.path))
+        self.assertEqual(len(recorder.records), 0)
+
+    def test_an_unnamed_memory_database_has_no_name(self):
+        self.assertIsNone(database_of(sqlite3.connect(":memory:")))
+
+    def test_pooled_memory_connections_keep_a_name_of_their_own(self):
+        pool = ConnectionPool(":memory:", min_size=0, max_size=2)
+        self.addCleanup(pool.close)
+        first, second = pool.acquire(), pool.acquire()
+        names = pool.name_of(first), pool.name_of(second)
+        self.assertNotEqual(names[0], names[1])
+        pool.release(first)
+        again = pool.acquire()
+        self.assertIs(again, first)
+        self.assertEqual(pool.name_of(again), names[0])
+        pool.release(again)
+        pool.release(second)
+
+
+class TestQueryCache(unittest.TestCase):
+    """TestCase for QueryCache"""
+
+    def setUp(self):
+        self.cache = QueryCache(max_entries=2, ttl=60)
+
+    def store(self, sql, value, params=()):
+        key = self.cache.key("db", sql, params)
+        tables = tables_read(sql)
+        self.cache.set(key, value, tables, self.cache.generations("db", tables))
+        return key
+
+    def test_key_collapses_whitespace(self):
+        self.assertEqual(self.cache.key("db", "SELECT  *\n FROM users"),
+                         self.cache.key("db", "SELECT * FROM users"))
+
+    def test_callers_get_their_own_copy(self):
+        rows = [(1, "a")]
+        key = self.store("SELECT * FROM users", rows)
+        rows.append((2, "b"))
+        _, first = self.cache.get(key)
+        first.clear()
+        self.assertEqual(self.cache.get(key), (True, [(1, "a")]))
+
+    def test_invalidate_drops_results_reading_the_table(self):
+        users = self.store("SELECT * FROM users", [1])
+        orders = self.store("SELECT * FROM orders", [2])
+        self.cache.invalidate("db", {"Users"})
+        self.assertEqual(self.cache.get(users), (False, None))
+        self.assertEqual(self.cache.get(orders), (True, [2]))
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_result_computed_across_a_write_is_not_stored(self):
+        key = self.cache.key("db", "SELECT * FROM users")
+        generations = self.cache.generations("db", {"users"})
+        self.cache.invalidate("db", {"users"})
+        self.cache.set(key, [1], {"users"}, generations)
+        self.assertEqual(self.cache.get(key), (False, None))
+        self.assertEqual(self.cache.stats()["stale_skips"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        first = self.store("SELECT 1 FROM a", [1])
+        second = self.store("SELECT 2 FROM b", [2])
+        self.cache.get(first)
+        self.store("SELECT 3 FROM c", [3])
+        self.assertTrue(self.cache.get(first)[0])
+        self.assertFalse(self.cache.get(second)[0])
+
+    def test_entries_expire(self):
+        key = self.store("SELECT * FROM users", [1])
+        later = query_result_cache.time.monotonic() + 61
+        with patch.object(query_result_cache.time, "monotonic", return_value=later):
+            self.assertEqual(self.cache.get(key), (False, None))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+
+class TestTrackWrites(unittest.TestCase):
+    """TestCase for track_writes"""
+
+    def setUp(self):
+        self.conn = instrumented(sqlite3.connect(":memory:"), QueryRecorder())
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+
+    def test_collects_written_tables(self):
+        with track_writes(self.conn) as written:
+            self.conn.execute("INSERT INTO users VALUES (1)")
+            self.conn.execute("SELECT * FROM users").fetchall()
+        self.assertEqual(written, {"users"})
+
+    def test_existing_callback_is_chained_and_restored(self):
+        seen = []
+        callback = seen.append
+        self.conn.set_trace_callback(callback)
+        with track_writes(self.conn) as written:
+            self.conn.execute("DELETE FROM users")
+        self.assertIs(self.conn.trace_callback, callback)
+        self.conn.execute("SELECT 1")
+        self.assertEqual(written, {"users"})
+        self.assertEqual(seen, ["BEGIN ", "DELETE FROM users", "SELECT 1"])
+
+    def test_nested_blocks_both_see_writes(self):
+        with track_writes(self.conn) as outer:
+            with track_writes(self.conn) as inner:
+                self.conn.execute("INSERT INTO users VALUES (2)")
+            self.conn.execute("UPDATE users SET id = 3")
+        self.assertEqual((inner, outer), ({"users"}, {"users"}))
+        self.assertIsNone(self.conn.trace_callback)
+
+
+class TestCacheQuery(unittest.TestCase):
+    """TestCase for the cache_query decorator"""
+
+    def setUp(self):
+        patcher = patch.object(cache_query_module, "query_cache", QueryCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+        @cache_query_module.cache_query
+        def fetch(conn, query):
+            self.calls += 1
+            return conn.execute(query).fetchall()
+
+        self.fetch = fetch
+
+    def run_fetch(self, conn):
+        with redirect_stdout(StringIO()):
+            return self.fetch(conn, query="SELECT 1")
+
+    def test_named_connection_is_cached(self):
+        conn = instrumented(sqlite3.connect(":memory:"), QueryRecorder(), database="db")
+        self.assertEqual(self.run_fetch(conn), [(1,)])
+        self.assertEqual(self.run_fetch(conn), [(1,)])
+        self.assertEqual(self.calls, 1)
+
+    def test_unnamed_memory_database_is_not_cached(self):
+        conn = sqlite3.connect(":memory:")
+        self.run_fetch(conn)
+        self.run_fetch(conn)
+        self.assertEqual(self.calls, 2)
+
+    def test_query_with_unknown_tables_is_not_cached(self):
+        conn = instrumented(sqlite3.connect(":memory:"), QueryRecorder(), database="db")
+        query = "SELECT * FROM (SELECT 1)"
+        with redirect_stdout(StringIO()):
+            self.fetch(conn, query=query)
+            self.fetch(conn, query=query)
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
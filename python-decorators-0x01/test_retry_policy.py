@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+import asyncio
+import sqlite3
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+
+import retry_policy
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy, is_transient
+
+LOCKED = sqlite3.OperationalError("database is locked")
+
+
+class Flaky:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestIsTransient(unittest.TestCase):
+    """TestCase for is_transient"""
+
+    def test_lock_and_busy_errors_are_transient(self):
+        self.assertTrue(is_transient(LOCKED))
+        self.assertTrue(is_transient(sqlite3.OperationalError("Database is busy")))
+
+    def test_other_errors_are_not(self):
+        self.assertFalse(is_transient(sqlite3.OperationalError("no such table: users")))
+        self.assertFalse(is_transient(sqlite3.IntegrityError("database is locked")))
+        self.assertFalse(is_transient(ValueError("database is locked")))
+
+
+class TestBackoff(unittest.TestCase):
+    """TestCase for RetryPolicy.backoff"""
+
+    def test_bounds_grow_exponentially_up_to_max_delay(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, breaker=None)
+        with patch.object(retry_policy.random, "uniform", side_effect=lambda a, b: (a, b)):
+            bounds = [policy.backoff(attempt) for attempt in range(1, 6)]
+        self.assertEqual(bounds, [(0, 0.1), (0, 0.2), (0, 0.4), (0, 0.5), (0, 0.5)])
+
+    def test_delay_stays_within_bounds(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, breaker=None)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.backoff(attempt) <= min(0.5, 0.1 * 2 ** (attempt - 1)))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """TestCase for CircuitBreaker"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        self.now = 1000.0
+        patcher = patch.object(retry_policy.time, "monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail(self):
+        self.breaker.allow()
+        self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_success_resets_the_count(self):
+        self.fail()
+        self.breaker.record_success()
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        self.fail()
+        self.fail()
+        self.now += 10
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_opens_again(self):
+        self.fail()
+        self.fail()
+        self.now += 10
+        self.fail()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+    def test_trial_ending_otherwise_frees_the_slot(self):
+        self.fail()
+        self.fail()
+        self.now += 10
+        self.breaker.allow()
+        self.breaker.record_other()
+        self.breaker.allow()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """TestCase for RetryPolicy.call and RetryPolicy.acall"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.policy = RetryPolicy(retries=3, base_delay=0, max_delay=0, breaker=self.breaker)
+        stdout = redirect_stdout(StringIO())
+        stdout.__enter__()
+        self.addCleanup(stdout.__exit__, None, None, None)
+
+    def test_transient_errors_are_retried(self):
+        func = Flaky(LOCKED, LOCKED)
+        self.assertEqual(self.policy.call(func), "ok")
+        self.assertEqual(func.calls, 3)
+
+    def test_other_errors_are_raised_at_once(self):
+        func = Flaky(ValueError("bad"))
+        with self.assertRaises(ValueError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 1)
+        self.assertEqual(self.breaker._failures, 0)
+
+    def test_an_exhausted_call_counts_as_one_failure(self):
+        func = Flaky(LOCKED, LOCKED, LOCKED)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(self.breaker._failures, 1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_a_call_that_recovers_counts_no_failure(self):
+        self.policy.call(Flaky(LOCKED, LOCKED))
+        self.assertEqual(self.breaker._failures, 0)
+
+    def test_deadline_stops_retries(self):
+        policy = RetryPolicy(retries=5, base_delay=1, max_delay=1, deadline=0.5, breaker=None)
+        func = Flaky(LOCKED, LOCKED)
+        with patch.object(retry_policy.random, "uniform", return_value=1):
+            with self.assertRaises(sqlite3.OperationalError):
+                policy.call(func)
+        self.assertEqual(func.calls, 1)
+
+    def test_open_circuit_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.policy.call(Flaky(LOCKED, LOCKED, LOCKED))
+        func = Flaky()
+        with self.assertRaises(CircuitOpenError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 0)
+
+    def test_decorator_and_acall(self):
+        func = Flaky(LOCKED)
+
+        @self.policy
+        async def coroutine():
+            return func()
+
+        self.assertEqual(asyncio.run(coroutine()), "ok")
+        self.assertEqual(func.calls, 2)
+
+    def test_cancelled_half_open_trial_frees_the_slot(self):
+        self.breaker._state = CircuitBreaker.HALF_OPEN
+
+        async def scenario():
+            started = asyncio.Event()
+
+            async def hang():
+                started.set()
+                await asyncio.sleep(60)
+
+            task = asyncio.ensure_future(self.policy.acall(hang))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+        self.breaker.allow()  # a new trial is allowed
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+if __name__ == "__main__":
+    unittest.main()